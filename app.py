@@ -1,7 +1,6 @@
 import streamlit as st
-import pandas as pd
-import os
 import sys
+import time
 import traceback
 import logging
 import datetime
@@ -39,7 +38,12 @@ logging.info("应用程序启动")
 
 # Try importing the converter function
 try:
-    from excel_converter import convert_excel
+    from excel_converter import load_reference
+    from policy_config import load_policy
+    from reference_index import content_hash
+    from workbook_context import WorkbookContext
+    from job_queue import DONE, FAILED, QUEUED, JobQueue, JobQueueFull
+    from result_cache import ResultCache
     logging.info("成功导入excel_converter模块")
 except ImportError as e:
     error_msg = f"导入excel_converter时出错: {e}"
@@ -47,6 +51,12 @@ except ImportError as e:
     st.error(error_msg)
     st.stop()
 
+# Number of rows shown per preview page
+PREVIEW_ROWS = 20
+
+# Seconds between two status checks of a running conversion job
+JOB_POLL_INTERVAL = 1
+
 # Translations for UI text in both languages
 translations = {
     "en": {
@@ -78,7 +88,8 @@ translations = {
         "output_help": "The name of the converted Excel file you'll download",
         "data_preview": "Data Preview",
         "input_preview": "Input Excel File Preview",
-        "showing_rows": "Showing first 5 rows from sheet {} (total rows: {})",
+        "showing_rows": "Showing rows {first}-{last} from sheet {sheet} (total rows: {total})",
+        "preview_page": "Page",
         "columns": "Columns: {}",
         "reference_preview": "Reference Excel File Preview",
         "policy_preview": "Policy Excel File Preview",
@@ -93,6 +104,9 @@ translations = {
         "conversion_failed": "Conversion failed. Please check the console output for details.",
         "cleaning_up": "Cleaning up temporary files...",
         "success": "Conversion completed successfully!",
+        "job_queued": "Waiting for a free converter ({} job(s) ahead)...",
+        "job_running": "Converting: {}",
+        "queue_full": "The server is busy with other conversions. Please try again in a moment.",
         "download_button": "Download Converted Excel",
         "output_not_created": "Output file '{}' was not created. Conversion may have failed.",
         "error_occurred": "An error occurred during conversion: {}",
@@ -147,7 +161,8 @@ translations = {
         "output_help": "您将下载的转换后Excel文件的名称",
         "data_preview": "数据预览",
         "input_preview": "输入Excel文件预览",
-        "showing_rows": "显示第{}张表的前5行（总行数：{}）",
+        "showing_rows": "显示第{sheet}张表的第{first}-{last}行（总行数：{total}）",
+        "preview_page": "页码",
         "columns": "列：{}",
         "reference_preview": "参考Excel文件预览",
         "policy_preview": "政策Excel文件预览",
@@ -162,6 +177,9 @@ translations = {
         "conversion_failed": "转换失败。请查看控制台输出了解详情。",
         "cleaning_up": "清理临时文件...",
         "success": "转换成功完成！",
+        "job_queued": "正在排队等待转换（前面还有{}个任务）...",
+        "job_running": "正在转换：{}",
+        "queue_full": "服务器正忙于处理其他转换任务，请稍后再试。",
         "download_button": "下载转换后的Excel",
         "output_not_created": "输出文件'{}'未创建。转换可能已失败。",
         "error_occurred": "转换过程中发生错误：{}",
@@ -189,6 +207,116 @@ translations = {
     }
 }
 
+def get_parsed_upload(kind, uploaded_file, parse):
+    """
+    Return the parsed form of an upload, parsing it only when its content changes.
+
+    Streamlit re-runs the whole script on every widget interaction. Parsed uploads
+    are kept in the session state keyed by the SHA-256 of their content, so
+    switching language or editing the output name does not re-read any workbook.
+    Only the latest content is kept per kind.
+
+    Args:
+        kind (str): Cache slot, e.g. ``'input'`` or ``'reference_preview'``
+        uploaded_file: The ``st.file_uploader`` result
+        parse (callable): Builds the parsed value from the raw bytes
+
+    Returns:
+        The parsed value
+    """
+    data = uploaded_file.getvalue()
+    digest = content_hash(data)
+    cache = st.session_state.setdefault("parsed_uploads", {})
+    cached = cache.get(kind)
+    if cached is None or cached[0] != digest:
+        logging.info(f"解析上传文件: {uploaded_file.name} ({kind})")
+        cached = (digest, parse(data))
+        cache[kind] = cached
+    return cached[1]
+
+
+def show_preview(t, key, ctx, sheet_name=0, skiprows=0, first_row=0):
+    """
+    Show one page of a sheet with a page selector.
+
+    Only the rows of the selected page are read; the row count comes from the
+    sheet's dimension metadata.
+
+    Args:
+        t (dict): UI texts of the selected language
+        key (str): Widget key prefix, unique per preview
+        ctx (WorkbookContext): The uploaded workbook
+        sheet_name (int or str): Sheet to preview
+        skiprows (int): Rows above the header row
+        first_row (int): Data rows hidden at the top of the preview
+
+    Returns:
+        tuple: ``(page, total_rows)`` as returned by :meth:`WorkbookContext.preview`
+    """
+    _, total_rows = ctx.preview(sheet_name, skiprows, rows=0)
+    if total_rows is not None:
+        total_rows = max(total_rows - first_row, 0)
+    page_count = max(-(-total_rows // PREVIEW_ROWS), 1) if total_rows is not None else None
+
+    page = st.number_input(t["preview_page"], min_value=1, max_value=page_count, value=1, step=1,
+                           key=f"{key}_preview_page")
+    start = (page - 1) * PREVIEW_ROWS
+    page_df, _ = ctx.preview(sheet_name, skiprows, start=first_row + start, rows=PREVIEW_ROWS)
+    # 只把当前页转换为字符串类型用于显示
+    page_df = page_df.astype(str)
+
+    st.dataframe(page_df)
+    st.caption(t["showing_rows"].format(first=start + 1 if len(page_df) else 0, last=start + len(page_df),
+                                        sheet=sheet_name + 1 if isinstance(sheet_name, int) else sheet_name,
+                                        total=total_rows if total_rows is not None else "?"))
+    st.text(t["columns"].format(', '.join(map(str, page_df.columns.tolist()))))
+    return page_df, total_rows
+
+
+@st.cache_resource
+def get_job_queue():
+    """Return the conversion job queue shared by all sessions of this server."""
+    # 相同文件的重复提交直接返回缓存的报关单；只改政策文件时复用已处理的商品明细
+    return JobQueue(cache=ResultCache(), memoize=True)
+
+
+def show_conversion_job(t, job_queue, job_id, output_filename):
+    """
+    Show the status of this session's conversion job.
+
+    Returns:
+        bool: True while the job is still queued or running
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        st.session_state.pop("conversion_job", None)
+        return False
+
+    if job.status == QUEUED:
+        st.info(t["job_queued"].format(job_queue.position(job_id) or 0))
+        return True
+    if not job.finished:
+        st.progress(job.progress, text=t["job_running"].format(job.stage))
+        return True
+
+    if job.status == FAILED:
+        logging.error(f"转换任务失败: {job.id} {job.error}")
+        st.error(t["conversion_failed"])
+        if job.error:
+            with st.expander(t["view_details"]):
+                st.code(job.error)
+    elif job.status == DONE:
+        st.success(t["success"])
+        st.download_button(
+            label=t["download_button"],
+            data=job.result,
+            file_name=output_filename,
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            use_container_width=True
+        )
+    return False
+
+
 def main():
     # 记录主函数调用
     logging.info("主函数开始执行")
@@ -283,21 +411,14 @@ def main():
             # Preview input file
             st.subheader(t["input_preview"])
             try:
-                # Try to detect sheet count and use appropriate sheet
-                xl = pd.ExcelFile(input_file)
-                sheet_count = len(xl.sheet_names)
+                # Detect sheet count and use the appropriate sheet
+                input_ctx = get_parsed_upload("input", input_file, WorkbookContext)
+                sheet_count = input_ctx.sheet_count
                 sheet_to_read = 1 if sheet_count >= 2 else 0
 
-                input_df = pd.read_excel(input_file, skiprows=9, sheet_name=sheet_to_read)
-                if len(input_df) > 0:
-                    input_df = input_df.drop(index=0).reset_index(drop=True)
-                    # 将所有列转换为字符串类型
-                    input_df = input_df.astype(str)
-
-                st.dataframe(input_df.head())
-                st.caption(t["showing_rows"].format(sheet_to_read+1, len(input_df)))
-                st.text(t["columns"].format(', '.join(input_df.columns.tolist())))
-                logging.info(f"输入文件预览成功: {sheet_count}个工作表, 已读取第{sheet_to_read+1}个, {len(input_df)}行数据")
+                # 跳过表头下的第一行数据
+                _, total_rows = show_preview(t, "input", input_ctx, sheet_to_read, skiprows=9, first_row=1)
+                logging.info(f"输入文件预览成功: {sheet_count}个工作表, 已读取第{sheet_to_read+1}个, {total_rows}行数据")
             except Exception as e:
                 error_msg = f"无法预览输入文件: {str(e)}"
                 logging.error(error_msg)
@@ -306,14 +427,9 @@ def main():
             # Preview reference file
             st.subheader(t["reference_preview"])
             try:
-                reference_df = pd.read_excel(reference_file)
-                # 将参考文件的所有列也转换为字符串类型
-                reference_df = reference_df.astype(str)
-
-                st.dataframe(reference_df.head())
-                st.caption(t["showing_rows"].format(1, len(reference_df)))
-                st.text(t["columns"].format(', '.join(reference_df.columns.tolist())))
-                logging.info(f"参考文件预览成功: {len(reference_df)}行数据")
+                reference_ctx = get_parsed_upload("reference_preview", reference_file, WorkbookContext)
+                _, total_rows = show_preview(t, "reference", reference_ctx)
+                logging.info(f"参考文件预览成功: {total_rows}行数据")
             except Exception as e:
                 error_msg = f"无法预览参考文件: {str(e)}"
                 logging.error(error_msg)
@@ -323,13 +439,9 @@ def main():
             if policy_file is not None:
                 st.subheader(t["policy_preview"])
                 try:
-                    policy_df = pd.read_excel(policy_file)
-                    policy_df = policy_df.astype(str)
-
-                    st.dataframe(policy_df.head())
-                    st.caption(t["showing_rows"].format(1, len(policy_df)))
-                    st.text(t["columns"].format(', '.join(policy_df.columns.tolist())))
-                    logging.info(f"政策文件预览成功: {len(policy_df)}行数据")
+                    policy_ctx = get_parsed_upload("policy_preview", policy_file, WorkbookContext)
+                    _, total_rows = show_preview(t, "policy", policy_ctx)
+                    logging.info(f"政策文件预览成功: {total_rows}行数据")
                 except Exception as e:
                     error_msg = f"无法预览政策文件: {str(e)}"
                     logging.error(error_msg)
@@ -357,36 +469,23 @@ def main():
                 progress_container.info(t["starting_conversion"])
                 logging.info("开始转换过程")
 
-                # Save uploaded files temporarily
-                progress_container.info(t["saving_temp"])
-                logging.info("临时保存上传的文件")
-                with open("temp_input.xlsx", "wb") as f:
-                    f.write(input_file.getbuffer())
-
-                with open("temp_reference.xlsx", "wb") as f:
-                    f.write(reference_file.getbuffer())
-
-                # Save policy file with a unique name to avoid conflicts
-                import uuid
-                policy_filename = f"temp_policy_{uuid.uuid4().hex[:8]}.xlsx"
-                with open(policy_filename, "wb") as f:
-                    f.write(policy_file.getbuffer())
-                policy_path = policy_filename
-                logging.info(f"已保存政策文件: {policy_path}")
-
-                # Process the conversion
+                # Submit the conversion to the background job queue
                 progress_container.info(t["converting"])
-                logging.info(f"开始调用convert_excel函数，参数：input={input_file.name}, reference={reference_file.name}, output={output_filename}, policy={policy_path}")
+                logging.info(f"提交转换任务，参数：input={input_file.name}, reference={reference_file.name}, policy={policy_file.name}")
 
                 try:
-                    result = convert_excel("temp_input.xlsx", "temp_reference.xlsx",policy_path, output_filename )
-
-                    # Check if conversion was successful
-                    if result is None:
-                        error_msg = "转换失败，convert_excel返回None"
-                        logging.error(error_msg)
-                        st.error(t["conversion_failed"])
-                        st.stop()
+                    # Reuse the reference and policy parsed for this session; the input is handed
+                    # over as bytes because the worker thread must not share the preview's workbook
+                    reference_index = get_parsed_upload("reference", reference_file, load_reference)
+                    policy = get_parsed_upload("policy", policy_file, load_policy)
+                    job_id = get_job_queue().submit(input_file.getvalue(), reference_index, policy,
+                                                    label=input_file.name)
+                    st.session_state["conversion_job"] = job_id
+                    logging.info(f"转换任务已提交: {job_id}")
+                except JobQueueFull as e:
+                    logging.warning(f"转换队列已满: {e}")
+                    progress_container.warning(t["queue_full"])
+                    st.stop()
                 except ValueError as e:
                     # 捕获 policy 文件验证错误
                     error_msg = f"Policy 文件验证失败: {str(e)}"
@@ -398,53 +497,7 @@ def main():
                     st.info(t["policy_format_guide"])
                     st.stop()
 
-                # Clean up temp files
-                progress_container.info(t["cleaning_up"])
-                logging.info("清理临时文件")
-                import time
-
-                def safe_remove(file_path, max_retries=3, delay=1):
-                    for i in range(max_retries):
-                        try:
-                            if os.path.exists(file_path):
-                                os.close(os.open(file_path, os.O_RDONLY))  # 确保文件句柄被关闭
-                                os.remove(file_path)
-                                logging.info(f"已删除临时文件: {file_path}")
-                                return True
-                        except Exception as e:
-                            error_msg = f"无法删除文件 {file_path}: {str(e)}"
-                            logging.warning(error_msg)
-                            if i < max_retries - 1:
-                                time.sleep(delay)
-                                continue
-                            else:
-                                print(error_msg)
-                                return False
-                    return False
-
-                # 尝试删除临时文件
-                safe_remove("temp_input.xlsx")
-                safe_remove("temp_reference.xlsx")
-                safe_remove(policy_path)  # 使用实际的 policy 文件路径
-
-                progress_container.success(t["success"])
-                logging.info("转换成功完成")
-
-                # Provide download link
-                if os.path.exists(output_filename):
-                    logging.info(f"输出文件已创建: {output_filename}")
-                    with open(output_filename, "rb") as file:
-                        st.download_button(
-                            label=t["download_button"],
-                            data=file,
-                            file_name=output_filename,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                else:
-                    error_msg = f"输出文件 '{output_filename}' 未创建，转换可能已失败"
-                    logging.error(error_msg)
-                    st.error(t["output_not_created"].format(output_filename))
+                progress_container.empty()
             except Exception as e:
                 error_msg = f"转换过程中发生错误: {str(e)}"
                 logging.error(error_msg)
@@ -456,6 +509,11 @@ def main():
                 st.info(t["troubleshooting"])
                 st.markdown(t["troubleshooting_tips"])
 
+    # Show the status of this session's background conversion
+    job_pending = False
+    if st.session_state.get("conversion_job") is not None:
+        job_pending = show_conversion_job(t, get_job_queue(), st.session_state["conversion_job"], output_filename)
+
     # 添加日志查看器
     st.divider()
     st.header(t["logs"])
@@ -496,5 +554,10 @@ def main():
         st.error(f"读取日志时出错: {str(e)}")
         logging.error(f"读取日志时出错: {traceback.format_exc()}")
 
+    # 任务未结束时稍后重新运行页面以刷新状态
+    if job_pending:
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
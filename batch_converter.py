@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from excel_converter import convert_excel_bytes, load_reference
+from policy_config import PolicyConfig, load_policy
+from reference_index import REFERENCE_CACHE_DIR
+
+# 每个输入文件生成的报关单文件名后缀
+OUTPUT_SUFFIX = '_报关单.xlsx'
+
+# 汇总文件名
+SUMMARY_FILE_NAME = 'summary.csv'
+
+# 工作进程共享的参考数据和政策文件（每个进程只初始化一次）
+_shared = {}
+
+
+def collect_inputs(source):
+    """
+    Resolve the batch input argument to a list of workbook paths.
+
+    Args:
+        source (str): A directory (every .xlsx inside is converted) or a manifest
+            file listing one input path per line; relative paths in a manifest
+            are resolved against the manifest's directory. Declarations written by
+            an earlier batch (``*_报关单.xlsx``) are skipped
+
+    Returns:
+        list: Absolute paths of the input workbooks, in a stable order
+    """
+    if os.path.isdir(source):
+        files = glob.glob(os.path.join(source, '*.xlsx'))
+        # 跳过Excel打开文件时生成的锁文件，以及之前批量转换输出的报关单
+        files = [f for f in files if not os.path.basename(f).startswith('~$') and not f.endswith(OUTPUT_SUFFIX)]
+        return sorted(os.path.abspath(f) for f in files)
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    inputs = []
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or line.endswith(OUTPUT_SUFFIX):
+                continue
+            inputs.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return inputs
+
+
+def output_paths(inputs, output_dir):
+    """
+    Choose a distinct declaration path for every input.
+
+    Each input ``name.xlsx`` is written to ``name_报关单.xlsx``; inputs sharing a
+    file name (from different directories) get ``name_2_报关单.xlsx``,
+    ``name_3_报关单.xlsx``, ... in input order, and the collision is reported.
+
+    Args:
+        inputs (list): Paths of the input workbooks
+        output_dir (str): Directory receiving the declarations
+
+    Returns:
+        list: The output path of each input, in the same order
+    """
+    paths, used = [], set()
+    for input_path in inputs:
+        stem = os.path.splitext(os.path.basename(input_path))[0]
+        name, counter = stem + OUTPUT_SUFFIX, 1
+        while name.lower() in used:
+            counter += 1
+            name = f"{stem}_{counter}{OUTPUT_SUFFIX}"
+        if counter > 1:
+            print(f"Warning: output name of {input_path} is already taken, writing {name} instead")
+        used.add(name.lower())
+        paths.append(os.path.join(output_dir, name))
+    return paths
+
+
+def _init_worker(reference_index, policy, quiet):
+    """Store the shared reference and policy in the worker process."""
+    _shared['reference'] = reference_index
+    _shared['policy'] = policy
+    _shared['quiet'] = quiet
+
+
+def _convert_one(input_path, output_path):
+    """
+    Convert a single input using the shared reference and policy.
+
+    Returns:
+        dict: One summary row (input, output, status, seconds, error)
+    """
+    start = time.perf_counter()
+    status, error = 'ok', ''
+    try:
+        with open(input_path, 'rb') as f:
+            input_bytes = f.read()
+        log = io.StringIO() if _shared.get('quiet') else sys.stdout
+        with contextlib.redirect_stdout(log):
+            result = convert_excel_bytes(input_bytes, _shared['reference'], _shared['policy'])
+        if result is None:
+            status, error = 'failed', 'conversion returned no output'
+        else:
+            with open(output_path, 'wb') as f:
+                f.write(result)
+    except Exception as e:
+        status, error = 'failed', str(e)
+
+    return {
+        'input': input_path,
+        'output': output_path if status == 'ok' else '',
+        'status': status,
+        'seconds': round(time.perf_counter() - start, 3),
+        'error': error,
+    }
+
+
+def convert_batch(inputs, reference_file, policy_file, output_dir, jobs=1, quiet=False, reference_cache_dir=None):
+    """
+    Convert many inputs against one reference and policy.
+
+    The reference index is loaded and the policy is parsed once, then shared with every
+    conversion. With ``jobs > 1`` the conversions are spread over a process pool
+    whose workers receive the shared data once at start-up.
+
+    Args:
+        inputs (list): Paths of the input workbooks
+        reference_file (str): Path to the reference Excel file
+        policy_file (str, optional): Path to the policy file; default values are used if omitted
+        output_dir (str): Directory that receives one declaration per input and the summary CSV
+        jobs (int): Number of worker processes
+        quiet (bool): Suppress the per-file conversion log
+        reference_cache_dir (str, optional): Directory of reference index snapshots reused
+            across batches, see :func:`reference_index.load_reference_index`
+
+    Returns:
+        pandas.DataFrame: The summary (one row per input), also written to ``summary.csv``
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    reference_index = load_reference(reference_file, cache_dir=reference_cache_dir)
+    if policy_file and os.path.exists(policy_file):
+        try:
+            policy = load_policy(policy_file)
+        except Exception as e:
+            print(f"Error reading policy file: {e}. Using default values.")
+            policy = PolicyConfig()
+    else:
+        print(f"Policy file {policy_file} not found. Using default values.")
+        policy = PolicyConfig()
+
+    outputs = output_paths(inputs, output_dir)
+    rows = []
+    if jobs <= 1:
+        _init_worker(reference_index, policy, quiet)
+        for input_path, output_path in zip(inputs, outputs):
+            rows.append(_convert_one(input_path, output_path))
+            print(f"[{len(rows)}/{len(inputs)}] {rows[-1]['status']}: {input_path}")
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(reference_index, policy, quiet)) as pool:
+            futures = [pool.submit(_convert_one, input_path, output_path)
+                       for input_path, output_path in zip(inputs, outputs)]
+            for future in as_completed(futures):
+                rows.append(future.result())
+                print(f"[{len(rows)}/{len(inputs)}] {rows[-1]['status']}: {rows[-1]['input']}")
+
+    # 按输入顺序输出汇总
+    order = {path: i for i, path in enumerate(inputs)}
+    summary = pd.DataFrame(sorted(rows, key=lambda row: order[row['input']]),
+                           columns=['input', 'output', 'status', 'seconds', 'error'])
+    summary_path = os.path.join(output_dir, SUMMARY_FILE_NAME)
+    summary.to_csv(summary_path, index=False, encoding='utf-8-sig')
+    print(f"Summary written to: {summary_path}")
+    return summary
+
+
+def main():
+    """
+    Command-line entry point for batch conversion.
+
+    Command-line usage:
+    python batch_converter.py invoices/ reference.xlsx policy.xlsx out/ --jobs 4
+    """
+    parser = argparse.ArgumentParser(description='Convert many input Excel files against one reference and policy')
+    parser.add_argument('inputs', help='Directory of input Excel files, or a manifest file listing one path per line')
+    parser.add_argument('reference', help='Path to the reference Excel file')
+    parser.add_argument('policy', help='Path to the policy Excel file')
+    parser.add_argument('output_dir', help='Directory to save the declarations and summary.csv')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Number of worker processes')
+    parser.add_argument('--quiet', action='store_true', help='Suppress the per-file conversion log')
+    parser.add_argument('--reference-cache', nargs='?', const=REFERENCE_CACHE_DIR, metavar='DIR',
+                        help=f'Keep a snapshot of the parsed reference in DIR (default: {REFERENCE_CACHE_DIR})')
+
+    args = parser.parse_args()
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print(f"Error: No input files found in '{args.inputs}'.")
+        sys.exit(1)
+
+    summary = convert_batch(inputs, args.reference, args.policy, args.output_dir, jobs=args.jobs, quiet=args.quiet,
+                            reference_cache_dir=args.reference_cache)
+    if (summary['status'] != 'ok').any():
+        sys.exit(1)  # Exit with error code if any conversion failed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic workload generator and benchmark for the conversion pipeline.
+
+The generated workbooks follow the layout of a real supplier file: a packing
+list sheet with a "Total" row, and an invoice sheet with the seller in A1, the
+Buyer:/Invoice Number: cells, 9 header rows above the item table, an S/N
+column and a footer with the delivery term. The matching reference catalog
+holds the requested number of material codes.
+
+Each case is converted end to end with ``run_conversion`` and reports the
+per-stage timings, the throughput in items per second and the peak Python
+heap (measured by tracemalloc in a separate pass, so it does not distort the
+timings). Every run starts cold: the item table, policy and template memos are
+cleared first and no reference snapshot is used, so each stage is timed as a
+first conversion pays for it. The item sheet is also merged on its own to time
+the package-level merge the conversion uses.
+
+Command-line usage:
+python benchmark.py --items 10 1000 10000 --codes 1000 100000 --json bench.json
+python benchmark.py --baseline bench.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from openpyxl import Workbook, load_workbook
+
+from excel_converter import clear_prepared_items, run_conversion
+from item_writer import write_item_sheet
+from policy_config import clear_policy_cache
+from template_manifest import FOOTER_TEMPLATE_FILE, HEADER_TEMPLATE_FILE, clear_compiled_templates
+from xml_merge import merge_packages
+
+# 生成的测试数据默认保存目录
+WORKLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'benchmark')
+
+# 默认规模：明细行数 × 参考库编码数
+DEFAULT_ITEMS = (10, 1000, 10000)
+DEFAULT_CODES = (1000, 100000)
+
+# 发票明细表头（第10行）
+INVOICE_COLUMNS = ['S/N', 'Part Number', '名称', 'Model Number', 'Unit Price (CIF, USD)', 'Quantity', 'Unit',
+                   'Total Amount (CIF, USD)', 'Total Net Weight (kg)']
+REFERENCE_COLUMNS = INVOICE_COLUMNS + ['商品编码', '申报要素']
+
+# 发票中在参考库里找不到的物料编码比例
+UNMATCHED_SHARE = 0.02
+
+_NAMES = ['铣刀', '红外发热管', '联轴器', '齿轮', '发热板', '轴承', '电机', '传感器']
+
+
+def material_code(i):
+    """Return the synthetic material code number ``i``."""
+    return f'E100.{i:09d}'
+
+
+def generate_reference(path, codes, seed=0):
+    """
+    Write a reference catalog with ``codes`` material codes.
+
+    Args:
+        path (str): Target .xlsx path
+        codes (int): Number of catalog rows
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(REFERENCE_COLUMNS)
+    for i in range(codes):
+        name = _NAMES[i % len(_NAMES)]
+        ws.append([i + 1, material_code(i), name, '/', round(rng.uniform(0.1, 50), 4), rng.randint(1, 500), '个',
+                   None, None, 8400000000 + i % 99999, f'{name}|无品牌|无型号'])
+    wb.save(path)
+
+
+def generate_input(path, items, codes, seed=0):
+    """
+    Write an input workbook (packing list + invoice) with ``items`` line items.
+
+    Args:
+        path (str): Target .xlsx path
+        items (int): Number of invoice / packing list rows
+        codes (int): Size of the reference catalog the items are drawn from
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    rows = []
+    for sn in range(1, items + 1):
+        code = rng.randrange(codes) if rng.random() >= UNMATCHED_SHARE else codes + sn
+        quantity = rng.randint(1, 500)
+        price = round(rng.uniform(0.1, 50), 4)
+        rows.append((sn, material_code(code), _NAMES[code % len(_NAMES)], quantity, price,
+                     round(rng.uniform(0.01, 5), 2)))
+
+    wb = Workbook(write_only=True)
+    seller = 'Example Digital Technology (Shenzhen) Co., LTD'
+
+    pl = wb.create_sheet('PL')
+    pl.append([seller])
+    pl.append(['Packing List'])
+    for _ in range(11):
+        pl.append([])
+    pl.append(['S/N', 'Part Number', 'Description', 'Model', 'Qty', 'Cartons', 'CBM', 'G.W.(kg)', 'N.W.(kg)',
+               'Carton No.'])
+    cartons = gross = net = 0
+    for sn, code, name, quantity, _, weight in rows:
+        cartons += 1
+        gross += weight + 0.2
+        net += weight
+        pl.append([sn, code, name, '/', quantity, 1, 0.01, round(weight + 0.2, 2), weight, f'F{sn}'])
+    pl.append([None, None, 'Total', None, sum(r[3] for r in rows), cartons, round(cartons * 0.01, 2),
+               round(gross, 2), round(net, 2)])
+    pl.append([f'PACKED IN {cartons} PACKAGES ONLY.'])
+
+    ci = wb.create_sheet('CI')
+    ci.append([seller])
+    ci.append(['Room 1501, Example Tower, Shenzhen'])
+    ci.append(['Commercial Invoice'])
+    ci.append(['Buyer:           Example Buyer Pvt Ltd', None, None, None, None, 'Invoice Number:', 9999])
+    for label in ('ADD:', 'Attn: ', 'EMAIL:', 'Tel: ', None):
+        ci.append([label])
+    ci.append(INVOICE_COLUMNS)
+    for sn, code, name, quantity, price, weight in rows:
+        ci.append([sn, code, name, '/', price, quantity, '个', round(price * quantity, 4), weight])
+    ci.append([None, None, 'Total', None, None, sum(r[3] for r in rows), None,
+               round(sum(r[3] * r[4] for r in rows), 4), round(net, 2)])
+    ci.append([])
+    for line in ('Amount in Words: SAY USD ONLY.', 'Country Of Origin: CHINA', 'Payment Term: T/T',
+                 'Delivery Term: CIF', 'Bank Name: Example Bank', 'SWIFT No.: EXAMPLE0000'):
+        ci.append([line])
+    wb.save(path)
+
+
+def ensure_workload(items, codes, workload_dir=WORKLOAD_DIR, seed=0):
+    """
+    Generate the input and reference workbooks for a case, reusing earlier files.
+
+    Returns:
+        tuple: ``(input_path, reference_path)``
+    """
+    os.makedirs(workload_dir, exist_ok=True)
+    reference_path = os.path.join(workload_dir, f'reference_{codes}_{seed}.xlsx')
+    input_path = os.path.join(workload_dir, f'input_{items}_{codes}_{seed}.xlsx')
+    if not os.path.exists(reference_path):
+        generate_reference(reference_path, codes, seed)
+    if not os.path.exists(input_path):
+        generate_input(input_path, items, codes, seed)
+    return input_path, reference_path
+
+
+def _time_merge(items_df):
+    """Time merging the templates with a freshly streamed item sheet."""
+    item_sheet = io.BytesIO()
+    write_item_sheet(items_df, item_sheet)
+    sources = [load_workbook(HEADER_TEMPLATE_FILE), item_sheet.getvalue(), load_workbook(FOOTER_TEMPLATE_FILE)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        merge_packages(sources)
+        return time.perf_counter() - start
+
+
+def _clear_caches():
+    """Forget the in-process memos so that the next conversion runs cold."""
+    clear_prepared_items()
+    clear_policy_cache()
+    clear_compiled_templates()
+
+
+def run_case(items, codes, policy_file, output_dir, repeat=3, memory=True, workload_dir=WORKLOAD_DIR):
+    """
+    Benchmark one (items, codes) case.
+
+    Args:
+        items (int): Number of line items
+        codes (int): Number of reference catalog codes
+        policy_file (str): Policy workbook used for every run
+        output_dir (str): Directory for the item sheet and merged declaration written by each run
+        repeat (int): Number of timed runs; the median is reported
+        memory (bool): Also measure the peak Python heap in an extra run
+
+    Returns:
+        dict: The case result (sizes, median seconds, per-stage medians,
+            throughput, merge seconds and peak memory)
+    """
+    input_path, reference_path = ensure_workload(items, codes, workload_dir)
+    output_path = os.path.join(output_dir, f'output_{items}_{codes}.xlsx')
+    merged_path = os.path.join(output_dir, f'merged_{items}_{codes}.xlsx')
+
+    totals, stages, merges = [], {}, []
+    for _ in range(repeat):
+        # 每次都从头转换，不复用上一轮缓存的商品明细、policy 和模板
+        _clear_caches()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = run_conversion(input_path, reference_path, policy_file, output_path, merged_path,
+                                        reference_cache_dir=None)
+            elapsed = time.perf_counter() - start
+        if result is None:
+            raise RuntimeError(f"Conversion failed for items={items}, codes={codes}")
+        totals.append(elapsed)
+        for stage, seconds in result.timings.spans:
+            stages.setdefault(stage, []).append(seconds)
+        merges.append(_time_merge(result.items))
+
+    peak_mb = None
+    if memory:
+        _clear_caches()
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_conversion(input_path, reference_path, policy_file, output_path, merged_path,
+                               reference_cache_dir=None)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    seconds = statistics.median(totals)
+    return {
+        'items': items,
+        'codes': codes,
+        'seconds': round(seconds, 4),
+        'items_per_second': round(items / seconds, 1) if seconds else None,
+        'merge_seconds': round(statistics.median(merges), 4),
+        'peak_memory_mb': round(peak_mb, 1) if peak_mb is not None else None,
+        'stages': {stage: round(statistics.median(values), 4) for stage, values in stages.items()},
+    }
+
+
+def format_report(results):
+    """Return the benchmark results as a printable table."""
+    lines = [f"{'items':>8} {'codes':>9} {'seconds':>9} {'items/s':>10} {'merge s':>8} {'peak MB':>8}  slowest stages"]
+    for r in results:
+        slowest = sorted(r['stages'].items(), key=lambda kv: kv[1], reverse=True)[:3]
+        stages = ', '.join(f"{stage} {seconds:.3f}" for stage, seconds in slowest)
+        peak = f"{r['peak_memory_mb']:.1f}" if r['peak_memory_mb'] is not None else '-'
+        lines.append(f"{r['items']:>8} {r['codes']:>9} {r['seconds']:>9.3f} {r['items_per_second']:>10.1f} "
+                     f"{r['merge_seconds']:>8.3f} {peak:>8}  {stages}")
+    return "\n".join(lines)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare results against a saved baseline.
+
+    Args:
+        results (list): Current case results
+        baseline (list): Case results loaded from a previous ``--json`` run
+        tolerance (float): Allowed relative slowdown, e.g. 0.25 for 25%
+
+    Returns:
+        list: One message per case that is slower than the baseline allows
+    """
+    previous = {(r['items'], r['codes']): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get((r['items'], r['codes']))
+        if base is None:
+            continue
+        if r['seconds'] > base['seconds'] * (1 + tolerance):
+            regressions.append(f"items={r['items']} codes={r['codes']}: {r['seconds']:.3f}s "
+                               f"vs baseline {base['seconds']:.3f}s")
+    return regressions
+
+
+def main():
+    """
+    Command-line entry point for the benchmark.
+
+    Command-line usage:
+    python benchmark.py --items 10 1000 100000 --codes 1000 1000000 --repeat 3 --json bench.json
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the conversion pipeline on synthetic workloads')
+    parser.add_argument('--items', type=int, nargs='+', default=list(DEFAULT_ITEMS), help='Line item counts')
+    parser.add_argument('--codes', type=int, nargs='+', default=list(DEFAULT_CODES), help='Reference catalog sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case (the median is reported)')
+    parser.add_argument('--policy', default='policy.xlsx', help='Policy file used for every run')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory pass')
+    parser.add_argument('--json', metavar='PATH', help='Write the results to a JSON file (usable as a baseline)')
+    parser.add_argument('--baseline', metavar='PATH', help='Fail if a case is slower than this saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown against the baseline')
+
+    args = parser.parse_args()
+    output_dir = os.path.join(WORKLOAD_DIR, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    for codes in args.codes:
+        for items in args.items:
+            print(f"Running items={items} codes={codes} ...")
+            results.append(run_case(items, codes, args.policy, output_dir, repeat=args.repeat,
+                                    memory=not args.no_memory))
+
+    print(format_report(results))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Results written to: {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
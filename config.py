@@ -33,5 +33,19 @@ FIXED_COLUMNS = {
     # Add more columns as needed
 }
 
+# How to resolve a material code that appears more than once in the reference file:
+# 'first' or 'last' keeps that row, 'error' rejects the reference file
+DUPLICATE_CODE_POLICY = 'last'
+
+# Where to find the invoice header fields (sheet 2). Each field is either a fixed
+# cell {'cell': 'A1'} or a regex searched in the top or bottom rows of the sheet;
+# 'value': 'next_cell' takes the cell to the right of the matching label
+INVOICE_HEADER_FIELDS = {
+    'seller': {'cell': 'A1'},
+    'buyer': {'band': 'top', 'pattern': r'Buyer:(.*)'},
+    'invoice_number': {'band': 'top', 'pattern': r'Invoice Number:', 'value': 'next_cell'},
+    'delivery_term': {'band': 'bottom', 'pattern': r'Delivery Term:(.*)'},
+}
+
 # Output file name
 OUTPUT_FILE_NAME = 'output.xlsx'
\ No newline at end of file
@@ -1,10 +1,22 @@
 import pandas as pd
+import io
 import os
 import argparse
 import sys
-import subprocess
-from openpyxl import load_workbook
-import shutil
+import threading
+from collections import OrderedDict
+from merge import MERGED_FILE_NAME
+from item_writer import write_item_sheet
+from xml_merge import merge_packages
+from workbook_context import WorkbookContext, is_path, source_name
+from reference_index import REFERENCE_CACHE_DIR, ReferenceIndex, content_hash, load_reference_index
+from invoice_header import INVOICE_HEADER_FIELDS as DEFAULT_INVOICE_HEADER_FIELDS, HeaderExtractor
+from packing_list import scan_totals
+from policy_config import PolicyConfig, load_policy
+from result_cache import conversion_key, source_fingerprint
+from stage_timer import StageTimer
+from template_manifest import (FOOTER_TEMPLATE_FILE, HEADER_TEMPLATE_FILE, load_footer_template,
+                               load_header_template)
 
 # =============================================================================
 # Configuration Section
@@ -24,6 +36,13 @@ MATCHED_COLUMNS = ['MatchedColumn1', 'MatchedColumn2']
 # Columns with fixed/static values to be added to the output
 FIXED_COLUMNS = {'FixedColumn1': 'Fixed Value 1', 'FixedColumn2': 'Fixed Value 2'}
 
+# How to resolve a material code that appears more than once in the reference file:
+# 'first' or 'last' keeps that row, 'error' rejects the reference file
+DUPLICATE_CODE_POLICY = 'last'
+
+# Invoice header field specs (see invoice_header.py)
+INVOICE_HEADER_FIELDS = DEFAULT_INVOICE_HEADER_FIELDS
+
 
 fill_dict = {
     "境内发货人": "发票卖方",
@@ -61,8 +80,72 @@ try:
     # Note: COLUMN_MAPPING is not imported from config.py and will always use the default
 except ImportError:
     print("Warning: config.py file not found. Using default configuration.")
+else:
+    # 后来新增的配置项是可选的，缺少它们的旧 config.py 仍然生效
+    import config
+    DUPLICATE_CODE_POLICY = getattr(config, 'DUPLICATE_CODE_POLICY', DUPLICATE_CODE_POLICY)
+    INVOICE_HEADER_FIELDS = getattr(config, 'INVOICE_HEADER_FIELDS', INVOICE_HEADER_FIELDS)
+
+# 发票表头字段提取器（模式只编译一次）
+_header_extractor = HeaderExtractor(INVOICE_HEADER_FIELDS)
+
+# 与政策无关的商品明细结果的进程内缓存（按输入和参考文件内容），只保留最近使用的几份；
+# 只有显式开启 memoize 的调用（网页应用）才使用
+PREPARED_ITEMS_CACHE_SIZE = 8
+_prepared_items = OrderedDict()
+_prepared_items_lock = threading.Lock()
+
+
+# Stages of the conversion pipeline in execution order, as recorded by StageTimer
+PIPELINE_STAGES = ('input read', 'cleaning', 'reference read', 'matching', 'item sheet build', 'PL totals',
+                   'invoice header', 'policy', 'fees', 'template fill', 'merge')
+
+
+class ConversionResult:
+    """
+    The outcome of a conversion, for library callers.
+
+    Args:
+        items (pandas.DataFrame): The declaration items
+        data (bytes): The merged declaration workbook (None if merging failed)
+        timings (StageTimer): Wall-clock time spent in each stage
+        failures (list): Stages that failed and were skipped or fell back to defaults
+    """
+
+    def __init__(self, items, data, timings, failures=None):
+        self.items = items
+        self.data = data
+        self.timings = timings
+        self.failures = failures or []
+
+
+class PreparedItems:
+    """
+    The part of a conversion that does not depend on the policy workbook.
+
+    Instances are shared between conversions of the same input and reference,
+    so they must not be modified once built.
 
-def convert_excel(input_file, reference_file, policy_file,output_file):
+    Args:
+        items (pandas.DataFrame): The declaration items
+        item_sheet (bytes): The item sheet as a streamed .xlsx package, only read by the merge
+        totals (tuple): ``(count, gross, net)`` from the packing list totals row
+        header_values (dict): Declaration header values taken from the input
+            (PL totals and invoice header), keyed like ``fill_dict``
+        failures (list): Stages whose values could not be read from the input
+    """
+
+    def __init__(self, items, item_sheet, totals, header_values, failures=None):
+        self.items = items
+        self.item_sheet = item_sheet
+        self.totals = totals
+        self.header_values = header_values
+        self.failures = failures or []
+
+
+def convert_excel(input_file, reference_file, policy_file,output_file, merged_file=None,
+                  header_template=HEADER_TEMPLATE_FILE, footer_template=FOOTER_TEMPLATE_FILE,
+                  reference_cache_dir=REFERENCE_CACHE_DIR):
     """
     Convert Excel file according to specified requirements.
 
@@ -79,11 +162,47 @@ def convert_excel(input_file, reference_file, policy_file,output_file):
         reference_file (str): Path to the reference Excel file (for material code matching)
         output_file (str): Path to save the output Excel file
         policy_file (str, optional): Path to the policy file containing exchange rates and shipping info
+        merged_file (str, optional): Path to save the merged 报关单 workbook; defaults to
+            报关单.xlsx next to this module
+        header_template, footer_template (str or bytes, optional): The 1.xlsx / 3.xlsx templates
+        reference_cache_dir (str, optional): Directory of reference index snapshots, so an
+            unchanged reference is not parsed again on the next run; None to disable
 
     Returns:
         pandas.DataFrame: The processed DataFrame that was saved to the output file
         None: If an error occurred during conversion
     """
+    result = run_conversion(input_file, reference_file, policy_file, output_file, merged_file,
+                            header_template, footer_template, reference_cache_dir)
+    # Return the DataFrame for potential further processing or analysis
+    return result.items if result is not None else None
+
+
+def run_conversion(input_file, reference_file, policy_file, output_file, merged_file=None,
+                   header_template=HEADER_TEMPLATE_FILE, footer_template=FOOTER_TEMPLATE_FILE,
+                   reference_cache_dir=REFERENCE_CACHE_DIR):
+    """
+    Convert files on disk like :func:`convert_excel`, returning the full result.
+
+    Args:
+        input_file (str): Path to the first Excel file (source data)
+        reference_file (str): Path to the reference Excel file (for material code matching)
+        policy_file (str, optional): Path to the policy file containing exchange rates and shipping info
+        output_file (str): Path to save the output Excel file
+        merged_file (str, optional): Path to save the merged 报关单 workbook; defaults to
+            报关单.xlsx next to this module
+        header_template, footer_template (str or bytes, optional): The 1.xlsx / 3.xlsx templates
+        reference_cache_dir (str, optional): Directory of reference index snapshots, so an
+            unchanged reference is not parsed again on the next run; None to disable
+
+    Returns:
+        ConversionResult: The items, the merged workbook bytes and the per-stage timings
+        None: If an error occurred during conversion
+    """
+    if not output_file:
+        print("Error: No output file specified.")
+        return None
+
     # Check if input files exist
     if not os.path.exists(input_file):
         print(f"Error: Input file '{input_file}' not found.")
@@ -103,23 +222,188 @@ def convert_excel(input_file, reference_file, policy_file,output_file):
                 print(f"  - {file}")
         return None
 
+    # 使用policy_file参数代替硬编码的'policy.xlsx'
+    result = _convert(input_file, reference_file, policy_file if policy_file else 'policy.xlsx',
+                      header_template, footer_template, reference_cache_dir=reference_cache_dir)
+    if result is None:
+        return None
+    timer = result.timings
+
+    # Save the output Excel file
+    timer.begin('item write')
+    print(f"Saving output file: {output_file}")
+    write_item_sheet(result.items, output_file)
+
+    if result.data is not None:
+        timer.begin('merged save')
+        if merged_file is None:
+            merged_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), MERGED_FILE_NAME)
+        with open(merged_file, 'wb') as f:
+            f.write(result.data)
+        print("save excel to: " + merged_file)
+    timer.end()
+
+    return result
+
+
+
+
+def convert_excel_bytes(input_file, reference_file, policy_file=None, header_template=HEADER_TEMPLATE_FILE,
+                        footer_template=FOOTER_TEMPLATE_FILE, timer=None, cache=None, memoize=False):
+    """
+    Convert in-memory Excel files and return the merged declaration as bytes.
+
+    This is the file-free variant of :func:`convert_excel`: nothing is written
+    to disk, and the result is the merged 报关单 workbook rather than the bare
+    item sheet. With a ``cache``, a request identical to an earlier one (same
+    files, configuration and templates) returns the stored result directly.
+    With ``memoize``, the policy-independent stages are kept in memory, so the
+    same input converted again with a revised policy skips them.
+
+    Args:
+        input_file (bytes, file-like or WorkbookContext): The input workbook (packing list and
+            invoice), or a context that already holds it parsed
+        reference_file (bytes, file-like or ReferenceIndex): The reference workbook (for material
+            code matching), or an index already returned by :func:`load_reference`
+        policy_file (bytes, file-like or PolicyConfig, optional): The policy workbook, or a policy
+            already parsed by :func:`policy_config.load_policy`; default values are used if omitted
+        header_template, footer_template (str or bytes, optional): The 1.xlsx / 3.xlsx templates
+        timer (StageTimer, optional): Timer that records the stages, e.g. to follow progress
+        cache (ResultCache, optional): Cache of earlier results, see :mod:`result_cache`
+        memoize (bool): Keep the item table for later conversions of the same input and
+            reference; only worth it where inputs repeat, such as the web app
+
+    Returns:
+        bytes: The merged declaration workbook
+        None: If an error occurred during conversion
+    """
+    key = None
+    if cache is not None:
+        key = conversion_key(input_file, reference_file, policy_file, header_template, footer_template,
+                             _conversion_settings())
+        data = cache.get(key)
+        if data is not None:
+            print("Returning cached conversion result")
+            return data
+
+    result = _convert(input_file, reference_file, policy_file, header_template, footer_template, timer, memoize)
+    if result is None or result.data is None:
+        return None
+
+    # 有阶段出错时的结果不缓存，避免一次偶发错误被一直返回
+    if cache is not None and not result.failures:
+        cache.put(key, result.data)
+    return result.data
+
+
+def clear_prepared_items():
+    """Forget all memoized item tables, e.g. to time a conversion from scratch."""
+    with _prepared_items_lock:
+        _prepared_items.clear()
+
+
+def _items_key(input_file, reference_file):
+    """Return the memo key of the policy-independent stages, or None if the inputs cannot be hashed."""
+    parts = [source_fingerprint(input_file), source_fingerprint(reference_file)]
+    if None in parts:
+        return None
+    settings = _conversion_settings()
+    settings['column_mapping'] = COLUMN_MAPPING
+    return content_hash(repr((parts, sorted(settings.items()))).encode('utf-8'))
+
+
+def _get_prepared_items(key):
+    if key is None:
+        return None
+    with _prepared_items_lock:
+        prepared = _prepared_items.get(key)
+        if prepared is not None:
+            _prepared_items.move_to_end(key)
+        return prepared
+
+
+def _store_prepared_items(key, prepared):
+    if key is None:
+        return
+    with _prepared_items_lock:
+        _prepared_items[key] = prepared
+        while len(_prepared_items) > PREPARED_ITEMS_CACHE_SIZE:
+            _prepared_items.popitem(last=False)
+
+
+def _conversion_settings():
+    """Return the configuration values that determine the conversion output."""
+    return {
+        'preserved_columns': PRESERVED_COLUMNS,
+        'matched_columns': MATCHED_COLUMNS,
+        'fixed_columns': FIXED_COLUMNS,
+        'material_code_column': MATERIAL_CODE_COLUMN,
+        'duplicate_code_policy': DUPLICATE_CODE_POLICY,
+        'invoice_header_fields': INVOICE_HEADER_FIELDS,
+    }
+
+
+def load_reference(reference_file, cache_dir=None):
+    """
+    Load the reference (material code) workbook as a compiled index.
+
+    Callers converting many inputs against the same reference can load it once
+    and pass the result to :func:`convert_excel_bytes`.
+
+    Args:
+        reference_file (str, bytes or file-like): The reference workbook
+        cache_dir (str, optional): Directory of persistent index snapshots, served
+            when the file content has not changed; by default nothing is written to disk
+
+    Returns:
+        ReferenceIndex: The reference table indexed by material code
+    """
+    return load_reference_index(reference_file, MATERIAL_CODE_COLUMN, DUPLICATE_CODE_POLICY, cache_dir=cache_dir)
+
+
+def _template_available(template):
+    """Return True if a template path exists, or the template was given as content."""
+    return template is not None and (not is_path(template) or os.path.exists(template))
+
+
+def _prepare_items(input_file, reference_file, timer, reference_cache_dir=None):
+    """
+    Run the stages that depend only on the input and reference workbooks.
+
+    Returns:
+        PreparedItems: The item table, item sheet, PL totals and invoice header values
+        None: If the input could not be read
+    """
+    header_values = {}
+    failures = []
+
     # Read the input Excel file
-    print(f"Reading input file: {input_file}")
+    timer.begin('input read')
+    print(f"Reading input file: {source_name(input_file)}")
 
     try:
-        # Get the number of sheets in the Excel file
-        excel_file = pd.ExcelFile(input_file)
-        sheet_count = len(excel_file.sheet_names)
+        # Load the input workbook once; every stage below derives its view from it
+        input_ctx = input_file if isinstance(input_file, WorkbookContext) else WorkbookContext(input_file)
+        sheet_count = input_ctx.sheet_count
 
         # Choose the appropriate sheet based on sheet count
         # If there are 2 or more sheets, use the second sheet (index 1)
         # Otherwise, use the first sheet (index 0)
         sheet_to_read = 1 if sheet_count >= 2 else 0
-        df_input = pd.read_excel(input_file, skiprows=9, sheet_name=sheet_to_read)
+
+        # Stream only the mapped columns and stop at the first row without an S/N,
+        # so formatted blank rows below the item table are never parsed; the same
+        # pass keeps the invoice header and footer rows for the header stage
+        material_code_eng = next((k for k, v in COLUMN_MAPPING.items() if v == MATERIAL_CODE_COLUMN), MATERIAL_CODE_COLUMN)
+        df_input = input_ctx.read_table(sheet_to_read, skiprows=9,
+                                        columns=set(COLUMN_MAPPING) | {material_code_eng}, stop_column='S/N',
+                                        footer=_header_extractor.footer_rows)
     except Exception as e:
+        timer.end()
         print(f"Error reading input file: {e}")
         return None
 
+    timer.begin('cleaning')
     # Data cleaning operations
     # =======================
 
@@ -143,8 +427,8 @@ def convert_excel(input_file, reference_file, policy_file,output_file):
         # Convert NO. column to string and strip whitespace
         df_input['S/N'] = df_input['S/N'].astype(str).str.strip()
 
-        # Find the first empty NO. row (containing 'nan', '', or ' ')
-        empty_no_index = df_input[df_input['S/N'].isin(['nan', '', ' '])].index
+        # Find the first empty NO. row (missing, or containing 'nan', '', or ' ')
+        empty_no_index = df_input[df_input['S/N'].isna() | df_input['S/N'].isin(['nan', '', ' '])].index
         if len(empty_no_index) > 0:
             first_empty_index = empty_no_index[0]
             # Keep only rows before the first empty NO.
@@ -153,10 +437,14 @@ def convert_excel(input_file, reference_file, policy_file,output_file):
     print(f"Input file columns: {df_input.columns.tolist()}")
 
     # Read the reference Excel file used for matching material codes
-    print(f"Reading reference file: {reference_file}")
-    df_reference = pd.read_excel(reference_file)
+    timer.begin('reference read')
+    if isinstance(reference_file, ReferenceIndex):
+        reference_index = reference_file
+    else:
+        reference_index = load_reference(reference_file, cache_dir=reference_cache_dir)
 
     # Create a new DataFrame for the output
+    timer.begin('matching')
     df_output = pd.DataFrame()
 
     # Define the desired column order for the output file
@@ -191,38 +479,36 @@ def convert_excel(input_file, reference_file, policy_file,output_file):
             print(f"Warning: Column '{col}' not found in input file")
 
     # Match columns by material code (yellow headers)
-    # First, find the English column name that corresponds to the material code column
-    material_code_eng = next((k for k, v in COLUMN_MAPPING.items() if v == MATERIAL_CODE_COLUMN), MATERIAL_CODE_COLUMN)
+    # material_code_eng is the English column name that corresponds to the material code column
     print(f"Looking for material code column: {material_code_eng} or {MATERIAL_CODE_COLUMN}")
 
     # Check if the material code columns exist in both files before attempting to match
-    if material_code_eng in df_input.columns and MATERIAL_CODE_COLUMN in df_reference.columns:
+    if (material_code_eng in df_input.columns and reference_index.has_material_codes
+            and reference_index.material_code_column == MATERIAL_CODE_COLUMN):
         print("Found material code columns in both files")
 
-        # Create a mapping dictionary for faster lookups
-        # This avoids expensive DataFrame merges for each matched column
-        reference_dict = {}
+        # Resolve the matched columns available in the reference file
+        matched_columns = []
         for col in MATCHED_COLUMNS:
             if col.upper() == '商品编码':
                 col = "商品编码"
-            if col in df_reference.columns:
-                print(f"Creating mapping for column '{col}'")
-                reference_dict[col] = df_reference.set_index(MATERIAL_CODE_COLUMN)[col].to_dict()
+            if col in reference_index:
+                matched_columns.append(col)
             else:
                 print(f"Warning: Matched column '{col}' not found in reference file")
 
-        # Add matched columns to output DataFrame using the dictionary mapping
-        for col in MATCHED_COLUMNS:
-            if col in reference_dict:
-                print(f"Applying mapping for column '{col}'")
-                if col == "商品编码":
-                    df_output["商品编码"] = df_input[material_code_eng].map(reference_dict[col])
-                # Use the material code from input to look up values in the reference dictionary
-                df_output[col] = df_input[material_code_eng].map(reference_dict[col])
+        # Fill all matched columns with a single join against the reference index
+        print(f"Matching columns {matched_columns} by material code")
+        matched, unmatched_codes = reference_index.match(df_input[material_code_eng], matched_columns)
+        for col in matched_columns:
+            df_output[col] = matched[col]
+
+        if unmatched_codes:
+            print(f"Warning: {len(unmatched_codes)} material codes not found in reference file: {unmatched_codes}")
     else:
         print(f"Warning: Material code column not found in one of the files")
         print(f"Input columns available: {df_input.columns.tolist()}")
-        print(f"Reference columns available: {df_reference.columns.tolist()}")
+        print(f"Reference columns available: {reference_index.columns}")
 
     # Add fixed columns with static values
     for col, value in FIXED_COLUMNS.items():
@@ -235,259 +521,125 @@ def convert_excel(input_file, reference_file, policy_file,output_file):
     df_output = df_output.reindex(columns=column_order)
     print(f"Final columns: {df_output.columns.tolist()}")
 
-    # Save the output Excel file
-    print(f"Saving output file: {output_file}")
-
-    # Create a new Excel writer object
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # Write the main data
-        df_output.to_excel(writer, index=False)
-
-        # Get the worksheet
-        worksheet = writer.sheets['Sheet1']
-
-        # Set column widths
-        for idx, col in enumerate(df_output.columns):
-            worksheet.column_dimensions[chr(65 + idx)].width = 15
+    timer.begin('item sheet build')
+    # Stream the item sheet into an in-memory .xlsx package for the merge, so a
+    # large declaration never exists as openpyxl cell objects
+    items_buffer = io.BytesIO()
+    write_item_sheet(df_output, items_buffer)
 
     print("Conversion completed successfully!")
 
     # 处理1.xlsx文件中的件数、毛重和净重信息
+    timer.begin('PL totals')
 
+    # 初始化变量
+    cnt = gw = nw = 0
     try:
         print("Processing input.xlsx(PL) for TTL data...")
-        df_1 = pd.read_excel('input.xlsx', sheet_name=0)
-
-        # 初始化变量
-        cnt = gw = nw = 0
-
-        # 遍历A列查找'TTL:'
-        for idx, value in enumerate(df_1.iloc[:, 2]):
-            if isinstance(value, str) and value.strip() == 'Total':
-                # 检查上一行是否为数字
-                prev_value = df_1.iloc[idx-1, 0] if idx > 0 else None
-                if isinstance(prev_value, (int, float)):
-                    # 获取第6、8、9列的值（索引为5、7、8）
-                    cnt = float(df_1.iloc[idx, 5])  if pd.notna(df_1.iloc[idx, 5]) else 0
-                    gw = float(df_1.iloc[idx, 7])  if pd.notna(df_1.iloc[idx, 7]) else 0
-                    nw = float(df_1.iloc[idx, 8])  if pd.notna(df_1.iloc[idx, 8]) else 0
-                    print(f"Found TTL data: cnt={cnt}, gw={gw}, nw={nw}")
-                    break
-        fill_dict["件数"] = str(cnt)
-        fill_dict["毛重(千克)"] = str(gw)
-        fill_dict["净重(千克)"] = str(nw)
+        # 流式读取PL表，找到'Total'行（上一行为数字序号）后即停止
+        totals = scan_totals(input_ctx.iter_rows(0))
+        if totals is not None:
+            cnt, gw, nw = totals.count, totals.gross, totals.net
+            print(f"Found TTL data: cnt={cnt}, gw={gw}, nw={nw}")
+        header_values["件数"] = str(cnt)
+        header_values["毛重(千克)"] = str(gw)
+        header_values["净重(千克)"] = str(nw)
 
 
     except Exception as e:
+        failures.append('PL totals')
         print(f"Error processing input(PL).xlsx for weight and quantity information: {e}")
 
-    # 使用policy_file参数代替硬编码的'policy.xlsx'
-    policy_path = policy_file if policy_file else 'policy.xlsx'
-
-    try:
-        print(f"Reading policy file: {policy_path}")
-        if os.path.exists(policy_path):
-            print(f"Policy file exists at path: {os.path.abspath(policy_path)}")
-            wb = load_workbook(policy_path)
-            ws = wb.active
-
-            # 验证文件格式是否正确
-            # 检查是否是输出文件而不是 policy 文件
-            if ws.title == '报关单' or ws.title == 'Merged':
-                error_msg = f"错误: 文件 '{policy_path}' 似乎是一个报关单输出文件，而不是 policy 文件。请提供正确的 policy 文件。"
-                print(error_msg)
-                raise ValueError(error_msg)
-
-            # 检查关键单元格是否存在
-            required_cells = ['B4', 'B5', 'B6', 'B7', 'B8']
-            missing_cells = []
-
-            for cell in required_cells:
-                if ws[cell].value is None:
-                    missing_cells.append(cell)
-
-            if missing_cells:
-                error_msg = f"错误: policy 文件 '{policy_path}' 缺少必要的值: {', '.join(missing_cells)}。请确保文件格式正确。"
-                print(error_msg)
-                # 不立即抛出异常，继续处理以显示更多信息
-
-            # 打印工作表的基本信息
-            print(f"Active sheet name: {ws.title}")
-            print(f"Sheet dimensions: {ws.dimensions}")
-
-            # 获取并打印所有关键单元格的原始值
-            print("\n--- RAW CELL VALUES FROM POLICY FILE ---")
-            cells_to_check = ['B3', 'B4', 'B5', 'B6', 'B7', 'B8', 'B9', 'B16']
-            for cell in cells_to_check:
-                print(f"Cell {cell} raw value: {ws[cell].value} (type: {type(ws[cell].value).__name__})")
-
-            # Get values with proper error handling for None values
-            # For each cell, check if the value is None and use a default if it is
-            ap_value = ws['B6'].value
-            print(f"B6 (加价百分比) raw value: {ap_value}, type: {type(ap_value).__name__}")
-            ap = 1 + (float(ap_value) if ap_value is not None else 0.05)
-            print(f"Calculated ap value: {ap}")
-
-            bc_value = ws['B7'].value
-            print(f"B7 (保费系数1) raw value: {bc_value}, type: {type(bc_value).__name__}")
-            bc = float(bc_value) if bc_value is not None else 0.5
-            print(f"Calculated bc value: {bc}")
-
-            bfr_value = ws['B8'].value
-            print(f"B8 (保费系数2) raw value: {bfr_value}, type: {type(bfr_value).__name__}")
-            bfr = float(bfr_value) if bfr_value is not None else 0.0005
-            print(f"Calculated bfr value: {bfr}")
-
-            ty_value = ws['B4'].value
-            print(f"B4 (运费) raw value: {ty_value}, type: {type(ty_value).__name__}")
-            ty = float(ty_value) if ty_value is not None else 100
-            print(f"Calculated ty value: {ty}")
-
-            total_price_value = ws['B16'].value
-            print(f"B16 (保险金额) raw value: {total_price_value}, type: {type(total_price_value).__name__}")
-            total_price = float(total_price_value) if total_price_value is not None else 0
-
-            total_insurance = 0
-            if total_price_value is not None:
-                total_insurance = float(total_price_value)
-
-            # 打印保费计算过程
-            print(f"\n--- INSURANCE CALCULATION ---")
-            print(f"total_insurance (raw): {total_insurance}")
-            print(f"bc: {bc}")
-            print(f"bfr: {bfr}")
-            print(f"ap: {ap}")
-            print(f"Formula: total_insurance * bc * bfr * ap")
-            print(f"Calculation: {total_insurance} * {bc} * {bfr} * {ap}")
-            total_insurance = round(total_insurance * bc * bfr * ap, 2)
-            print(f"Final total_insurance: {total_insurance}")
-
-            b9_value = ws['B9'].value
-            print(f"B9 (汇率) raw value: {b9_value}, type: {type(b9_value).__name__}")
-            if b9_value is None:
-                exchange_rate = 1
-                print(f"B9 is None, using default exchange_rate: {exchange_rate}")
-            elif isinstance(b9_value, str):
-                try:
-                    exchange_rate = float(eval(b9_value.strip("=")))
-                    print(f"B9 is string, evaluated to: {exchange_rate}")
-                except Exception as e:
-                    exchange_rate = 1
-                    print(f"Error evaluating B5 string: {e}, using default: {exchange_rate}")
-            else:
-                exchange_rate = float(b9_value)
-                print(f"B5 is number, converted to: {exchange_rate}")
-
-            b5_value = ws['B5'].value
-            print(f"B9 (运费率) raw value: {b5_value}, type: {type(b9_value).__name__}")
-            b3_value = ws['B3'].value
-            print(f"B3 (总货值) raw value: {b3_value}, type: {type(b3_value).__name__}")
-
-            print("\n--- SHIPPING RATE CALCULATION ---")
-            if b5_value is None:
-                shipping_rate = 2
-                print(f"B5 is None, using default shipping_rate: {shipping_rate}")
-            elif isinstance(b5_value, str):
-                print(f"B5 is string: {b9_value}")
-                if b3_value is not None and float(b3_value) != 0:
-                    shipping_rate = ty / float(b3_value)
-                    print(f"Calculated shipping_rate from ty/b3: {ty}/{float(b3_value)} = {shipping_rate}")
-                else:
-                    shipping_rate = 2
-                    print(f"B3 is None or zero, using default shipping_rate: {shipping_rate}")
-            else:
-                shipping_rate = float(b5_value)
-                print(f"B5 is number, converted to shipping_rate: {shipping_rate}")
-
-            print(f"\n--- FINAL VALUES ---")
-            print(f"exchange_rate: {exchange_rate}")
-            print(f"shipping_rate: {shipping_rate}")
-            print(f"ty (运费): {ty}")
-            print(f"total_insurance (保费): {total_insurance}")
-        else:
-            print(f"Policy file {policy_path} not found. Using default values.")
-            exchange_rate = 6.9
-            shipping_rate = 0.1
-            ap = 1.05
-            bc = 0.5
-            bfr = 0.0005
-            ty = 100
-            total_insurance = 0
-            print(f"Default values - exchange_rate: {exchange_rate}, shipping_rate: {shipping_rate}, ty: {ty}, total_insurance: {total_insurance}")
-    except Exception as e:
-        print(f"Error reading policy file: {e}")
-        import traceback
-        traceback.print_exc()
-        exchange_rate = 6.9
-        shipping_rate = 0.1
-        ap = 1.05
-        bc = 0.5
-        bfr = 0.0005
-        ty = 100
-        total_insurance = 0
-        print(f"Exception occurred, using default values - exchange_rate: {exchange_rate}, shipping_rate: {shipping_rate}, ty: {ty}, total_insurance: {total_insurance}")
-
-
-    # 处理input.xlsx(发票)文件中的境内发货人,境外收货人,生产销售单位,合同协议号
+    timer.begin('invoice header')
+    # 处理input.xlsx(发票)文件中的境内发货人,境外收货人,生产销售单位,合同协议号,成交方式
     try:
-        seller = buyer = no = ""
-
-
-        # 直接读取 Excel 文件
-        wb = load_workbook("input.xlsx")
-        ws = wb.worksheets[1]  # sheet_name=1 对应第二个工作表
-
-        # 直接获取 A1 单元格的值
-        seller = ws["A1"].value
-        fill_dict['境内发货人'] = seller
-        fill_dict['生产销售单位'] = seller
-
-        df_1 = pd.read_excel('input.xlsx', sheet_name=1)
+        # 只读取发票工作表的顶部和底部区域
+        header = _header_extractor.extract(input_ctx, 1)
+        header_values['境内发货人'] = header.seller
+        header_values['生产销售单位'] = header.seller
+        header_values['境外收货人'] = header.buyer
+        header_values["合同协议号"] = header.invoice_number
+        header_values['成交方式'] = header.delivery_term
+        print(f"Extracted info - Seller: {header.seller}, Buyer: {header.buyer}, Invoice Number: {header.invoice_number}")
 
+    except Exception as e:
+        failures.append('invoice header')
+        print(f"处理发票信息时出错: {e}")
 
-        # 读取前四行所有单元格查找buyer和CI No.
-        for i in range(4):
-            for j in range(len(df_1.columns)):
-                # 读取当前单元格的值
-                cell_value = df_1.iloc[i, j] if not pd.isna(df_1.iloc[i, j]) else ""
-                if not cell_value:  # 如果是空字符串则跳过
-                    continue
-                cell_value = str(cell_value)
+    return PreparedItems(df_output, items_buffer.getvalue(), (cnt, gw, nw), header_values, failures)
 
-                # 检查是否包含"Buyer:"
-                if "Buyer:" in cell_value:
-                    # 直接从当前单元格提取冒号后面的内容
-                    buyer = cell_value.split(":", 1)[1].strip()
 
-                # 检查是否包含"Invoice Number:"
-                if "Invoice Number:" in cell_value:
-                    # 如果在同一行找到CI No.信息，获取下一列的值
-                    next_col = df_1.iloc[i, j+1] if j+1 < len(df_1.columns) and not pd.isna(df_1.iloc[i, j+1]) else ""
-                    no = next_col if next_col else ""
+def _convert(input_file, reference_file, policy_file, header_template=HEADER_TEMPLATE_FILE,
+             footer_template=FOOTER_TEMPLATE_FILE, timer=None, memoize=False, reference_cache_dir=None):
+    """
+    Run the conversion pipeline on paths, bytes or file-like objects.
 
+    Everything a job reads or writes is passed in explicitly and all per-job
+    state is local, so several conversions can run concurrently in one process.
+    With ``memoize``, the policy-independent stages are memoized by input and
+    reference content, so re-running with only a revised policy recomputes
+    just the fees, the template fill and the merge. The memo holds only the
+    item table, the serialized item sheet and the header values, none of which
+    are modified afterwards, so concurrent jobs can share an entry. A
+    ``reference_cache_dir`` serves the reference index from a disk snapshot.
 
-        #提取运输方式
-        delivery_term_value = ""
-        cif_row = len(df_1.index) -1
-        for cell_value in df_1.iloc[cif_row-1]:
-            if cell_value and isinstance(cell_value, str) and "Delivery Term:" in cell_value:
-                # Extract text after the colon
-                delivery_term_value = cell_value.split("Delivery Term:")[1].strip()
-                break
+    Returns:
+        ConversionResult: The items, the merged declaration workbook (None if
+            merging failed) and the per-stage timings
+        None: If the input could not be read
+    """
+    if timer is None:
+        timer = StageTimer()
+
+    key = _items_key(input_file, reference_file) if memoize else None
+    prepared = _get_prepared_items(key)
+    if prepared is None:
+        prepared = _prepare_items(input_file, reference_file, timer, reference_cache_dir)
+        if prepared is None:
+            return None
+        if not prepared.failures:
+            _store_prepared_items(key, prepared)
+    else:
+        print("Reusing the item table prepared for the same input and reference")
 
-        # Store the extracted value in fill_dict
-        fill_dict['成交方式'] = delivery_term_value
+    failures = list(prepared.failures)
 
+    # 每个任务使用自己的表头字段副本，避免并发转换互相覆盖
+    fill_values = dict(fill_dict)
+    fill_values.update(prepared.header_values)
+    df_output = prepared.items
+    item_sheet = prepared.item_sheet
+    cnt, gw, nw = prepared.totals
 
-        fill_dict['境外收货人'] = buyer
-        fill_dict["合同协议号"] = no
-        print(f"Extracted info - Seller: {seller}, Buyer: {buyer}, Invoice Number: {no}")
+    timer.begin('policy')
+    policy_path = source_name(policy_file) if policy_file is not None else None
 
+    try:
+        print(f"Reading policy file: {policy_path}")
+        if isinstance(policy_file, PolicyConfig):
+            policy = policy_file
+        elif policy_file is not None and (not is_path(policy_file) or os.path.exists(policy_file)):
+            if is_path(policy_file):
+                print(f"Policy file exists at path: {os.path.abspath(policy_file)}")
+            policy = load_policy(policy_file)
+        else:
+            print(f"Policy file {policy_path} not found. Using default values.")
+            policy = PolicyConfig()
     except Exception as e:
-        print(f"处理发票信息时出错: {e}")
+        failures.append('policy')
+        print(f"Error reading policy file: {e}")
+        import traceback
+        traceback.print_exc()
+        policy = PolicyConfig()
+        print(f"Exception occurred, using default values: {policy}")
+
+    exchange_rate = policy.exchange_rate
+    ty = policy.ty
+    total_insurance = policy.total_insurance
 
 
     # 计算总货值和总净重
+    timer.begin('fees')
     t_amount = round(df_output['总价'].sum(), 2) if '总价' in df_output.columns else 0
     t_weight = round(df_output['净重'].sum(), 2) if '净重' in df_output.columns else 0
 
@@ -497,134 +649,73 @@ def convert_excel(input_file, reference_file, policy_file,output_file):
     print(f"ty (原始运费值): {ty}")
 
     # 设置运费
-    fill_dict["运费（CNY)"] = ty
+    fill_values["运费（CNY)"] = ty
     print(f"Setting 运费（CNY) to: {ty}")
 
     # 设置保费
     print(f"total_insurance (原始保费值): {total_insurance}")
-    fill_dict["保费（CNY)"] = round(total_insurance, 2)
+    fill_values["保费（CNY)"] = round(total_insurance, 2)
     print(f"Setting 保费（CNY) to: {round(total_insurance, 2)}")
 
     # 计算用于显示的运费和保费
     yf = round(ty, 2)
     print(f"Calculated yf (显示用运费): {yf}")
 
-    bf = round((fill_dict['保费（CNY)']/exchange_rate), 2)
-    print(f"Calculated bf (显示用保费): 保费({fill_dict['保费（CNY)']}) / ({exchange_rate}) = {bf}")
+    bf = round((fill_values['保费（CNY)']/exchange_rate), 2)
+    print(f"Calculated bf (显示用保费): 保费({fill_values['保费（CNY)']}) / ({exchange_rate}) = {bf}")
 
     # 处理1.xlsx文件的件数、毛重和净重信息
+    timer.begin('template fill')
     try:
         print("Processing 1.xlsx for weight and quantity information...")
-        if os.path.exists('1.xlsx'):
-            # 创建一个唯一的临时文件名，避免覆盖已有文件
-            import uuid
-            copy1_filename = f'1p_{uuid.uuid4().hex[:8]}.xlsx'
-            shutil.copy2('1.xlsx', copy1_filename)
-            print(f"Created a copy of 1.xlsx as {copy1_filename}")
-
-            # Load the copy for processing
-            wb1 = load_workbook(copy1_filename)
-            ws1 = wb1.active
-
-        # 遍历前10行查找并修改特定单元格
-            for row in range(1, 11):
-                for col in range(1, ws1.max_column + 1):
-                    cell = ws1.cell(row=row, column=col)
-                    if cell.value and isinstance(cell.value, str):
-                        cell.value = cell.value.strip()
-                        if "件数" in cell.value:
-                            cell.value = f"件数 \n{cnt}"
-                        elif "毛重(千克)" in cell.value:
-                            cell.value = f"毛重(千克)\n{gw}"
-                        elif "净重(千克)" in cell.value:
-                            cell.value = f"净重(千克)\n{nw}"
-                        elif "监管方式" in cell.value:
-                            cell.value = f"监管方式\n一般贸易"
-                        elif "征免性质" in cell.value:
-                            cell.value = f"征免性质\n一般征税"
-                        elif "贸易国" in cell.value:
-                            cell.value = f"贸易国(地区)\n印度"
-                        elif "运抵国" in cell.value:
-                            cell.value = f"运抵国（地区)\n印度"
-                        elif "运费" in cell.value:
-                            print(f"Found 运费 cell, setting value to: 运费（CNY)\n{yf}")
-                            cell.value = f"运费（CNY)\n{yf}"
-                        elif "保费" in cell.value:
-                            print(f"Found 保费 cell, setting value to: 保费（CNY)\n{fill_dict['保费（CNY)']}")
-                            cell.value = f"保费（CNY)\n{fill_dict['保费（CNY)']}"
-                        elif "境内发货人" in cell.value:
-                            cell.value = f"境内发货人\n{fill_dict['境内发货人']}"
-                        elif "生产销售单位" in cell.value:
-                            cell.value = f"生产销售单位\n{fill_dict['生产销售单位']}   "
-                        elif "境外收货人" in cell.value:
-                            cell.value = f"境外收货人\n{fill_dict['境外收货人']}"
-                        elif "合同协议号" in cell.value:
-                            cell.value = f"合同协议号\n{fill_dict['合同协议号']}"
-                        elif "成交方式" in cell.value:
-                            cell.value = f"成交方式\n{fill_dict['成交方式']}"
-
-            # Save changes to the copy, not the original
-            wb1.save(copy1_filename)
-
-            print(f"Updated weight and quantity information in {copy1_filename}")
+        wb1 = None
+        if _template_available(header_template):
+            # 按预编译的占位坐标直接填写模板的内存副本，不写回磁盘
+            print(f"Setting 运费 cell to: 运费（CNY)\n{yf}")
+            print(f"Setting 保费 cell to: 保费（CNY)\n{fill_values['保费（CNY)']}")
+            wb1 = load_header_template(header_template).fill({
+                "件数": f"件数 \n{cnt}",
+                "毛重(千克)": f"毛重(千克)\n{gw}",
+                "净重(千克)": f"净重(千克)\n{nw}",
+                "监管方式": "监管方式\n一般贸易",
+                "征免性质": "征免性质\n一般征税",
+                "贸易国": "贸易国(地区)\n印度",
+                "运抵国": "运抵国（地区)\n印度",
+                "运费": f"运费（CNY)\n{yf}",
+                "保费": f"保费（CNY)\n{fill_values['保费（CNY)']}",
+                "境内发货人": f"境内发货人\n{fill_values['境内发货人']}",
+                "生产销售单位": f"生产销售单位\n{fill_values['生产销售单位']}   ",
+                "境外收货人": f"境外收货人\n{fill_values['境外收货人']}",
+                "合同协议号": f"合同协议号\n{fill_values['合同协议号']}",
+                "成交方式": f"成交方式\n{fill_values.get('成交方式', '')}",
+            })
+
+            print("Updated weight and quantity information in 1.xlsx (in memory)")
     except Exception as e:
+        failures.append('template fill')
         print(f"Error updating Excel file: {e}")
 
-
-
     # 处理3.xlsx文件
-    if os.path.exists('3.xlsx'):
-        # 创建一个唯一的临时文件名，避免覆盖已有文件
-        import uuid
-        copy3_filename = f'3p_{uuid.uuid4().hex[:8]}.xlsx'
-        shutil.copy2('3.xlsx', copy3_filename)
-        print(f"Created a copy of 3.xlsx as {copy3_filename}")
-
-        wb3 = load_workbook(copy3_filename)
-        ws3 = wb3.active
-
-        # 遍历前两行查找目标单元格
-        for row in range(1, 3):
-            for col in range(1, ws3.max_column):
-                cell = ws3.cell(row=row, column=col)
-                if cell.value and isinstance(cell.value, str):
-                    if '总货值' in cell.value:
-                        ws3.cell(row=row, column=col+1, value=t_amount)
-                    elif '总净重' in cell.value:
-                        ws3.cell(row=row, column=col+1, value=t_weight)
-
-        wb3.save(copy3_filename)
-        print(f"Updated total amount and weight in {copy3_filename}")
-
-    # 调用merge.py合并文件
+    wb3 = None
+    if _template_available(footer_template):
+        wb3 = load_footer_template(footer_template).fill({'总货值': t_amount, '总净重': t_weight})
+        print("Updated total amount and weight in 3.xlsx (in memory)")
+
+    # 在进程内合并文件，不再启动merge.py子进程；商品明细直接从流式写出的XML合并
+    timer.begin('merge')
     try:
-        print("Merging files with merge.py...")
-        # 使用之前生成的唯一临时文件名
-        # 调用格式：python merge.py 1.xlsx output.xlsx 2.xlsx
-        merge_cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'merge.py'),
-                    copy1_filename, output_file, copy3_filename]
-        subprocess.run(merge_cmd, check=True)
+        print("Merging files with xml_merge.merge_packages...")
+        # 合并顺序：1.xlsx（表头）、output（商品明细）、3.xlsx（表尾）
+        sources = [source for source in (wb1, item_sheet, wb3) if source is not None]
+        merged = merge_packages(sources)
         print("Files merged successfully!")
-
-        # 在Windows系统下自动打开合并后的Excel文件
     except Exception as e:
+        merged = None
         print(f"Error merging files: {e}")
-    finally:
-        # 清理临时文件
-        try:
-            if os.path.exists(copy1_filename):
-                os.remove(copy1_filename)
-                print(f"Removed temporary file: {copy1_filename}")
-            if os.path.exists(copy3_filename):
-                os.remove(copy3_filename)
-                print(f"Removed temporary file: {copy3_filename}")
-        except Exception as e:
-            print(f"Error removing temporary files: {e}")
-
 
+    timer.end()
 
-    # Return the DataFrame for potential further processing or analysis
-    return df_output
+    return ConversionResult(df_output.copy(), merged, timer, failures)
 
 def main():
     """
@@ -635,19 +726,49 @@ def main():
 
     Command-line usage:
     python excel_converter.py input.xlsx reference.xlsx output.xlsx
+    python excel_converter.py input.xlsx reference.xlsx policy.xlsx output.xlsx --profile --profile-json timings.json
     """
     parser = argparse.ArgumentParser(description='Convert Excel files according to specified format')
     parser.add_argument('input', help='Path to the input Excel file')
     parser.add_argument('reference', help='Path to the reference Excel file')
     parser.add_argument('policy', help='Path to the reference Excel file')
     parser.add_argument('output', help='Path to save the output Excel file')
+    parser.add_argument('--merged', metavar='PATH',
+                        help=f'Path to save the merged declaration (default: {MERGED_FILE_NAME} next to this script)')
+    parser.add_argument('--reference-cache', metavar='DIR', default=REFERENCE_CACHE_DIR,
+                        help=f'Directory of parsed reference snapshots (default: {REFERENCE_CACHE_DIR})')
+    parser.add_argument('--no-reference-cache', dest='reference_cache', action='store_const', const=None,
+                        help='Always parse the reference workbook and write no snapshot')
+    parser.add_argument('--profile', action='store_true', help='Print the time spent in each conversion stage')
+    parser.add_argument('--profile-json', metavar='PATH', help='Write the stage timings to a JSON file')
+    parser.add_argument('--profile-dump', metavar='PATH',
+                        help='Run under cProfile and write the stats to PATH (view with python -m pstats)')
 
     args = parser.parse_args()
     print(args.input, args.reference,args.policy, args.output)
-    result = convert_excel(args.input, args.reference,args.policy, args.output)
+
+    profiler = None
+    if args.profile_dump:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    result = run_conversion(args.input, args.reference,args.policy, args.output, args.merged,
+                            reference_cache_dir=args.reference_cache)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile_dump)
+        print(f"cProfile stats written to: {args.profile_dump}")
+
     if result is None:
         sys.exit(1)  # Exit with error code if conversion failed
 
+    if args.profile:
+        print("\n--- STAGE TIMINGS ---")
+        print(result.timings.report())
+    if args.profile_json:
+        result.timings.write_json(args.profile_json)
+        print(f"Stage timings written to: {args.profile_json}")
+
 # Entry point of the script
 # This conditional ensures the main() function is only executed when the script is run directly,
 # not when it's imported as a module (like in the Streamlit app)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Extraction of the invoice header fields (seller, buyer, invoice number, delivery term).
+
+The invoice sheet is streamed once and only its top and bottom bands are kept.
+Once the item table has been read, the bottom band is searched only in a fixed
+window of rows below the table, not down to the last formatted row.
+Each field is described by a small spec, so a supplier with a different layout
+can be supported by overriding ``INVOICE_HEADER_FIELDS`` in config.py:
+
+* ``{'cell': 'A1'}`` takes the value of a fixed cell in the top band;
+* ``{'band': 'top' | 'bottom', 'pattern': r'Buyer:(.*)'}`` takes the first
+  capture group of the first matching cell in that band;
+* adding ``'value': 'next_cell'`` takes the cell to the right of the match instead.
+"""
+import re
+
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from workbook_context import _convert_cell
+
+# 默认的发票表头字段定义
+INVOICE_HEADER_FIELDS = {
+    'seller': {'cell': 'A1'},
+    'buyer': {'band': 'top', 'pattern': r'Buyer:(.*)'},
+    'invoice_number': {'band': 'top', 'pattern': r'Invoice Number:', 'value': 'next_cell'},
+    'delivery_term': {'band': 'bottom', 'pattern': r'Delivery Term:(.*)'},
+}
+
+# 顶部区域（含第1行）与底部区域（最后一个非空行往上）的行数
+TOP_BAND_ROWS = 5
+BOTTOM_BAND_ROWS = 10
+# 表格结束后继续读取的行数，底部区域只在这一范围内查找
+FOOTER_WINDOW_ROWS = 30
+
+
+class InvoiceHeader:
+    """
+    Header fields of a commercial invoice.
+
+    Args:
+        seller (str): Seller name (境内发货人 / 生产销售单位)
+        buyer (str): Buyer name (境外收货人)
+        invoice_number: Invoice number (合同协议号)
+        delivery_term (str): Delivery term (成交方式)
+        extra (dict): Values of any additional configured fields
+    """
+
+    def __init__(self, seller='', buyer='', invoice_number='', delivery_term='', extra=None):
+        self.seller = seller
+        self.buyer = buyer
+        self.invoice_number = invoice_number
+        self.delivery_term = delivery_term
+        self.extra = extra or {}
+
+    def __repr__(self):
+        return (f"InvoiceHeader(seller={self.seller!r}, buyer={self.buyer!r}, "
+                f"invoice_number={self.invoice_number!r}, delivery_term={self.delivery_term!r})")
+
+
+class HeaderExtractor:
+    """
+    Field extractor compiled from a set of field specs.
+
+    Args:
+        fields (dict): Field name -> spec, see the module docstring
+        top_rows (int): Number of leading rows searched by ``'top'`` fields
+        bottom_rows (int): Number of trailing non-empty rows searched by ``'bottom'`` fields
+        footer_rows (int): Number of rows below the item table that may hold the bottom band
+    """
+
+    def __init__(self, fields=None, top_rows=TOP_BAND_ROWS, bottom_rows=BOTTOM_BAND_ROWS,
+                 footer_rows=FOOTER_WINDOW_ROWS):
+        self.top_rows = top_rows
+        self.bottom_rows = bottom_rows
+        self.footer_rows = footer_rows
+        self.cells = {}
+        self.patterns = {}
+        for name, spec in (fields or INVOICE_HEADER_FIELDS).items():
+            if 'cell' in spec:
+                row, col = coordinate_to_tuple(spec['cell'])
+                if row > top_rows:
+                    raise ValueError(f"Header cell {spec['cell']} of field '{name}' is outside the top band")
+                self.cells[name] = (row - 1, col - 1)
+            else:
+                self.patterns[name] = (spec.get('band', 'top'), re.compile(spec['pattern'], re.S),
+                                       spec.get('value', 'match'))
+
+    def extract(self, context, sheet_name=1):
+        """
+        Read the header fields of an invoice sheet.
+
+        Args:
+            context (WorkbookContext): The input workbook
+            sheet_name (int or str): The invoice sheet
+
+        Returns:
+            InvoiceHeader: The extracted fields; fields that are not found are ``''``
+        """
+        top, bottom = context.bands(sheet_name, self.top_rows, self.bottom_rows, self.footer_rows)
+        return self.extract_rows(top, bottom)
+
+    def extract_rows(self, top, bottom):
+        """Extract the header fields from already-read top and bottom band rows."""
+        values = {}
+        for name, (row, col) in self.cells.items():
+            values[name] = top[row][col] if row < len(top) and col < len(top[row]) else None
+
+        bands = {'top': top, 'bottom': bottom}
+        for name, (band, pattern, source) in self.patterns.items():
+            values[name] = self._search(bands[band], pattern, source)
+
+        known = {key: values.pop(key, '') for key in ('seller', 'buyer', 'invoice_number', 'delivery_term')}
+        return InvoiceHeader(extra=values, **known)
+
+    @staticmethod
+    def _search(rows, pattern, source):
+        """Return the value of the first cell in ``rows`` matching ``pattern``."""
+        for row in rows:
+            for j, value in enumerate(row):
+                if value is None or value == '':
+                    continue
+                match = pattern.search(str(value))
+                if match is None:
+                    continue
+                if source == 'next_cell':
+                    next_value = _convert_cell(row[j + 1]) if j + 1 < len(row) else ''
+                    return next_value if next_value else ''
+                return match.group(1).strip() if match.groups() else match.group(0).strip()
+        return ''
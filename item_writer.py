@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Writers for the declaration item sheet.
+
+``write_item_sheet`` streams the sheet through an openpyxl write-only workbook,
+so large consolidated declarations are written in bounded memory.
+``build_item_workbook`` produces the same sheet as a regular in-memory workbook
+for the merge engine, which needs random cell access.
+"""
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+# 商品明细表的工作表名称与列宽
+ITEM_SHEET_TITLE = 'Sheet1'
+ITEM_COLUMN_WIDTH = 15
+
+# 表头样式，与 pandas 3.0 之前 DataFrame.to_excel 的默认表头样式一致
+_THIN = Side(style='thin')
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def _fill_item_sheet(ws, df_output):
+    """Write column widths, the styled header and the data rows to ``ws``."""
+    # Set column widths (must precede the rows in write-only mode)
+    for idx in range(len(df_output.columns)):
+        ws.column_dimensions[get_column_letter(idx + 1)].width = ITEM_COLUMN_WIDTH
+
+    header = []
+    for name in df_output.columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        header.append(cell)
+    ws.append(header)
+
+    # Missing values become empty cells, as with to_excel
+    values = df_output.astype(object).where(df_output.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        ws.append(row)
+
+
+def write_item_sheet(df_output, target):
+    """
+    Stream the item sheet to a file in bounded memory.
+
+    Args:
+        df_output (pandas.DataFrame): The declaration items
+        target (str or file-like): Path or binary file object to write the .xlsx to
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(ITEM_SHEET_TITLE)
+    _fill_item_sheet(ws, df_output)
+    wb.save(target)
+
+
+def build_item_workbook(df_output):
+    """
+    Build the item sheet as a regular in-memory workbook.
+
+    Args:
+        df_output (pandas.DataFrame): The declaration items
+
+    Returns:
+        openpyxl.Workbook: A workbook whose active sheet holds the items
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = ITEM_SHEET_TITLE
+    _fill_item_sheet(ws, df_output)
+    return wb
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Background conversion jobs with a bounded worker pool.
+
+The web app submits a conversion and immediately gets a job id back; a fixed
+number of worker threads run the jobs while each session polls the job for
+its status, current stage and, once finished, the result bytes. The number of
+jobs waiting for a worker is capped as well, so a burst of submissions is
+refused early instead of piling up on the server.
+"""
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from excel_converter import PIPELINE_STAGES, convert_excel_bytes
+from stage_timer import StageTimer
+
+# 默认的并发转换数与等待队列上限
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 20
+
+# 已结束任务最多保留的个数（超过后丢弃最早结束的任务）
+DEFAULT_MAX_FINISHED = 100
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when a job is submitted while the waiting queue is full."""
+
+
+class ConversionJob:
+    """
+    State of one submitted conversion, updated by the worker thread.
+
+    Attributes:
+        id (str): The job id
+        status (str): ``'queued'``, ``'running'``, ``'done'`` or ``'failed'``
+        stage (str): The pipeline stage currently running
+        progress (float): Fraction of the pipeline stages started, 0..1
+        result (bytes): The merged declaration, once ``status`` is ``'done'``
+        error (str): The failure reason, once ``status`` is ``'failed'``
+        timings (StageTimer): Per-stage timings of the run
+    """
+
+    def __init__(self, job_id, label=''):
+        self.id = job_id
+        self.label = label
+        self.status = QUEUED
+        self.stage = ''
+        self.progress = 0.0
+        self.result = None
+        self.error = ''
+        self.timings = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        """bool: True once the job is done or failed"""
+        return self.status in (DONE, FAILED)
+
+    def _on_stage(self, stage):
+        self.stage = stage
+        if stage in PIPELINE_STAGES:
+            self.progress = PIPELINE_STAGES.index(stage) / len(PIPELINE_STAGES)
+
+
+class JobQueue:
+    """
+    A bounded pool of worker threads running conversion jobs.
+
+    Args:
+        workers (int): Number of conversions that run at the same time
+        max_pending (int): Number of jobs allowed to wait for a worker
+        max_finished (int): Number of finished jobs kept for polling
+        cache (ResultCache, optional): Cache that answers repeated identical conversions
+        memoize (bool): Reuse the item table when the same input is resubmitted with another policy
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING, max_finished=DEFAULT_MAX_FINISHED,
+                 cache=None, memoize=False):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.cache = cache
+        self.memoize = memoize
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='conversion')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    def submit(self, input_file, reference_file, policy_file=None, label=''):
+        """
+        Queue a conversion; the arguments are those of :func:`convert_excel_bytes`.
+
+        Args:
+            input_file: The input workbook as bytes or file-like (not shared with other threads)
+            reference_file: The reference workbook, or a ReferenceIndex
+            policy_file: The policy workbook, or a PolicyConfig
+            label (str): Free text shown with the job, e.g. the input file name
+
+        Returns:
+            str: The job id
+
+        Raises:
+            JobQueueFull: If ``max_pending`` jobs are already waiting
+        """
+        with self._lock:
+            if self.pending_count() >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} conversions are already waiting")
+            job = ConversionJob(f"{next(self._sequence)}-{uuid.uuid4().hex[:8]}", label)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, input_file, reference_file, policy_file)
+        return job.id
+
+    def get(self, job_id):
+        """Return the job with ``job_id``, or None if it is unknown or was pruned."""
+        return self._jobs.get(job_id)
+
+    def pending_count(self):
+        """int: Number of jobs waiting for a worker"""
+        return sum(1 for job in list(self._jobs.values()) if job.status == QUEUED)
+
+    def running_count(self):
+        """int: Number of jobs currently running"""
+        return sum(1 for job in list(self._jobs.values()) if job.status == RUNNING)
+
+    def position(self, job_id):
+        """
+        Return how many queued jobs were submitted before ``job_id``.
+
+        Returns:
+            int: 0 for the next job to start, or None if the job is not queued
+        """
+        job = self.get(job_id)
+        if job is None or job.status != QUEUED:
+            return None
+        return sum(1 for other in list(self._jobs.values())
+                   if other.status == QUEUED and other.submitted_at < job.submitted_at)
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and, if ``wait``, finish the queued ones."""
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job, input_file, reference_file, policy_file):
+        job.status = RUNNING
+        job.timings = StageTimer(on_stage=job._on_stage)
+        try:
+            result = convert_excel_bytes(input_file, reference_file, policy_file, timer=job.timings,
+                                         cache=self.cache, memoize=self.memoize)
+            if result is None:
+                job.error = 'conversion returned no output'
+                job.status = FAILED
+            else:
+                job.result = result
+                job.progress = 1.0
+                job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``max_finished`` (caller holds the lock)."""
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        for job in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job.id]
@@ -1,129 +1,393 @@
 # -*- coding: utf-8 -*-
 import openpyxl
+from openpyxl.drawing.image import Image
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_from_string, range_boundaries
+from openpyxl.worksheet.merge import MergedCellRange
+import argparse
+import contextlib
 import copy
 import glob
+import io
 import os
 import sys
 
 # 修改目录work_dir
 work_dir = os.path.dirname(os.path.abspath(__file__))
 
-# 检查命令行参数
-if len(sys.argv) > 1:
-    # 如果提供了文件参数，则使用这些文件
-    files_to_merge = []
-    output_file = None
-    
-    # 处理命令行参数
-    for arg in sys.argv[1:]:
-        if arg.lower().endswith('.xlsx'):
-            if not output_file:
-                files_to_merge.append(os.path.join(work_dir, arg) if not os.path.isabs(arg) else arg)
-            else:
-                output_file = os.path.join(work_dir, arg) if not os.path.isabs(arg) else arg
-else:
-    # 否则使用目录中的所有xlsx文件
-    file_name = '*.xlsx'
-    files_to_merge = [f for f in glob.glob(os.path.join(work_dir, file_name)) if not f.endswith('报关单.xlsx')]
-
-if not files_to_merge:
-    print("没有找到可以合并的Excel文件！")
-    sys.exit(1)
-
-# 创建一个新的工作表
-new_wb = openpyxl.Workbook()
-new_sheet = new_wb.create_sheet('报关单',0)
-
-# 遍历所有excel文件的sheet,存为list
-wb_list = []
-sheet_list = []
-for f in files_to_merge:
-    try:
-        wb1 = openpyxl.load_workbook(f, data_only=True)
-        # 只获取第一个sheet
-        sheet = wb1.active
-        wb_list.append(wb1)
-        sheet_list.append(sheet)
-    except Exception as e:
-        print(f"无法打开文件 {f}: {str(e)}")
-        continue
-
-# 合并所有sheet中的数据，带格式，复制到新的工作表中
-row_begin = 0
-for i, sheet in enumerate(sheet_list):
-    print(f"正在处理文件: {files_to_merge[i]}")
-    
-    # 复制数据和格式
-    for n_r, row in enumerate(sheet.rows):
-        for n_c, source_cell in enumerate(row):
-            target_cell = new_sheet.cell(row=row_begin+n_r+1, column=n_c+1)
-            
-            # 处理合并单元格的值
-            if isinstance(source_cell, openpyxl.cell.cell.MergedCell):
-                # 获取合并单元格的主单元格值
-                for merged_range in sheet.merged_cells:
-                    if source_cell.coordinate in merged_range:
-                        main_cell = sheet.cell(row=merged_range.min_row, column=merged_range.min_col)
-                        target_cell.value = main_cell.value
-                        break
-            else:
-                target_cell.value = source_cell.value
-
-            # 复制样式（如果源单元格有样式）
-            if hasattr(source_cell, 'has_style') and source_cell.has_style:
-                
-                # 然后复制其他样式，但保持换行属性
-                target_cell._style = copy.copy(source_cell._style)
-                target_cell.font = copy.copy(source_cell.font)
-                target_cell.border = copy.copy(source_cell.border)
-                target_cell.fill = copy.copy(source_cell.fill)
-                target_cell.number_format = copy.copy(source_cell.number_format)
-                target_cell.protection = copy.copy(source_cell.protection)
-                target_cell.alignment = copy.copy(source_cell.alignment)
-
-    # 处理当前sheet的合并单元格
-    for merged_range in sheet.merged_cells:
-        new_start_row = merged_range.min_row + row_begin
-        new_end_row = merged_range.max_row + row_begin
-        new_range = f"{openpyxl.utils.get_column_letter(merged_range.min_col)}{new_start_row}:{openpyxl.utils.get_column_letter(merged_range.max_col)}{new_end_row}"
+# 合并结果默认保存的文件名与工作表名称
+MERGED_FILE_NAME = '报关单.xlsx'
+DEFAULT_SHEET_TITLE = '报关单'
+
+# 行高策略：declaration 将第3-6行设为第1行的两倍高，source 沿用源文件行高，none 不设置
+ROW_HEIGHT_POLICIES = ('declaration', 'source', 'none')
+DOUBLE_HEIGHT_ROWS = range(3, 7)
+DEFAULT_ROW_HEIGHT = 15
+
+# 合并引擎：openpyxl 逐单元格复制，xml 直接流式处理 xlsx 包（见 xml_merge.py）
+MERGE_ENGINES = ('openpyxl', 'xml')
+
+
+class CarriedImage(Image):
+    """
+    An image copied from a source workbook that is written back with its original bytes.
+
+    openpyxl re-opens every image with PIL when saving (and re-encodes formats
+    other than PNG, JPEG and GIF); a carried image skips that and stores the
+    media exactly as it was read.
+
+    Args:
+        data (bytes): The original media bytes
+        image_format (str): The media format, e.g. ``'png'``
+        width, height (int): Size in pixels
+        anchor: Cell coordinate or drawing anchor
+    """
+
+    def __init__(self, data, image_format, width, height, anchor):
+        self.ref = None
+        self.media = data
+        self.format = image_format
+        self.width = width
+        self.height = height
+        self.anchor = anchor
+
+    def _data(self):
+        return self.media
+
+
+def load_source_sheet(source):
+    """
+    Resolve a merge source to the worksheet that should be copied.
+
+    Args:
+        source: An openpyxl Workbook or Worksheet, a path to an .xlsx file,
+            raw ``bytes`` or a binary file-like object
+
+    Returns:
+        openpyxl.worksheet.worksheet.Worksheet: The active sheet of the source
+    """
+    if isinstance(source, openpyxl.Workbook):
+        return source.active
+    if isinstance(source, openpyxl.worksheet.worksheet.Worksheet):
+        return source
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    # 只获取第一个sheet
+    return openpyxl.load_workbook(source, data_only=True).active
+
+
+def shift_range(ref, offset):
+    """Shift the rows of a (space-separated) range reference such as ``'A1:C2 E5'`` by ``offset``."""
+    shifted = []
+    for part in ref.split():
+        min_col, min_row, max_col, max_row = range_boundaries(part)
+        shifted.append(f"{get_column_letter(min_col)}{min_row + offset}:{get_column_letter(max_col)}{max_row + offset}")
+    return ' '.join(shifted)
+
+
+def carry_image(image, offset):
+    """
+    Return a copy of a source image, moved down by ``offset`` rows, that reuses its media bytes.
+
+    Args:
+        image (openpyxl.drawing.image.Image): The image of a source sheet
+        offset (int): Number of rows the source sheet is shifted by
+
+    Returns:
+        CarriedImage: The image to add to the merged sheet
+    """
+    if isinstance(image, CarriedImage):
+        data = image.media
+    elif hasattr(image.ref, 'getvalue'):
+        data = image.ref.getvalue()
+    elif isinstance(image.ref, (str, os.PathLike)):
+        with open(image.ref, 'rb') as f:
+            data = f.read()
+    else:
+        data = image._data()
+
+    anchor = copy.deepcopy(image.anchor)
+    if isinstance(anchor, str):
+        column, row = coordinate_from_string(anchor)
+        anchor = f"{column}{row + offset}"
+    else:
+        # 单元格锚点（行号从0开始）随源工作表一起下移，绝对锚点保持不变
+        if getattr(anchor, '_from', None) is not None:
+            anchor._from.row += offset
+        if getattr(anchor, 'to', None) is not None:
+            anchor.to.row += offset
+    return CarriedImage(data, image.format, image.width, image.height, anchor)
+
+
+def merged_cell_anchors(sheet):
+    """
+    Map every cell covered by a merged range to the range's top-left cell.
+
+    Built once per sheet so that resolving a ``MergedCell`` during the copy is a
+    dict lookup instead of a scan over all merged ranges.
+
+    Args:
+        sheet (openpyxl.worksheet.worksheet.Worksheet): The source sheet
+
+    Returns:
+        dict: ``(row, column)`` -> anchor cell, for every covered cell
+    """
+    anchors = {}
+    for merged_range in sheet.merged_cells.ranges:
+        anchor = sheet.cell(row=merged_range.min_row, column=merged_range.min_col)
+        for row in range(merged_range.min_row, merged_range.max_row + 1):
+            for column in range(merged_range.min_col, merged_range.max_col + 1):
+                # 范围重叠时保留先出现的范围，与逐个范围查找的结果一致
+                anchors.setdefault((row, column), anchor)
+    return anchors
+
+
+def copy_cell_style(source_cell, target_cell, interned):
+    """
+    Give ``target_cell`` the style of ``source_cell``, registering it only once.
+
+    The first cell with a given source style copies each style component into
+    the target workbook; the resulting target style is remembered in
+    ``interned`` and every later cell with the same source style reuses it.
+
+    Args:
+        source_cell (openpyxl.cell.cell.Cell): The styled source cell
+        target_cell (openpyxl.cell.cell.Cell): The cell in the merged sheet
+        interned (dict): Source style ids -> target style, shared by all cells of one source workbook
+    """
+    key = tuple(source_cell._style)
+    style = interned.get(key)
+    if style is None:
+        # 然后复制其他样式，但保持换行属性
+        target_cell._style = copy.copy(source_cell._style)
+        target_cell.font = copy.copy(source_cell.font)
+        target_cell.border = copy.copy(source_cell.border)
+        target_cell.fill = copy.copy(source_cell.fill)
+        target_cell.number_format = copy.copy(source_cell.number_format)
+        target_cell.protection = copy.copy(source_cell.protection)
+        target_cell.alignment = copy.copy(source_cell.alignment)
+        interned[key] = copy.copy(target_cell._style)
+    else:
+        # 每个单元格持有自己的样式数组，之后单独修改某个单元格的样式不会影响其他单元格
+        target_cell._style = copy.copy(style)
+
+
+def merge_workbooks(sources, sheet_title=DEFAULT_SHEET_TITLE, row_heights='declaration', images=True):
+    """
+    Merge the first sheet of every source, top to bottom, into a new workbook.
+
+    Values, cell styles, merged ranges, conditional formats and images are
+    copied with a row offset so that each source starts directly below the
+    previous one.
+
+    Args:
+        sources (list): Workbooks, worksheets, paths, bytes or file-like objects
+            accepted by :func:`load_source_sheet`
+        sheet_title (str): Title of the merged sheet
+        row_heights (str): Row height policy: ``'declaration'`` gives rows 3-6 double
+            height to fit the multi-line declaration header, ``'source'`` keeps the
+            row heights of the sources, ``'none'`` leaves every row at the default
+        images (bool): Carry embedded images (logos, stamps, signatures) over
+
+    Returns:
+        openpyxl.Workbook: The merged workbook (not saved)
+
+    Raises:
+        ValueError: If ``row_heights`` is not a known policy
+    """
+    if row_heights not in ROW_HEIGHT_POLICIES:
+        raise ValueError(f"Unknown row height policy '{row_heights}', expected one of {ROW_HEIGHT_POLICIES}")
+
+    # 创建一个新的工作表
+    new_wb = openpyxl.Workbook()
+    new_sheet = new_wb.create_sheet(sheet_title, 0)
+
+    # 遍历所有excel文件的sheet,存为list
+    sheet_list = []
+    for source in sources:
         try:
-            new_sheet.merge_cells(new_range)
-        except ValueError:
-            pass  # 忽略已经合并的单元格
-
-    # 更新下一个文件的起始行
-    row_begin += sheet.max_row
-
-# 复制条件格式
-for cf in sheet.conditional_formatting:
-    new_cf = copy.copy(cf)
-    # 调整条件格式的范围
-    old_ranges = cf.cells.ranges
-    new_ranges = []
-    for old_range in old_ranges:
-        boundaries = openpyxl.utils.cell.range_boundaries(str(old_range))
-        start_row = boundaries[0] + row_begin
-        end_row = boundaries[2] + row_begin
-        new_range = f"{openpyxl.utils.get_column_letter(boundaries[1])}{start_row}:{openpyxl.utils.get_column_letter(boundaries[3])}{end_row}"
-        new_ranges.append(new_range)
-    new_cf.cells.ranges = new_ranges
-    new_sheet.conditional_formatting.append(new_cf)
-
-# Get height of row 1 (default to 15 if not set)
-row1_height = new_sheet.row_dimensions[1].height or 15
-
-# Set rows 3-6 to double height
-for row in range(3, 7):
-    new_sheet.row_dimensions[row].height = row1_height * 2
-
-# Save the new Excel file
-merged_file = os.path.join(work_dir,'报关单.xlsx')
-new_wb.save(merged_file)
-print("save excel to: " + merged_file)
-
-# 在Windows系统下自动打开合并后的Excel文件
-if os.name == 'nt':
-    os.startfile(merged_file)
-    print("Opening merged Excel file...")
-    print("按回车键退出程序...")
-    input()
\ No newline at end of file
+            sheet_list.append(load_source_sheet(source))
+        except Exception as e:
+            print(f"无法打开文件 {source}: {str(e)}")
+            continue
+
+    # 合并所有sheet中的数据，带格式，复制到新的工作表中
+    row_begin = 0
+    merged_ranges = set()
+    for sheet in sheet_list:
+        print(f"正在处理工作表: {sheet.title}")
+        anchors = merged_cell_anchors(sheet)
+        # 样式编号只在同一个源工作簿内有意义，每个源单独建立映射
+        interned_styles = {}
+
+        # 复制数据和格式
+        for n_r, row in enumerate(sheet.rows):
+            for n_c, source_cell in enumerate(row):
+                target_cell = new_sheet.cell(row=row_begin+n_r+1, column=n_c+1)
+
+                # 处理合并单元格的值
+                if isinstance(source_cell, openpyxl.cell.cell.MergedCell):
+                    # 获取合并单元格的主单元格值
+                    main_cell = anchors.get((source_cell.row, source_cell.column))
+                    if main_cell is not None:
+                        target_cell.value = main_cell.value
+                else:
+                    target_cell.value = source_cell.value
+
+                # 复制样式（如果源单元格有样式）
+                if hasattr(source_cell, 'has_style') and source_cell.has_style:
+                    copy_cell_style(source_cell, target_cell, interned_styles)
+
+        # 处理当前sheet的合并单元格
+        for merged_range in sheet.merged_cells:
+            new_start_row = merged_range.min_row + row_begin
+            new_end_row = merged_range.max_row + row_begin
+            new_range = f"{get_column_letter(merged_range.min_col)}{new_start_row}:{get_column_letter(merged_range.max_col)}{new_end_row}"
+            if new_range in merged_ranges:
+                continue  # 忽略已经合并的单元格
+            # 直接登记合并范围：Worksheet.merge_cells 每次都与全部已有范围比较，范围多时是平方复杂度
+            mcr = MergedCellRange(new_sheet, new_range)
+            new_sheet.merged_cells.ranges.add(mcr)
+            new_sheet._clean_merge_range(mcr)
+            merged_ranges.add(new_range)
+
+        # 复制条件格式
+        for cf in sheet.conditional_formatting:
+            for rule in cf.rules:
+                new_sheet.conditional_formatting.add(shift_range(str(cf.sqref), row_begin), copy.copy(rule))
+
+        if row_heights == 'source':
+            for row, dimension in sheet.row_dimensions.items():
+                if dimension.height is not None:
+                    new_sheet.row_dimensions[row + row_begin].height = dimension.height
+
+        if images:
+            for image in sheet._images:
+                new_sheet.add_image(carry_image(image, row_begin))
+
+        # 更新下一个文件的起始行
+        row_begin += sheet.max_row
+
+    if row_heights == 'declaration':
+        # Get height of row 1 (default to 15 if not set)
+        row1_height = new_sheet.row_dimensions[1].height or DEFAULT_ROW_HEIGHT
+
+        # Set rows 3-6 to double height
+        for row in DOUBLE_HEIGHT_ROWS:
+            new_sheet.row_dimensions[row].height = row1_height * 2
+
+    return new_wb
+
+
+def merge_files(sources, output=None, sheet_title=DEFAULT_SHEET_TITLE, row_heights='declaration', images=True,
+                engine='openpyxl'):
+    """
+    Merge any number of declarations into one workbook and write it to ``output``.
+
+    Nothing is opened or shown and no input is asked for, so this can be called
+    from batch jobs and servers.
+
+    Args:
+        sources (list): The sources in order. Workbooks, paths, bytes or binary
+            file-like objects (the openpyxl engine also accepts worksheets)
+        output: A path, a binary file-like object, or None to get the bytes back
+        sheet_title, row_heights, images: See :func:`merge_workbooks`
+        engine (str): ``'openpyxl'`` (:func:`merge_workbooks`) or ``'xml'``
+            (:func:`xml_merge.merge_packages`, faster on large sheets)
+
+    Returns:
+        bytes: The merged .xlsx workbook if ``output`` is None, otherwise None
+
+    Raises:
+        ValueError: If there are no sources, or the engine or row height policy is unknown
+    """
+    sources = list(sources)
+    if not sources:
+        raise ValueError("No files to merge")
+    if engine not in MERGE_ENGINES:
+        raise ValueError(f"Unknown merge engine '{engine}', expected one of {MERGE_ENGINES}")
+
+    if engine == 'xml':
+        # xml_merge 依赖本模块的常量，在此处导入以避免循环导入
+        from xml_merge import merge_packages
+        data = merge_packages(sources, sheet_title=sheet_title, row_heights=row_heights, images=images)
+        if output is None:
+            return data
+        if hasattr(output, 'write'):
+            output.write(data)
+        else:
+            with open(output, 'wb') as f:
+                f.write(data)
+        return None
+
+    new_wb = merge_workbooks(sources, sheet_title=sheet_title, row_heights=row_heights, images=images)
+    if output is None:
+        buffer = io.BytesIO()
+        new_wb.save(buffer)
+        return buffer.getvalue()
+    new_wb.save(output)
+    return None
+
+
+def main(argv=None, work_dir=work_dir, merged_file_name=MERGED_FILE_NAME, sheet_title=DEFAULT_SHEET_TITLE,
+         row_heights='declaration', images=True):
+    """
+    Command-line entry point.
+
+    Usage:
+        python merge.py 1.xlsx output.xlsx 3.xlsx -o 报关单.xlsx
+        python merge.py a/*.xlsx --engine xml -o - > merged.xlsx
+
+    Without source arguments every .xlsx file in ``work_dir`` is merged. The
+    keyword arguments are the defaults of the corresponding options.
+
+    Args:
+        argv (list): The arguments, ``sys.argv[1:]`` if None
+        work_dir (str): Directory searched when no sources are given, and where
+            the result is saved when no output is given
+        merged_file_name (str): File name of the default output
+        sheet_title, row_heights, images: See :func:`merge_workbooks`
+    """
+    parser = argparse.ArgumentParser(description='Merge the first sheet of several Excel files, top to bottom')
+    parser.add_argument('sources', nargs='*',
+                        help=f'Excel files to merge, in order (default: every .xlsx file in {work_dir})')
+    parser.add_argument('-o', '--output', metavar='PATH',
+                        help=f'Path to save the merged workbook, or - for standard output '
+                             f'(default: {merged_file_name} in {work_dir})')
+    parser.add_argument('--sheet-title', default=sheet_title, help='Title of the merged sheet')
+    parser.add_argument('--row-heights', choices=ROW_HEIGHT_POLICIES, default=row_heights, help='Row height policy')
+    parser.add_argument('--no-images', dest='images', action='store_false', default=images,
+                        help='Do not carry embedded images over')
+    parser.add_argument('--engine', choices=MERGE_ENGINES, default='openpyxl', help='Merge engine')
+
+    args = parser.parse_args(argv)
+    output_file = args.output or os.path.join(work_dir, merged_file_name)
+    if args.sources:
+        files_to_merge = args.sources
+    else:
+        # 否则使用目录中的所有xlsx文件
+        files_to_merge = sorted(f for f in glob.glob(os.path.join(work_dir, '*.xlsx'))
+                                if os.path.abspath(f) != os.path.abspath(output_file))
+
+    if not files_to_merge:
+        print("没有找到可以合并的Excel文件！", file=sys.stderr)
+        sys.exit(1)
+
+    if output_file == '-':
+        # 进度信息改写到标准错误，标准输出只写合并结果
+        with contextlib.redirect_stdout(sys.stderr):
+            data = merge_files(files_to_merge, sheet_title=args.sheet_title, row_heights=args.row_heights,
+                               images=args.images, engine=args.engine)
+        sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+        return
+
+    for f in files_to_merge:
+        print(f"正在处理文件: {f}")
+    merge_files(files_to_merge, output_file, sheet_title=args.sheet_title, row_heights=args.row_heights,
+                images=args.images, engine=args.engine)
+    print("save excel to: " + output_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Packing-list (PL sheet) helpers.
+
+``locate_totals`` finds the "Total" row that carries the package count and the
+gross and net weight with vectorized string and type masks instead of a
+per-cell Python loop. ``scan_totals`` applies the same rule to streamed sheet
+rows and stops reading at the totals row, so the rest of the sheet is never
+parsed.
+"""
+import numpy as np
+import pandas as pd
+
+# PL表中各字段所在的列位置（从0开始）
+LABEL_COLUMN = 2
+SERIAL_COLUMN = 0
+COUNT_COLUMN = 5
+GROSS_WEIGHT_COLUMN = 7
+NET_WEIGHT_COLUMN = 8
+
+TOTAL_LABEL = 'Total'
+
+
+class PackingListTotals:
+    """
+    The totals row of a packing list.
+
+    Args:
+        count (float): Number of packages (件数)
+        gross (float): Gross weight in kg (毛重)
+        net (float): Net weight in kg (净重)
+        row (int): Position of the totals row in the parsed PL frame
+    """
+
+    def __init__(self, count, gross, net, row):
+        self.count = count
+        self.gross = gross
+        self.net = net
+        self.row = row
+
+    def __repr__(self):
+        return f"PackingListTotals(count={self.count}, gross={self.gross}, net={self.net}, row={self.row})"
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+
+
+def locate_totals(df_pl):
+    """
+    Find the packing-list totals row.
+
+    A totals row has ``Total`` in the label column and directly follows a
+    carton row, i.e. the previous row holds a number in the serial column.
+
+    Args:
+        df_pl (pandas.DataFrame): The parsed PL sheet
+
+    Returns:
+        PackingListTotals: The totals of the first matching row (missing values are 0)
+        None: If the sheet has no totals row
+    """
+    if len(df_pl.columns) <= NET_WEIGHT_COLUMN:
+        return None
+
+    labels = df_pl.iloc[:, LABEL_COLUMN]
+    if labels.dtype != object and not pd.api.types.is_string_dtype(labels):
+        return None
+
+    # 候选行：标签列去空格后等于 'Total'，且不是第一行
+    candidates = np.flatnonzero(labels.str.strip().eq(TOTAL_LABEL).to_numpy(dtype=bool))
+    candidates = candidates[candidates > 0]
+    if not len(candidates):
+        return None
+
+    # 校验上一行的序号列为数字
+    previous = df_pl.iloc[candidates - 1, SERIAL_COLUMN]
+    valid = candidates[previous.map(_is_number).to_numpy(dtype=bool)]
+    if not len(valid):
+        return None
+
+    row = int(valid[0])
+    values = df_pl.iloc[row, [COUNT_COLUMN, GROSS_WEIGHT_COLUMN, NET_WEIGHT_COLUMN]]
+    count, gross, net = (float(v) if pd.notna(v) else 0 for v in values)
+    return PackingListTotals(count, gross, net, row)
+
+
+def _is_empty(value):
+    return value is None or value == ''
+
+
+def scan_totals(rows):
+    """
+    Find the packing-list totals row in streamed sheet rows.
+
+    Applies the same rule as ``locate_totals`` to raw row value tuples (as
+    yielded by ``WorkbookContext.iter_rows``), starting at the header row.
+    Rows are consumed only up to the totals row.
+
+    Args:
+        rows (iterable): Row value tuples of the PL sheet, header row first
+
+    Returns:
+        PackingListTotals: The totals of the first matching row (missing values are 0)
+        None: If the sheet has no totals row
+    """
+    rows = iter(rows)
+    if next(rows, None) is None:
+        return None
+
+    previous = None
+    for row, values in enumerate(rows):
+        label = values[LABEL_COLUMN] if len(values) > LABEL_COLUMN else None
+        if row > 0 and isinstance(label, str) and label.strip() == TOTAL_LABEL:
+            serial = previous[SERIAL_COLUMN] if previous else None
+            # 空单元格在 DataFrame 中为 NaN，与 locate_totals 一样视为数字
+            if (_is_number(serial) or _is_empty(serial)) and len(values) > NET_WEIGHT_COLUMN:
+                count, gross, net = (float(values[i]) if not _is_empty(values[i]) else 0
+                                     for i in (COUNT_COLUMN, GROSS_WEIGHT_COLUMN, NET_WEIGHT_COLUMN))
+                return PackingListTotals(count, gross, net, row)
+        previous = values
+    return None
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Parser for the policy workbook (exchange rate, freight and insurance factors).
+
+Only the handful of cells in column B that the conversion needs are read, in
+read-only mode. Simple Excel arithmetic formulas such as ``=7.1*1.02`` are
+evaluated by a small precedence-climbing parser instead of ``eval``, and
+parsed results are memoized by the SHA-256 of the file content so a batch
+applying one policy to many invoices reads it only once.
+"""
+import io
+import math
+import re
+import threading
+from collections import OrderedDict
+
+from openpyxl import load_workbook
+
+from reference_index import content_hash, read_source_bytes
+from workbook_context import source_name
+
+# 读取的policy单元格（B列第3~16行）
+POLICY_FIRST_ROW = 3
+POLICY_LAST_ROW = 16
+
+# 必须填写的单元格
+REQUIRED_CELLS = ('B4', 'B5', 'B6', 'B7', 'B8')
+
+# 已解析policy的进程内缓存（最近最少使用淘汰），键为文件内容的哈希
+POLICY_CACHE_SIZE = 32
+_parsed_policies = OrderedDict()
+_parsed_policies_lock = threading.Lock()
+
+# 公式中允许的最大指数绝对值
+MAX_EXPONENT = 1024
+
+# 二元运算符的优先级，与 Excel 一致：全部左结合，^ 最高
+_BINARY_PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, '^': 3}
+_TOKEN = re.compile(r'\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|(.))')
+
+
+def _power(base, exponent):
+    if abs(exponent) > MAX_EXPONENT:
+        raise OverflowError(f"exponent {exponent:g} is too large")
+    try:
+        return math.pow(base, exponent)
+    except ValueError:
+        # 如负数的小数次幂，Excel 返回 #NUM!
+        raise ArithmeticError(f"{base:g}^{exponent:g} is not a real number") from None
+
+
+_BINARY_OPERATORS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a / b,
+    '^': _power,
+}
+
+
+def evaluate_formula(formula):
+    """
+    Evaluate a simple Excel arithmetic formula.
+
+    Only numbers, parentheses, unary signs and ``+ - * / ^`` are accepted;
+    cell references and functions are rejected. Precedence follows Excel:
+    unary minus binds tighter than ``^`` (``=-2^2`` is 4) and ``^`` is
+    left-associative (``=2^3^2`` is 64).
+
+    Args:
+        formula (str): The formula, with or without the leading ``=``
+
+    Returns:
+        float: The result
+
+    Raises:
+        ValueError: If the formula is not plain arithmetic, or its result is
+            undefined or too large (division by zero, overflow, huge exponents)
+    """
+    tokens = []
+    for number, symbol in _TOKEN.findall(formula.strip().lstrip('=')):
+        if number:
+            tokens.append(float(number))
+        elif not symbol.isspace():
+            tokens.append(symbol)
+    position = 0
+
+    def _peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def _operand():
+        nonlocal position
+        token = _peek()
+        position += 1
+        if isinstance(token, float):
+            return token
+        if token in ('+', '-'):
+            # 一元正负号先于 ^ 结合
+            value = _operand()
+            return -value if token == '-' else value
+        if token == '(':
+            value = _expression(1)
+            if _peek() != ')':
+                raise ValueError(f"Unsupported formula: {formula!r}")
+            position += 1
+            return value
+        raise ValueError(f"Unsupported formula: {formula!r}")
+
+    def _expression(min_precedence):
+        nonlocal position
+        left = _operand()
+        while _peek() in _BINARY_PRECEDENCE and _BINARY_PRECEDENCE[_peek()] >= min_precedence:
+            operator = _peek()
+            position += 1
+            left = _BINARY_OPERATORS[operator](left, _expression(_BINARY_PRECEDENCE[operator] + 1))
+        return left
+
+    try:
+        value = _expression(1)
+    except (ArithmeticError, RecursionError) as e:
+        raise ValueError(f"Unsupported formula: {formula!r} ({e})") from None
+    if position != len(tokens):
+        raise ValueError(f"Unsupported formula: {formula!r}")
+    return value
+
+
+class PolicyConfig:
+    """
+    The values the conversion takes from the policy workbook.
+
+    The defaults are the values used when no policy file is available.
+
+    Args:
+        exchange_rate (float): B9, exchange rate used to convert the insurance fee
+        shipping_rate (float): B5, freight rate
+        ap (float): 1 + B6, mark-up factor
+        bc (float): B7, insurance factor 1
+        bfr (float): B8, insurance factor 2
+        ty (float): B4, freight (CNY)
+        total_insurance (float): Insurance fee (CNY), B16 * bc * bfr * ap
+    """
+
+    def __init__(self, exchange_rate=6.9, shipping_rate=0.1, ap=1.05, bc=0.5, bfr=0.0005, ty=100,
+                 total_insurance=0):
+        self.exchange_rate = exchange_rate
+        self.shipping_rate = shipping_rate
+        self.ap = ap
+        self.bc = bc
+        self.bfr = bfr
+        self.ty = ty
+        self.total_insurance = total_insurance
+
+    def __repr__(self):
+        return (f"PolicyConfig(exchange_rate={self.exchange_rate}, shipping_rate={self.shipping_rate}, "
+                f"ty={self.ty}, total_insurance={self.total_insurance})")
+
+    @classmethod
+    def from_cells(cls, cells, name='policy'):
+        """
+        Compute the policy from the raw column-B cell values.
+
+        Args:
+            cells (dict): Cell coordinate (``'B3'`` .. ``'B16'``) -> raw value
+            name (str): File name used in messages
+
+        Returns:
+            PolicyConfig: The parsed policy
+        """
+        missing_cells = [cell for cell in REQUIRED_CELLS if cells.get(cell) is None]
+        if missing_cells:
+            # 不抛出异常，缺失的值使用默认值
+            print(f"错误: policy 文件 '{name}' 缺少必要的值: {', '.join(missing_cells)}。请确保文件格式正确。")
+
+        print("\n--- RAW CELL VALUES FROM POLICY FILE ---")
+        for cell in ('B3', 'B4', 'B5', 'B6', 'B7', 'B8', 'B9', 'B16'):
+            print(f"Cell {cell} raw value: {cells.get(cell)} (type: {type(cells.get(cell)).__name__})")
+
+        ap_value = cells.get('B6')
+        ap = 1 + (float(ap_value) if ap_value is not None else 0.05)
+        bc = float(cells['B7']) if cells.get('B7') is not None else 0.5
+        bfr = float(cells['B8']) if cells.get('B8') is not None else 0.0005
+        ty = float(cells['B4']) if cells.get('B4') is not None else 100
+
+        total_insurance = 0
+        if cells.get('B16') is not None:
+            total_insurance = float(cells['B16'])
+        print(f"Insurance: {total_insurance} * {bc} * {bfr} * {ap}")
+        total_insurance = round(total_insurance * bc * bfr * ap, 2)
+
+        b9_value = cells.get('B9')
+        if b9_value is None:
+            exchange_rate = 1
+        elif isinstance(b9_value, str):
+            try:
+                exchange_rate = evaluate_formula(b9_value)
+            except (ValueError, ArithmeticError) as e:
+                exchange_rate = 1
+                print(f"Error evaluating B9 formula: {e}, using default: {exchange_rate}")
+        else:
+            exchange_rate = float(b9_value)
+
+        b5_value = cells.get('B5')
+        b3_value = cells.get('B3')
+        if b5_value is None:
+            shipping_rate = 2
+        elif isinstance(b5_value, str):
+            # B5 为公式时按 运费 / 总货值 计算
+            shipping_rate = ty / float(b3_value) if b3_value is not None and float(b3_value) != 0 else 2
+        else:
+            shipping_rate = float(b5_value)
+
+        policy = cls(exchange_rate, shipping_rate, ap, bc, bfr, ty, total_insurance)
+        print(f"Parsed policy: {policy}")
+        return policy
+
+
+def read_policy_cells(data, name='policy'):
+    """
+    Read column B of the policy sheet in read-only mode.
+
+    Args:
+        data (bytes): The policy workbook content
+        name (str): File name used in messages
+
+    Returns:
+        dict: Cell coordinate -> raw value (formulas are returned as text)
+
+    Raises:
+        ValueError: If the workbook is a declaration output rather than a policy file
+    """
+    wb = load_workbook(io.BytesIO(data), read_only=True)
+    try:
+        ws = wb.active
+        # 检查是否是输出文件而不是 policy 文件
+        if ws.title == '报关单' or ws.title == 'Merged':
+            raise ValueError(f"错误: 文件 '{name}' 似乎是一个报关单输出文件，而不是 policy 文件。请提供正确的 policy 文件。")
+
+        rows = ws.iter_rows(min_row=POLICY_FIRST_ROW, max_row=POLICY_LAST_ROW, min_col=2, max_col=2,
+                            values_only=True)
+        cells = {f'B{POLICY_FIRST_ROW + i}': row[0] if row else None for i, row in enumerate(rows)}
+    finally:
+        wb.close()
+    return cells
+
+
+def load_policy(policy_file):
+    """
+    Parse a policy workbook, reusing the result for content already seen.
+
+    Args:
+        policy_file: Path, raw ``bytes`` or binary file-like object of the policy workbook
+
+    Returns:
+        PolicyConfig: The parsed policy
+
+    Raises:
+        ValueError: If the file is not a policy workbook
+    """
+    data = read_source_bytes(policy_file)
+    key = content_hash(data)
+    with _parsed_policies_lock:
+        policy = _parsed_policies.get(key)
+        if policy is not None:
+            _parsed_policies.move_to_end(key)
+            return policy
+
+    name = source_name(policy_file)
+    policy = PolicyConfig.from_cells(read_policy_cells(data, name), name)
+    with _parsed_policies_lock:
+        _parsed_policies[key] = policy
+        while len(_parsed_policies) > POLICY_CACHE_SIZE:
+            _parsed_policies.popitem(last=False)
+    return policy
+
+
+def clear_policy_cache():
+    """Forget every parsed policy, e.g. before a cold benchmark run."""
+    with _parsed_policies_lock:
+        _parsed_policies.clear()
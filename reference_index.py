@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled, persistently cached index of the reference material catalog.
+
+Parsing reference.xlsx dominates the matching stage on large catalogs, yet the
+file rarely changes. ``load_reference_index`` parses it once and keys the
+result by the SHA-256 of the file content. Callers that opt in with a cache
+directory (the batch converter, the benchmark) also get a pickle snapshot
+stored there, so later runs with the same catalog load the snapshot instead.
+The directory is capped in size; the least recently used snapshots are
+evicted first. Without a cache directory nothing is written to disk.
+"""
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+from workbook_context import is_path, source_name
+
+# 参考数据快照的默认缓存目录
+REFERENCE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'reference')
+
+# 快照目录的默认容量上限（字节）
+REFERENCE_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# 快照格式版本，索引结构变化时递增以使旧快照失效
+INDEX_FORMAT_VERSION = 1
+
+# 参考文件中重复物料编码的处理策略
+DUPLICATE_POLICIES = ('first', 'last', 'error')
+
+
+def read_source_bytes(source):
+    """
+    Return the raw bytes of a workbook source.
+
+    Args:
+        source: A path, raw ``bytes`` or a binary file-like object
+
+    Returns:
+        bytes: The file content
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if is_path(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    position = source.tell()
+    source.seek(0)
+    data = source.read()
+    source.seek(position)
+    return data
+
+
+def content_hash(data):
+    """Return the hex SHA-256 digest of ``data``."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ReferenceIndex:
+    """
+    The reference catalog indexed by material code.
+
+    Args:
+        table (pandas.DataFrame): Reference rows indexed by material code (unique)
+        material_code_column (str): Name of the material code column in the source file
+        columns (list): All column names of the source file, for diagnostics
+
+    Attributes:
+        source_hash (str): Hash of the source file and index options, set by
+            :func:`load_reference_index`; None for an index built directly from a frame
+    """
+
+    def __init__(self, table, material_code_column, columns):
+        self.table = table
+        self.material_code_column = material_code_column
+        self.columns = columns
+        self.source_hash = None
+
+    @classmethod
+    def from_frame(cls, df_reference, material_code_column, duplicates='last'):
+        """
+        Build an index from a parsed reference table.
+
+        Args:
+            df_reference (pandas.DataFrame): The parsed reference workbook
+            material_code_column (str): Name of the material code column
+            duplicates (str): How to resolve a material code that appears on more
+                than one row: keep the ``'first'`` or ``'last'`` row, or ``'error'``
+
+        Raises:
+            ValueError: If ``duplicates`` is ``'error'`` and the catalog contains duplicate codes
+        """
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"Unknown duplicate policy '{duplicates}', expected one of {DUPLICATE_POLICIES}")
+
+        columns = df_reference.columns.tolist()
+        if material_code_column not in df_reference.columns:
+            return cls(None, material_code_column, columns)
+
+        codes = df_reference[material_code_column]
+        if duplicates == 'error':
+            duplicated = codes[codes.duplicated(keep=False)].unique().tolist()
+            if duplicated:
+                raise ValueError(f"错误: 参考文件中存在重复的物料编码: {duplicated[:20]}"
+                                 + (f" 等共 {len(duplicated)} 个" if len(duplicated) > 20 else ""))
+            table = df_reference.set_index(material_code_column)
+        else:
+            table = (df_reference
+                     .drop_duplicates(subset=material_code_column, keep=duplicates)
+                     .set_index(material_code_column))
+        return cls(table, material_code_column, columns)
+
+    @property
+    def has_material_codes(self):
+        """bool: True if the source file contains the material code column"""
+        return self.table is not None
+
+    def __contains__(self, column):
+        return self.table is not None and column in self.table.columns
+
+    def match(self, codes, columns):
+        """
+        Join a Series of material codes against the catalog in a single pass.
+
+        Args:
+            codes (pandas.Series): Material codes from the input file
+            columns (list): Reference columns to return
+
+        Returns:
+            tuple: ``(matched, unmatched)`` where ``matched`` is a DataFrame of the
+                requested columns aligned with ``codes`` (NaN where unmatched) and
+                ``unmatched`` the distinct non-empty codes missing from the catalog
+        """
+        # The index is unique, so reindex is a single hash join of all columns
+        matched = self.table[columns].reindex(codes.to_numpy())
+        matched.index = codes.index
+
+        missing = codes[~codes.isin(self.table.index)]
+        unmatched = missing.dropna().unique().tolist()
+        return matched, unmatched
+
+
+def evict_snapshots(cache_dir, max_bytes=REFERENCE_CACHE_MAX_BYTES):
+    """Remove the least recently used snapshots until ``cache_dir`` fits in ``max_bytes``."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.pkl'):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        total -= size
+
+
+def load_reference_index(reference_file, material_code_column, duplicates='last', cache_dir=None,
+                         max_bytes=REFERENCE_CACHE_MAX_BYTES):
+    """
+    Load the reference catalog index, using the on-disk snapshot when possible.
+
+    Args:
+        reference_file: Path, raw ``bytes`` or binary file-like object of the reference workbook
+        material_code_column (str): Name of the material code column
+        duplicates (str): Duplicate material code policy, see :meth:`ReferenceIndex.from_frame`
+        cache_dir (str, optional): Snapshot directory, e.g. :data:`REFERENCE_CACHE_DIR`; by
+            default no snapshot is read or written
+        max_bytes (int): Total snapshot size above which the least recently used are removed
+
+    Returns:
+        ReferenceIndex: The compiled index
+    """
+    data = read_source_bytes(reference_file)
+    key = content_hash(f"{INDEX_FORMAT_VERSION}:{material_code_column}:{duplicates}:".encode('utf-8') + data)
+    snapshot = os.path.join(cache_dir, f'{key}.pkl') if cache_dir else None
+
+    if snapshot and os.path.exists(snapshot):
+        try:
+            index = pd.read_pickle(snapshot)
+            index.source_hash = key
+            # 更新访问时间，供最近最少使用淘汰
+            os.utime(snapshot)
+            print(f"Loaded reference index snapshot: {snapshot}")
+            return index
+        except Exception as e:
+            print(f"Warning: could not load reference snapshot {snapshot}: {e}")
+
+    print(f"Reading reference file: {source_name(reference_file)}")
+    index = ReferenceIndex.from_frame(pd.read_excel(io.BytesIO(data)), material_code_column, duplicates)
+    index.source_hash = key
+
+    if snapshot:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # 先写临时文件再原子替换，避免并发进程读到写了一半的快照
+            tmp_path = f'{snapshot}.{os.getpid()}.tmp'
+            pd.to_pickle(index, tmp_path)
+            os.replace(tmp_path, snapshot)
+            print(f"Saved reference index snapshot: {snapshot}")
+            evict_snapshots(cache_dir, max_bytes)
+        except Exception as e:
+            print(f"Warning: could not save reference snapshot: {e}")
+    return index
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache of finished declarations.
+
+Clerks often resubmit the same invoice, reference and policy (a failed
+download, a second review). A conversion is fully determined by those files,
+the column configuration and the templates, so its merged declaration is
+stored under a key hashed from all of them; an identical request is answered
+with the stored bytes instead of re-running the pipeline.
+
+The cache directory is capped in size. Every hit refreshes the entry's
+modification time and the least recently used entries are evicted first.
+"""
+import json
+import os
+
+from policy_config import PolicyConfig
+from reference_index import ReferenceIndex, content_hash, read_source_bytes
+from workbook_context import WorkbookContext, is_path
+
+# 转换结果的默认缓存目录
+RESULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'results')
+
+# 缓存目录的默认容量上限（字节）
+RESULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# 结果格式版本，转换逻辑变化导致输出不同时递增以使旧结果失效
+RESULT_FORMAT_VERSION = 1
+
+
+def source_fingerprint(source):
+    """
+    Return a hash identifying the content of one conversion input.
+
+    A path to a missing file is fingerprinted like None: the conversion skips
+    a missing template and falls back to default policy values.
+
+    Args:
+        source: A path, raw ``bytes``, binary file-like object, WorkbookContext,
+            ReferenceIndex, PolicyConfig or None
+
+    Returns:
+        str: The fingerprint
+        None: If the content cannot be identified (an index built without a source file)
+    """
+    if source is None or (is_path(source) and not os.path.exists(source)):
+        return ''
+    if isinstance(source, ReferenceIndex):
+        return source.source_hash
+    if isinstance(source, PolicyConfig):
+        return content_hash(repr(sorted(vars(source).items())).encode('utf-8'))
+    if isinstance(source, WorkbookContext):
+        source = source.source
+    return content_hash(read_source_bytes(source))
+
+
+def conversion_key(input_file, reference_file, policy_file, header_template, footer_template, settings):
+    """
+    Build the cache key of a conversion.
+
+    Args:
+        input_file, reference_file, policy_file: The conversion inputs, see :func:`source_fingerprint`
+        header_template, footer_template: The 1.xlsx / 3.xlsx templates (path or bytes)
+        settings (dict): JSON-serializable configuration values that affect the output
+
+    Returns:
+        str: The key
+        None: If one of the inputs cannot be fingerprinted; such conversions are not cached
+    """
+    parts = [source_fingerprint(source)
+             for source in (input_file, reference_file, policy_file, header_template, footer_template)]
+    if None in parts:
+        return None
+    payload = json.dumps([RESULT_FORMAT_VERSION, parts, settings], ensure_ascii=False, sort_keys=True)
+    return content_hash(payload.encode('utf-8'))
+
+
+class ResultCache:
+    """
+    A size-limited directory of declaration workbooks keyed by :func:`conversion_key`.
+
+    Args:
+        cache_dir (str): Directory holding the cached results
+        max_bytes (int): Total size above which the least recently used results are removed
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.xlsx')
+
+    def get(self, key):
+        """
+        Return the cached result for ``key``.
+
+        Returns:
+            bytes: The stored declaration
+            None: On a miss (or if ``key`` is None)
+        """
+        if key is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新访问时间，供最近最少使用淘汰
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        """Store ``data`` under ``key`` and evict old entries beyond ``max_bytes``."""
+        if key is None or data is None or len(data) > self.max_bytes:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 先写临时文件再原子替换，避免并发读到写了一半的结果
+            tmp_path = f'{self._path(key)}.{os.getpid()}.{id(data)}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self.evict()
+        except OSError as e:
+            print(f"Warning: could not save conversion result to cache: {e}")
+
+    def evict(self):
+        """Remove the least recently used results until the directory fits in ``max_bytes``."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.xlsx'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """Remove every cached result."""
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.xlsx'):
+                    os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Lightweight wall-clock timing of conversion stages.
+
+A ``StageTimer`` records one span per stage. Stages that follow each other can
+be marked with :meth:`StageTimer.begin`, which closes the previous span;
+isolated blocks can use the :meth:`StageTimer.span` context manager.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    Collects ``(stage, seconds)`` spans in the order they were recorded.
+
+    Args:
+        on_stage (callable, optional): Called with the stage name whenever a stage begins,
+            e.g. to report progress of a background job
+    """
+
+    def __init__(self, on_stage=None):
+        self.spans = []
+        self.on_stage = on_stage
+        self._current = None
+        self._started = None
+
+    def begin(self, stage):
+        """Close the running span, if any, and start timing ``stage``."""
+        self.end()
+        self._current = stage
+        self._started = time.perf_counter()
+        if self.on_stage is not None:
+            self.on_stage(stage)
+
+    def end(self):
+        """Close the running span, if any."""
+        if self._current is not None:
+            self.spans.append((self._current, time.perf_counter() - self._started))
+            self._current = None
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as ``stage``."""
+        self.begin(stage)
+        try:
+            yield
+        finally:
+            self.end()
+
+    @property
+    def total(self):
+        """float: Sum of all recorded spans in seconds"""
+        return sum(seconds for _, seconds in self.spans)
+
+    def as_dict(self):
+        """
+        Return the timings in a JSON-serializable form.
+
+        Returns:
+            dict: ``{'total_seconds': ..., 'stages': [{'stage', 'seconds', 'share'}, ...]}``
+        """
+        total = self.total
+        return {
+            'total_seconds': round(total, 6),
+            'stages': [{'stage': stage, 'seconds': round(seconds, 6),
+                        'share': round(seconds / total, 4) if total else 0.0}
+                       for stage, seconds in self.spans],
+        }
+
+    def report(self):
+        """Return the stage breakdown as a printable table."""
+        width = max([len(stage) for stage, _ in self.spans] + [len('total')])
+        total = self.total
+        lines = [f"{'stage':<{width}}  {'seconds':>9}  {'share':>6}"]
+        for stage, seconds in self.spans:
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"{stage:<{width}}  {seconds:>9.3f}  {share:>5.1f}%")
+        lines.append(f"{'total':<{width}}  {total:>9.3f}  {100.0 if total else 0.0:>5.1f}%")
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        """Write :meth:`as_dict` to ``path``."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Precompiled placeholder manifests for the declaration templates.
+
+The header (1.xlsx) and footer (3.xlsx) templates used to be scanned cell by
+cell on every conversion to find the labels that receive values. A template is
+now compiled once into a manifest of placeholder coordinates, cached by the
+SHA-256 of the template content; filling a declaration loads a fresh in-memory
+copy of the template and writes straight to the recorded cells.
+"""
+import io
+import os
+
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+from reference_index import content_hash, read_source_bytes
+
+# 模板所在目录（与本模块同目录，不依赖当前工作目录）
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 表头模板及其占位标签（按匹配优先级排列，一个单元格只匹配第一个命中的标签）
+HEADER_TEMPLATE_FILE = os.path.join(TEMPLATE_DIR, '1.xlsx')
+HEADER_PLACEHOLDERS = (
+    '件数', '毛重(千克)', '净重(千克)', '监管方式', '征免性质', '贸易国', '运抵国',
+    '运费', '保费', '境内发货人', '生产销售单位', '境外收货人', '合同协议号', '成交方式',
+)
+HEADER_ROWS = 10
+
+# 表尾模板及其占位标签，值写在标签右侧一列
+FOOTER_TEMPLATE_FILE = os.path.join(TEMPLATE_DIR, '3.xlsx')
+FOOTER_PLACEHOLDERS = ('总货值', '总净重')
+FOOTER_ROWS = 2
+
+# 已编译模板的进程内缓存，键为模板内容及编译参数的哈希
+_compiled_templates = {}
+
+
+class CompiledTemplate:
+    """
+    A template together with the coordinates of its placeholders.
+
+    Args:
+        data (bytes): The template workbook content
+        slots (dict): Placeholder label -> list of cell coordinates that receive its value
+        normalized (dict): Cell coordinate -> stripped label text to restore on every fill
+    """
+
+    def __init__(self, data, slots, normalized=None):
+        self.data = data
+        self.slots = slots
+        self.normalized = normalized or {}
+
+    def fill(self, values):
+        """
+        Return a fresh copy of the template with the placeholder cells filled.
+
+        Args:
+            values (dict): Placeholder label -> value; labels missing from the
+                dict are left as they are in the template
+
+        Returns:
+            openpyxl.Workbook: The filled in-memory workbook
+        """
+        wb = load_workbook(io.BytesIO(self.data))
+        ws = wb.active
+        for coord, text in self.normalized.items():
+            ws[coord].value = text
+        for label, coords in self.slots.items():
+            if label in values:
+                for coord in coords:
+                    ws[coord].value = values[label]
+        return wb
+
+
+def compile_template(data, placeholders, rows, value_offset=0, strip=False):
+    """
+    Record where each placeholder of a template sits.
+
+    Args:
+        data (bytes): The template workbook content
+        placeholders (tuple): Labels to look for, in matching priority
+        rows (int): Number of leading rows to scan
+        value_offset (int): Columns to the right of the label where the value is
+            written; 0 replaces the label cell itself
+        strip (bool): Strip surrounding whitespace from every text cell in the
+            scanned rows
+
+    Returns:
+        CompiledTemplate: The compiled template
+    """
+    ws = load_workbook(io.BytesIO(data)).active
+    slots = {}
+    normalized = {}
+    for row in ws.iter_rows(min_row=1, max_row=rows):
+        for cell in row:
+            if not cell.value or not isinstance(cell.value, str):
+                continue
+            text = cell.value.strip() if strip else cell.value
+            if text != cell.value:
+                normalized[cell.coordinate] = text
+
+            # 值单元格超出模板范围的标签不填写
+            if cell.column + value_offset > ws.max_column:
+                continue
+            label = next((p for p in placeholders if p in text), None)
+            if label is not None:
+                coord = f"{get_column_letter(cell.column + value_offset)}{cell.row}"
+                slots.setdefault(label, []).append(coord)
+    return CompiledTemplate(data, slots, normalized)
+
+
+def load_template(template_file, placeholders, rows, value_offset=0, strip=False):
+    """
+    Load a compiled template, compiling it only the first time its content is seen.
+
+    Args:
+        template_file: Path, raw ``bytes`` or binary file-like object of the template
+        placeholders, rows, value_offset, strip: See :func:`compile_template`
+
+    Returns:
+        CompiledTemplate: The compiled template
+    """
+    data = read_source_bytes(template_file)
+    key = content_hash(repr((placeholders, rows, value_offset, strip)).encode('utf-8') + data)
+    if key not in _compiled_templates:
+        _compiled_templates[key] = compile_template(data, placeholders, rows, value_offset, strip)
+    return _compiled_templates[key]
+
+
+def clear_compiled_templates():
+    """Forget every compiled template, e.g. to time a conversion from scratch."""
+    _compiled_templates.clear()
+
+
+def load_header_template(template_file=HEADER_TEMPLATE_FILE):
+    """Load the compiled declaration header template (1.xlsx)."""
+    return load_template(template_file, HEADER_PLACEHOLDERS, HEADER_ROWS, strip=True)
+
+
+def load_footer_template(template_file=FOOTER_TEMPLATE_FILE):
+    """Load the compiled declaration footer template (3.xlsx)."""
+    return load_template(template_file, FOOTER_PLACEHOLDERS, FOOTER_ROWS, value_offset=1)
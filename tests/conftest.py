@@ -1,5 +1,6 @@
 import os
 import sys
+import openpyxl
 import pytest
 import pandas as pd
 import tempfile
@@ -78,4 +79,25 @@ def create_excel_file():
         """Inner function to create Excel file"""
         dataframe.to_excel(filepath, index=False)
         return filepath
-    return _create_excel_file 
\ No newline at end of file
+    return _create_excel_file 
+
+@pytest.fixture
+def header_wb():
+    """A small declaration header sheet with a merged title range, for the merge engines"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws['A1'] = '中华人民共和国海关出口货物报关单'
+    ws.merge_cells('A1:C1')
+    ws['A2'] = '境内发货人'
+    ws['A2'].font = openpyxl.styles.Font(bold=True)
+    return wb
+
+@pytest.fixture
+def items_wb():
+    """A small item sheet, for the merge engines; B2 repeats a header string"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['项号', '商品名称', '数量'])
+    ws.append([1, '境内发货人', 10])
+    ws.append([2, 'Product B', 0])
+    return wb
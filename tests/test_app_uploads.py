@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+
+class FakeUpload:
+    """Minimal stand-in for a Streamlit UploadedFile"""
+
+    def __init__(self, data, name='upload.xlsx'):
+        self.data = data
+        self.name = name
+
+    def getvalue(self):
+        return self.data
+
+
+class TestParsedUploadCache:
+    """Test suite for the per-session parsed upload cache"""
+
+    def test_parses_only_when_content_changes(self, monkeypatch):
+        """Reruns with the same bytes reuse the parsed value; new content replaces it"""
+        monkeypatch.setattr(app.st, 'session_state', {})
+        calls = []
+
+        def parse(data):
+            calls.append(data)
+            return len(data)
+
+        assert app.get_parsed_upload('input', FakeUpload(b'abc'), parse) == 3
+        assert app.get_parsed_upload('input', FakeUpload(b'abc', name='renamed.xlsx'), parse) == 3
+        assert calls == [b'abc']
+
+        assert app.get_parsed_upload('input', FakeUpload(b'abcd'), parse) == 4
+        assert app.get_parsed_upload('reference', FakeUpload(b'abcd'), parse) == 4
+        assert calls == [b'abc', b'abcd', b'abcd']
+        assert set(app.st.session_state['parsed_uploads']) == {'input', 'reference'}
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_converter import collect_inputs, convert_batch, output_paths, SUMMARY_FILE_NAME
+
+
+class TestBatchConverter:
+    """Test suite for batch conversion"""
+
+    @pytest.fixture
+    def batch_files(self, tmp_path):
+        """Two valid inputs, one unreadable input and a reference file"""
+        input_dir = tmp_path / 'inputs'
+        input_dir.mkdir()
+        for name in ['a', 'b']:
+            with pd.ExcelWriter(input_dir / f'{name}.xlsx', engine='openpyxl') as writer:
+                pd.DataFrame({'S/N': [1]}).to_excel(writer, sheet_name='PL', index=False)
+                pd.DataFrame({'S/N': [1, 2], 'Part Number': ['MC001', 'MC002']}).to_excel(
+                    writer, sheet_name='CI', index=False, startrow=9)
+        (input_dir / 'broken.xlsx').write_bytes(b'not a workbook')
+
+        reference_path = tmp_path / 'reference.xlsx'
+        pd.DataFrame({'Part Number': ['MC001', 'MC002'], '商品编码': [1, 2]}).to_excel(reference_path, index=False)
+        return {'input_dir': input_dir, 'reference': str(reference_path), 'output_dir': str(tmp_path / 'out')}
+
+    def test_collect_inputs_from_directory_and_manifest(self, batch_files, tmp_path):
+        """Directories are globbed; manifests resolve paths relative to themselves"""
+        from_dir = collect_inputs(str(batch_files['input_dir']))
+        assert [os.path.basename(p) for p in from_dir] == ['a.xlsx', 'b.xlsx', 'broken.xlsx']
+
+        manifest = tmp_path / 'manifest.txt'
+        manifest.write_text('# month-end\ninputs/b.xlsx\n\ninputs/a.xlsx\n', encoding='utf-8')
+        from_manifest = collect_inputs(str(manifest))
+        assert from_manifest == [str(tmp_path / 'inputs' / 'b.xlsx'), str(tmp_path / 'inputs' / 'a.xlsx')]
+
+    def test_convert_batch_writes_declarations_and_summary(self, batch_files):
+        """Each input gets a declaration and a summary row; failures are recorded, not raised"""
+        inputs = collect_inputs(str(batch_files['input_dir']))
+
+        summary = convert_batch(inputs, batch_files['reference'], None, batch_files['output_dir'], jobs=1, quiet=True)
+
+        assert summary['status'].tolist() == ['ok', 'ok', 'failed']
+        for output in summary['output'][:2]:
+            assert os.path.exists(output)
+        assert os.path.exists(os.path.join(batch_files['output_dir'], SUMMARY_FILE_NAME))
+
+    def test_output_names_are_unique(self, tmp_path):
+        """Inputs sharing a file name in different directories do not overwrite each other"""
+        inputs = [str(tmp_path / 'march' / 'invoice.xlsx'), str(tmp_path / 'april' / 'invoice.xlsx'),
+                  str(tmp_path / 'invoice_2.xlsx')]
+
+        outputs = output_paths(inputs, str(tmp_path / 'out'))
+
+        assert [os.path.basename(p) for p in outputs] == ['invoice_报关单.xlsx', 'invoice_2_报关单.xlsx',
+                                                        'invoice_2_2_报关单.xlsx']
+
+    def test_previous_outputs_are_not_inputs(self, batch_files):
+        """Converting into the input directory does not feed the declarations to the next run"""
+        inputs = collect_inputs(str(batch_files['input_dir']))[:1]
+        convert_batch(inputs, batch_files['reference'], None, str(batch_files['input_dir']), jobs=1, quiet=True)
+
+        assert os.path.exists(batch_files['input_dir'] / 'a_报关单.xlsx')
+        assert [os.path.basename(p) for p in collect_inputs(str(batch_files['input_dir']))] == \
+            ['a.xlsx', 'b.xlsx', 'broken.xlsx']
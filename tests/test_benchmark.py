@@ -0,0 +1,64 @@
+import contextlib
+import io
+import os
+import sys
+
+import pandas as pd
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import policy_config
+import template_manifest
+from benchmark import compare_to_baseline, ensure_workload, run_case
+from packing_list import locate_totals
+from workbook_context import WorkbookContext
+
+
+class TestBenchmarkWorkload:
+    """Test suite for the synthetic workload generator"""
+
+    def test_generated_input_has_supplier_layout(self, tmp_path):
+        """The generated invoice has the item table under 9 header rows and a PL Total row"""
+        input_path, reference_path = ensure_workload(25, 100, workload_dir=str(tmp_path))
+        ctx = WorkbookContext(input_path)
+
+        table = ctx.read_table(1, skiprows=9, stop_column='S/N')
+        assert table['S/N'].tolist() == list(range(1, 26))
+        assert locate_totals(ctx.frame(0)).count == 25
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            reference = pd.read_excel(reference_path)
+        assert len(reference) == 100
+        assert table['Part Number'].isin(reference['Part Number']).mean() > 0.8
+
+    def test_compare_to_baseline(self):
+        """Only cases slower than the tolerance are reported"""
+        baseline = [{'items': 10, 'codes': 1000, 'seconds': 1.0}, {'items': 100, 'codes': 1000, 'seconds': 2.0}]
+        results = [{'items': 10, 'codes': 1000, 'seconds': 1.2}, {'items': 100, 'codes': 1000, 'seconds': 2.6}]
+
+        regressions = compare_to_baseline(results, baseline, tolerance=0.25)
+
+        assert len(regressions) == 1 and 'items=100' in regressions[0]
+
+    def test_every_repeat_runs_cold(self, tmp_path, monkeypatch):
+        """The policy and the templates are parsed again on every timed run"""
+        calls = {'policy': 0, 'template': 0}
+        read_policy_cells, compile_template = policy_config.read_policy_cells, template_manifest.compile_template
+
+        def count_policy(*args, **kwargs):
+            calls['policy'] += 1
+            return read_policy_cells(*args, **kwargs)
+
+        def count_template(*args, **kwargs):
+            calls['template'] += 1
+            return compile_template(*args, **kwargs)
+
+        monkeypatch.setattr(policy_config, 'read_policy_cells', count_policy)
+        monkeypatch.setattr(template_manifest, 'compile_template', count_template)
+        policy_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'policy.xlsx')
+
+        result = run_case(10, 50, policy_path, str(tmp_path), repeat=2, memory=False, workload_dir=str(tmp_path))
+
+        assert calls == {'policy': 2, 'template': 4}
+        assert 'reference read' in result['stages']
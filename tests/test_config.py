@@ -1,6 +1,7 @@
 import os
 import sys
 import importlib
+import subprocess
 import pytest
 
 # Add the parent directory to sys.path to import the module
@@ -80,6 +81,21 @@ class TestConfig:
         assert config.OUTPUT_FILE_NAME.strip(), "OUTPUT_FILE_NAME should not be empty"
         assert config.OUTPUT_FILE_NAME.endswith(('.xlsx', '.xls')), "OUTPUT_FILE_NAME should have an Excel extension"
 
+    def test_config_without_optional_settings(self, tmp_path):
+        """An older config.py without the optional settings still overrides the columns"""
+        (tmp_path / 'config.py').write_text(
+            "PRESERVED_COLUMNS = ['项号']\nMATERIAL_CODE_COLUMN = 'Part Number'\n"
+            "MATCHED_COLUMNS = []\nFIXED_COLUMNS = {}\n", encoding='utf-8')
+        app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = ("import sys; sys.path[:0] = [sys.argv[1], sys.argv[2]]; import excel_converter as e; "
+                "print(e.PRESERVED_COLUMNS, e.DUPLICATE_CODE_POLICY)")
+
+        result = subprocess.run([sys.executable, '-c', code, str(tmp_path), app_dir],
+                                capture_output=True, text=True, encoding='utf-8', check=True)
+
+        assert "['项号'] last" in result.stdout
+        assert 'config.py file not found' not in result.stdout
+
 
 if __name__ == "__main__":
     pytest.main(["-v", __file__]) 
\ No newline at end of file
@@ -1,3 +1,5 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
 import pytest
@@ -9,7 +11,12 @@ from pathlib import Path
 # Add the parent directory to sys.path to import the module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from excel_converter import convert_excel, COLUMN_MAPPING
+from openpyxl import load_workbook
+
+from excel_converter import convert_excel, convert_excel_bytes, clear_prepared_items, load_reference, COLUMN_MAPPING
+from policy_config import PolicyConfig
+from stage_timer import StageTimer
+from workbook_context import WorkbookContext
 
 
 class TestExcelConverter:
@@ -260,11 +267,12 @@ class TestExcelConverter:
         reference_path = setup_test_files['reference_path']
         output_path = setup_test_files['output_path']
         
-        # Mock pd.ExcelFile to raise an exception
-        def mock_excelfile(*args, **kwargs):
+        # Mock the workbook loader used by the input reader to raise an exception
+        def mock_load_workbook(*args, **kwargs):
             raise Exception("Simulated Excel read error")
         
-        monkeypatch.setattr(pd, "ExcelFile", mock_excelfile)
+        import workbook_context
+        monkeypatch.setattr(workbook_context, "load_workbook", mock_load_workbook)
         
         # Call the convert_excel function
         result = convert_excel(input_path, reference_path, output_path, None)
@@ -313,5 +321,133 @@ class TestExcelConverter:
         assert result_df2 is not None
 
 
+class TestConvertExcelBytes:
+    """Test suite for the in-memory conversion API"""
+
+    @staticmethod
+    def workbook_bytes(sheets):
+        """Serialize {sheet_name: (DataFrame, startrow)} to xlsx bytes"""
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            for name, (df, startrow) in sheets.items():
+                df.to_excel(writer, sheet_name=name, index=False, startrow=startrow)
+        return buffer.getvalue()
+
+    def test_returns_merged_workbook_without_writing_files(self, tmp_path, monkeypatch):
+        """The bytes API returns the merged declaration and leaves the filesystem untouched"""
+        monkeypatch.chdir(tmp_path)
+        input_bytes = self.workbook_bytes({
+            'PL': (pd.DataFrame({'S/N': [1]}), 0),
+            'CI': (pd.DataFrame({
+                'S/N': [1, 2],
+                'Part Number': ['MC001', 'MC002'],
+                'Quantity': [10, 20],
+                'Total Amount (CIF, USD)': [100.0, 200.0],
+            }), 9),
+        })
+        reference_bytes = self.workbook_bytes({
+            'Sheet1': (pd.DataFrame({'Part Number': ['MC001', 'MC002'], '商品编码': [8208101900, 8516800000]}), 0),
+        })
+
+        result = convert_excel_bytes(input_bytes, reference_bytes)
+
+        assert isinstance(result, bytes)
+        assert os.listdir(tmp_path) == []
+        merged = load_workbook(io.BytesIO(result))
+        assert merged.sheetnames[0] == '报关单'
+
+    def test_path_runs_reuse_the_reference_snapshot(self, tmp_path, capsys):
+        """convert_excel keeps a reference snapshot and loads it on the next run"""
+        input_path, reference_path = tmp_path / 'input.xlsx', tmp_path / 'reference.xlsx'
+        input_path.write_bytes(self.workbook_bytes({
+            'PL': (pd.DataFrame({'S/N': [1]}), 0),
+            'CI': (pd.DataFrame({'S/N': [1], 'Part Number': ['MC001'], 'Quantity': [10]}), 9),
+        }))
+        reference_path.write_bytes(self.workbook_bytes({
+            'Sheet1': (pd.DataFrame({'Part Number': ['MC001'], '商品编码': [8208101900]}), 0),
+        }))
+        snapshots = tmp_path / 'snapshots'
+
+        for _ in range(2):
+            assert convert_excel(str(input_path), str(reference_path), None, str(tmp_path / 'out.xlsx'),
+                                 str(tmp_path / 'merged.xlsx'), reference_cache_dir=str(snapshots)) is not None
+
+        assert len(os.listdir(snapshots)) == 1
+        assert 'Loaded reference index snapshot' in capsys.readouterr().out
+
+    def test_accepts_parsed_sources(self, tmp_path, monkeypatch):
+        """A WorkbookContext, ReferenceIndex and PolicyConfig can stand in for raw bytes"""
+        monkeypatch.chdir(tmp_path)
+        input_bytes = self.workbook_bytes({
+            'PL': (pd.DataFrame({'S/N': [1]}), 0),
+            'CI': (pd.DataFrame({'S/N': [1], 'Part Number': ['MC001'], 'Quantity': [10]}), 9),
+        })
+        reference_bytes = self.workbook_bytes({
+            'Sheet1': (pd.DataFrame({'Part Number': ['MC001'], '商品编码': [8208101900]}), 0),
+        })
+        context = WorkbookContext(input_bytes)
+
+        result = convert_excel_bytes(context, load_reference(reference_bytes), PolicyConfig())
+
+        assert isinstance(result, bytes)
+        # The context can be reused by a later conversion
+        assert convert_excel_bytes(context, load_reference(reference_bytes), PolicyConfig()) is not None
+
+    def test_concurrent_jobs_are_isolated(self, tmp_path, monkeypatch):
+        """Conversions running at once keep their own header values, independent of the CWD"""
+        monkeypatch.chdir(tmp_path)
+        reference = load_reference(self.workbook_bytes({
+            'Sheet1': (pd.DataFrame({'Part Number': ['MC001'], '商品编码': [8208101900]}), 0),
+        }))
+
+        def invoice(buyer):
+            header = pd.DataFrame({'Seller Co.': [None, None, f'Buyer: {buyer}']})
+            items = pd.DataFrame({'S/N': [1], 'Part Number': ['MC001'], 'Quantity': [10]})
+            buffer = io.BytesIO()
+            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                pd.DataFrame({'S/N': [1]}).to_excel(writer, sheet_name='PL', index=False)
+                header.to_excel(writer, sheet_name='CI', index=False)
+                items.to_excel(writer, sheet_name='CI', index=False, startrow=9)
+            return buffer.getvalue()
+
+        buyers = [f'Buyer {i}' for i in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda buyer: convert_excel_bytes(invoice(buyer), reference, PolicyConfig()),
+                                    buyers))
+
+        for buyer, result in zip(buyers, results):
+            ws = load_workbook(io.BytesIO(result)).active
+            assert ws['A4'].value == f'境外收货人\n{buyer}'
+
+    def test_policy_change_reuses_item_table(self, tmp_path, monkeypatch):
+        """Only the policy-dependent stages re-run when the same input is converted with a new policy"""
+        monkeypatch.chdir(tmp_path)
+        clear_prepared_items()
+        input_bytes = self.workbook_bytes({
+            'PL': (pd.DataFrame({'S/N': [1]}), 0),
+            'CI': (pd.DataFrame({'S/N': [1], 'Part Number': ['MC001'], 'Quantity': [10]}), 9),
+        })
+        reference = load_reference(self.workbook_bytes({
+            'Sheet1': (pd.DataFrame({'Part Number': ['MC001'], '商品编码': [8208101900]}), 0),
+        }))
+
+        def freight_cells(result):
+            ws = load_workbook(io.BytesIO(result)).active
+            return [cell.value for row in ws.iter_rows() for cell in row
+                    if isinstance(cell.value, str) and cell.value.startswith('运费')]
+
+        first, second, unmemoized = StageTimer(), StageTimer(), StageTimer()
+        assert freight_cells(convert_excel_bytes(input_bytes, reference, PolicyConfig(ty=100), timer=first,
+                                                 memoize=True)) == ['运费（CNY)\n100']
+        assert freight_cells(convert_excel_bytes(input_bytes, reference, PolicyConfig(ty=250), timer=second,
+                                                 memoize=True)) == ['运费（CNY)\n250']
+        convert_excel_bytes(input_bytes, reference, PolicyConfig(ty=250), timer=unmemoized)
+
+        assert 'matching' in dict(first.spans)
+        assert [stage for stage, _ in second.spans] == ['policy', 'fees', 'template fill', 'merge']
+        # 未开启 memoize 的调用（命令行、批量转换）每次都完整运行
+        assert 'matching' in dict(unmemoized.spans)
+
+
 if __name__ == "__main__":
     pytest.main(["-v", __file__]) 
\ No newline at end of file
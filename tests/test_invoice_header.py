@@ -0,0 +1,102 @@
+import io
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_header import HeaderExtractor
+from workbook_context import WorkbookContext
+
+
+class TestHeaderExtractor:
+    """Test suite for the invoice header extractor"""
+
+    @pytest.fixture
+    def invoice_context(self):
+        """A PL sheet plus an invoice sheet with header fields at the top and a delivery term near the bottom"""
+        wb = Workbook()
+        wb.active.title = 'PL'
+        ws = wb.create_sheet('CI')
+        ws.append(['Example Seller Co., Ltd'])
+        ws.append(['Commercial Invoice'])
+        ws.append(['Buyer:   ACME India  ', None, 'Invoice Number:', 9999.0])
+        for i in range(30):
+            ws.append([i + 1, 'item'])
+        ws.append(['Delivery Term: CIF'])
+        ws.append([])
+        ws.append(['Bank Name: Example Bank'])
+        ws.append([])
+        ws.append([])
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        return WorkbookContext(buffer.getvalue())
+
+    def test_default_fields(self, invoice_context):
+        """Seller, buyer, invoice number and delivery term are read from the bands"""
+        header = HeaderExtractor().extract(invoice_context, 1)
+
+        assert header.seller == 'Example Seller Co., Ltd'
+        assert header.buyer == 'ACME India'
+        assert header.invoice_number == 9999
+        assert header.delivery_term == 'CIF'
+
+    def test_bottom_band_ignores_trailing_blank_rows(self, invoice_context):
+        """The bottom band ends at the last non-empty row"""
+        top, bottom = invoice_context.bands(1, top=1, bottom=3)
+
+        assert top[0][0] == 'Example Seller Co., Ltd'
+        assert [row[0] if row else None for row in bottom] == ['Delivery Term: CIF', None, 'Bank Name: Example Bank']
+
+    def test_bottom_band_bounded_by_item_table(self):
+        """After read_table, the bottom band is searched only in a window below the table"""
+        wb = Workbook()
+        wb.active.title = 'PL'
+        ws = wb.create_sheet('CI')
+        ws.append(['Example Seller Co., Ltd'])
+        ws.append(['S/N', 'Name'])
+        ws.append([1, 'item'])
+        ws.append([None, 'Total'])
+        ws.append(['Delivery Term: FOB'])
+        ws.cell(row=200, column=1, value='Delivery Term: EXW')
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        extractor = HeaderExtractor(footer_rows=10)
+
+        assert extractor.extract(WorkbookContext(buffer.getvalue()), 1).delivery_term == 'EXW'
+
+        context = WorkbookContext(buffer.getvalue())
+        context.read_table(1, skiprows=1, stop_column='S/N')
+        assert extractor.extract(context, 1).delivery_term == 'FOB'
+
+    def test_bands_reuse_the_table_pass(self, invoice_context):
+        """Rows kept by read_table answer bands without streaming the sheet again"""
+        streamed = WorkbookContext(invoice_context.source.getvalue())
+        streamed.read_table(1, skiprows=2, stop_column='Buyer:   ACME India')
+        invoice_context.read_table(1, skiprows=2, stop_column='Buyer:   ACME India', footer=10)
+
+        def no_second_pass(*args, **kwargs):
+            raise AssertionError('the invoice sheet was streamed twice')
+
+        invoice_context.sheet(1).iter_rows = no_second_pass
+        bands = invoice_context.bands(1, top=3, bottom=3, footer=10)
+
+        assert bands == streamed.bands(1, top=3, bottom=3, footer=10)
+        assert bands[0][0][0] == 'Example Seller Co., Ltd'
+        assert [row[0] if row else None for row in bands[1]] == [None, 'Bank Name: Example Bank']
+
+    def test_configured_fields(self, invoice_context):
+        """New layouts are described by field specs, without code changes"""
+        extractor = HeaderExtractor({
+            'seller': {'cell': 'A2'},
+            'bank': {'band': 'bottom', 'pattern': r'Bank Name:(.*)'},
+        })
+
+        header = extractor.extract(invoice_context, 'CI')
+
+        assert header.seller == 'Commercial Invoice'
+        assert header.buyer == ''
+        assert header.extra == {'bank': 'Example Bank'}
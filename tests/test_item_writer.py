@@ -0,0 +1,32 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from item_writer import ITEM_COLUMN_WIDTH, build_item_workbook, write_item_sheet
+
+
+class TestItemWriter:
+    """Test suite for the item sheet writers"""
+
+    def test_streamed_sheet_matches_in_memory_sheet(self):
+        """The write-only output has the same cells, header style and widths"""
+        df = pd.DataFrame({'项号': ['1', '2'], '数量': [10, np.nan], '总价': [1.5, 2.25]})
+        buffer = io.BytesIO()
+
+        write_item_sheet(df, buffer)
+        streamed = load_workbook(buffer).active
+        in_memory = build_item_workbook(df).active
+
+        for ws in (streamed, in_memory):
+            assert [[c.value for c in row] for row in ws.iter_rows()] == [
+                ['项号', '数量', '总价'], ['1', 10, 1.5], ['2', None, 2.25]]
+            assert ws['A1'].font.b
+            assert ws['A2'].font.b is False
+        assert streamed.column_dimensions['C'].width == ITEM_COLUMN_WIDTH
@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import job_queue
+from job_queue import DONE, FAILED, QUEUED, JobQueue, JobQueueFull
+
+
+def wait_until_finished(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while not queue.get(job_id).finished:
+        assert time.time() < deadline, "job did not finish in time"
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+class TestJobQueue:
+    """Test suite for the background conversion job queue"""
+
+    @pytest.fixture
+    def blocking_conversion(self, monkeypatch):
+        """Replace the conversion with one that reports stages and waits for a release event"""
+        release = threading.Event()
+
+        def convert(input_file, reference_file, policy_file=None, timer=None, cache=None, memoize=False):
+            timer.begin('input read')
+            timer.begin('matching')
+            release.wait(5)
+            if input_file == b'bad':
+                raise ValueError('broken input')
+            return b'merged:' + input_file
+
+        monkeypatch.setattr(job_queue, 'convert_excel_bytes', convert)
+        return release
+
+    def test_jobs_report_status_and_result(self, blocking_conversion):
+        """A job moves from running to done and exposes its stage, progress and result"""
+        queue = JobQueue(workers=1)
+        job_id = queue.submit(b'one', None)
+
+        time.sleep(0.05)
+        job = queue.get(job_id)
+        assert job.status == 'running' and job.stage == 'matching' and 0 < job.progress < 1
+
+        blocking_conversion.set()
+        job = wait_until_finished(queue, job_id)
+        assert (job.status, job.result, job.progress) == (DONE, b'merged:one', 1.0)
+        queue.shutdown()
+
+    def test_bounded_queue_rejects_overflow(self, blocking_conversion):
+        """Jobs beyond the worker and waiting limits are refused; failures are reported"""
+        queue = JobQueue(workers=1, max_pending=1)
+        running = queue.submit(b'one', None)
+        time.sleep(0.05)
+        waiting = queue.submit(b'bad', None)
+
+        assert queue.get(waiting).status == QUEUED
+        assert queue.position(waiting) == 0
+        with pytest.raises(JobQueueFull):
+            queue.submit(b'three', None)
+
+        blocking_conversion.set()
+        assert wait_until_finished(queue, running).status == DONE
+        failed = wait_until_finished(queue, waiting)
+        assert (failed.status, failed.error) == (FAILED, 'broken input')
+        queue.shutdown()
@@ -0,0 +1,159 @@
+import io
+import os
+import sys
+
+import openpyxl
+import pytest
+from openpyxl.drawing.image import Image
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import PatternFill
+from PIL import Image as PILImage
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from merge import copy_cell_style, main, merge_files, merge_workbooks, merged_cell_anchors
+
+
+class TestMergeWorkbooks:
+    """Test suite for the in-process merge engine"""
+
+    def test_sources_are_stacked_with_row_offset(self, header_wb, items_wb):
+        """Each source starts directly below the previous one"""
+        merged = merge_workbooks([header_wb, items_wb])
+        ws = merged['报关单']
+
+        assert ws['A1'].value == '中华人民共和国海关出口货物报关单'
+        assert ws['A3'].value == '项号'
+        assert ws['B4'].value == '境内发货人'
+        assert 'A1:C1' in [str(r) for r in ws.merged_cells.ranges]
+        assert ws['A2'].font.b
+
+    def test_accepts_bytes_and_buffers(self, header_wb, items_wb):
+        """Serialized workbooks are accepted alongside workbook objects"""
+        buffer = io.BytesIO()
+        items_wb.save(buffer)
+
+        merged = merge_workbooks([header_wb, buffer.getvalue()], sheet_title='Merged')
+        ws = merged['Merged']
+
+        assert merged.sheetnames[0] == 'Merged'
+        assert ws['A4'].value == 1
+
+    def test_merged_cells_resolve_to_their_anchor(self, header_wb):
+        """Every cell covered by a merged range maps to the range's top-left cell"""
+        ws = header_wb.active
+        ws['A5'] = '运费'
+        ws.merge_cells('A5:B6')
+
+        anchors = merged_cell_anchors(ws)
+
+        assert anchors[(1, 3)] is ws['A1']
+        assert anchors[(6, 2)] is ws['A5']
+        assert (2, 1) not in anchors
+        assert len(anchors) == 3 + 4
+
+    def test_cell_styles_are_interned_per_source(self, header_wb):
+        """Cells sharing a source style reuse one registered target style, each in its own array"""
+        source = header_wb.active
+        source['B2'].font = openpyxl.styles.Font(bold=True)
+        target = openpyxl.Workbook().active
+        interned = {}
+
+        copy_cell_style(source['A2'], target['A1'], interned)
+        copy_cell_style(source['B2'], target['B1'], interned)
+
+        assert len(interned) == 1
+        assert target['A1'].font.b and target['B1'].font.b
+        assert target['A1']._style == target['B1']._style
+        assert target['A1']._style is not target['B1']._style
+
+    def test_images_are_carried_with_their_original_bytes(self, header_wb, items_wb):
+        """Images move down with their source and keep the media bytes they were loaded with"""
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (4, 3), (200, 0, 0)).save(buffer, 'PNG')
+        png = buffer.getvalue()
+        items_wb.active.add_image(Image(io.BytesIO(png)), 'B2')
+        saved = io.BytesIO()
+        items_wb.save(saved)
+
+        merged = merge_workbooks([header_wb, saved.getvalue()])
+        images = merged['报关单']._images
+
+        assert len(images) == 1
+        assert images[0]._data() == png
+        assert images[0].anchor._from.row == 1 + 2
+        assert len(merge_workbooks([header_wb, saved.getvalue()], images=False)['报关单']._images) == 0
+
+    def test_row_height_policies(self, header_wb, items_wb):
+        """Row heights follow the chosen policy; unknown policies are rejected"""
+        items_wb.active.row_dimensions[2].height = 40
+
+        declaration = merge_workbooks([header_wb, items_wb])['报关单']
+        source = merge_workbooks([header_wb, items_wb], row_heights='source')['报关单']
+        none = merge_workbooks([header_wb, items_wb], row_heights='none')['报关单']
+
+        assert [declaration.row_dimensions[r].height for r in (3, 4)] == [30, 30]
+        assert [source.row_dimensions[r].height for r in (3, 4)] == [None, 40]
+        assert none.row_dimensions[4].height is None
+        with pytest.raises(ValueError):
+            merge_workbooks([header_wb, items_wb], row_heights='double')
+
+    def test_conditional_formats_of_every_source_are_shifted(self, header_wb, items_wb):
+        """Each source's conditional formats are kept, offset by that source's start row"""
+        rule = CellIsRule(operator='equal', formula=['0'], fill=PatternFill(bgColor='FFC7CE'))
+        header_wb.active.conditional_formatting.add('B2', rule)
+        items_wb.active.conditional_formatting.add('B1:B2', rule)
+
+        merged = merge_workbooks([header_wb, items_wb])['报关单']
+
+        assert sorted(str(cf.sqref) for cf in merged.conditional_formatting) == ['B2', 'B3:B4']
+
+
+class TestMergeFiles:
+    """Test suite for the non-interactive merge entry point"""
+
+    @pytest.fixture
+    def declarations(self, tmp_path):
+        """Three small declaration files on disk"""
+        paths = []
+        for n in range(3):
+            wb = openpyxl.Workbook()
+            wb.active.append([f'报关单 {n}'])
+            wb.active.append([n])
+            path = tmp_path / f'{n}.xlsx'
+            wb.save(path)
+            paths.append(str(path))
+        return paths
+
+    @pytest.mark.parametrize('engine', ['openpyxl', 'xml'])
+    def test_output_targets(self, declarations, tmp_path, engine):
+        """The result can be returned as bytes, written to a file object or saved to a path"""
+        data = merge_files(declarations, engine=engine)
+        buffer = io.BytesIO()
+        merge_files(declarations, buffer, engine=engine)
+        merge_files(declarations, str(tmp_path / 'out.xlsx'), engine=engine)
+
+        for target in (io.BytesIO(data), io.BytesIO(buffer.getvalue()), tmp_path / 'out.xlsx'):
+            ws = openpyxl.load_workbook(target).active
+            assert [row[0] for row in ws.values] == ['报关单 0', 0, '报关单 1', 1, '报关单 2', 2]
+
+    def test_rejects_empty_sources_and_unknown_engine(self, declarations):
+        """Nothing to merge and unknown engines are reported as errors"""
+        with pytest.raises(ValueError):
+            merge_files([])
+        with pytest.raises(ValueError):
+            merge_files(declarations, engine='com')
+
+    def test_cli_writes_the_explicit_output(self, declarations, tmp_path, monkeypatch):
+        """Every argument is a source; the result goes to --output and nothing is opened"""
+        monkeypatch.setattr('builtins.input', lambda *args: pytest.fail('the merge must not wait for input'))
+        output = tmp_path / 'merged' / 'declaration.xlsx'
+        output.parent.mkdir()
+
+        main(declarations + ['-o', str(output), '--sheet-title', 'Merged', '--engine', 'xml'],
+             work_dir=str(tmp_path / 'unused'))
+
+        merged = openpyxl.load_workbook(output)
+        assert merged.sheetnames == ['Merged']
+        assert merged.active.max_row == 6
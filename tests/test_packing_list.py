@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pandas as pd
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packing_list import locate_totals, scan_totals
+
+
+def _packing_list(rows):
+    """Build a 9-column PL frame from (S/N, label, count, gross, net) tuples"""
+    return pd.DataFrame([[sn, None, label, None, None, count, None, gross, net]
+                         for sn, label, count, gross, net in rows])
+
+
+class TestLocateTotals:
+    """Test suite for the vectorized packing-list totals locator"""
+
+    def test_total_after_carton_row(self):
+        """The first Total row that follows a numbered carton row is used"""
+        df = _packing_list([
+            ('Total', ' Total ', 99, 99, 99),   # header-like row, no numeric row before it
+            (1, 'Carton', 2, 10.5, 9.5),
+            (2, 'Carton', 3, 20.0, 18.0),
+            (None, ' Total ', 5, 30.5, None),
+            (3, 'Carton', 1, 1, 1),
+            (None, 'Total', 1, 1, 1),
+        ])
+
+        totals = locate_totals(df)
+
+        assert (totals.count, totals.gross, totals.net, totals.row) == (5.0, 30.5, 0, 3)
+
+    def test_no_valid_total_row(self):
+        """Total rows without a numeric predecessor, or sheets without labels, yield None"""
+        assert locate_totals(_packing_list([('S/N', 'Total', 1, 1, 1), ('x', 'Total', 1, 1, 1)])) is None
+        assert locate_totals(pd.DataFrame({'a': [1, 2]})) is None
+
+
+class TestScanTotals:
+    """Test suite for the streaming packing-list totals scan"""
+
+    def test_matches_locate_totals(self):
+        """Streamed rows give the same totals row as the parsed frame"""
+        rows = [('S/N', 'Carton', 'Qty', 'GW', 'NW'),
+                ('Total', ' Total ', 99, 99, 99),
+                (1, 'Carton', 2, 10.5, 9.5),
+                (2, 'Carton', 3, 20.0, 18.0),
+                (None, ' Total ', 5, 30.5, None)]
+        sheet_rows = [(sn, None, label, None, None, count, None, gross, net)
+                      for sn, label, count, gross, net in rows]
+
+        totals = scan_totals(sheet_rows)
+        expected = locate_totals(_packing_list(rows[1:]))
+
+        assert (totals.count, totals.gross, totals.net, totals.row) == (5.0, 30.5, 0, 3)
+        assert (totals.count, totals.gross, totals.net, totals.row) == \
+            (expected.count, expected.gross, expected.net, expected.row)
+
+    def test_stops_at_totals_row(self):
+        """Rows below the totals row are never consumed"""
+        def rows():
+            yield ('S/N',) + (None,) * 8
+            yield (1, None, 'Carton', None, None, 2, None, 10, 9)
+            yield (None, None, 'Total', None, None, 2, None, 10, 9)
+            raise AssertionError('read past the totals row')
+
+        assert scan_totals(rows()).count == 2.0
+
+    def test_no_valid_total_row(self):
+        """Total rows without a numeric predecessor, or empty sheets, yield None"""
+        assert scan_totals([('h',), ('S/N', None, 'Total') + (1,) * 6, ('x', None, 'Total') + (1,) * 6]) is None
+        assert scan_totals([]) is None
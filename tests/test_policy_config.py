@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import policy_config
+from policy_config import evaluate_formula, load_policy
+
+
+class TestPolicyConfig:
+    """Test suite for the policy workbook parser"""
+
+    @pytest.fixture
+    def policy_bytes(self):
+        """A policy sheet with a formula exchange rate in B9"""
+        wb = Workbook()
+        ws = wb.active
+        for coord, value in {'B3': 1000, 'B4': 200, 'B5': 0.2, 'B6': 0.1, 'B7': 1.1,
+                             'B8': 0.0005, 'B9': '=1/7.2', 'B16': 10000}.items():
+            ws[coord] = value
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
+
+    def test_policy_values(self, policy_bytes):
+        """Fees are computed from column B, with B9 evaluated as a formula"""
+        policy = load_policy(policy_bytes)
+
+        assert policy.exchange_rate == pytest.approx(1 / 7.2)
+        assert policy.shipping_rate == 0.2
+        assert policy.ty == 200
+        assert policy.total_insurance == round(10000 * 1.1 * 0.0005 * 1.1, 2)
+
+    def test_policy_parsed_once_per_content(self, policy_bytes, monkeypatch):
+        """The same content is served from the cache without re-reading the workbook"""
+        first = load_policy(policy_bytes)
+        monkeypatch.setattr(policy_config, 'read_policy_cells', None)
+        assert load_policy(io.BytesIO(policy_bytes)) is first
+
+    @pytest.mark.parametrize('formula, expected', [('=7.1*1.02', 7.1 * 1.02), ('=-(2+3)^2', 25.0), ('6.9', 6.9),
+                                                   ('=2^3^2', 64.0), ('=-2^2', 4.0), ('=8/2/2', 2.0), ('=2^-1', 0.5)])
+    def test_evaluate_formula(self, formula, expected):
+        """Plain arithmetic is evaluated with Excel's precedence: unary minus before ^, ^ left-associative"""
+        assert evaluate_formula(formula) == pytest.approx(expected)
+
+    @pytest.mark.parametrize('formula', ['=A1*2', '=__import__("os")', '=SUM(1,2)'])
+    def test_evaluate_formula_rejects_non_arithmetic(self, formula):
+        """Cell references, names and function calls are refused"""
+        with pytest.raises(ValueError):
+            evaluate_formula(formula)
+
+    @pytest.mark.parametrize('formula', ['=9^9^9^9', '=2^2000', '=10^400', '=1/0', '=(-8)^(1/3)'])
+    def test_evaluate_formula_rejects_unbounded_results(self, formula):
+        """Huge exponents, overflow and undefined results are reported as bad formulas, not hangs"""
+        with pytest.raises(ValueError):
+            evaluate_formula(formula)
+
+    def test_policy_cache_is_bounded(self, policy_bytes, monkeypatch):
+        """Parsed policies are evicted least recently used beyond POLICY_CACHE_SIZE"""
+        monkeypatch.setattr(policy_config, 'POLICY_CACHE_SIZE', 1)
+        policy_config.clear_policy_cache()
+        first = load_policy(policy_bytes)
+        load_policy(policy_bytes + b'\0')  # different content, still a readable workbook
+
+        assert len(policy_config._parsed_policies) == 1
+        assert load_policy(policy_bytes) is not first
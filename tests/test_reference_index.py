@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reference_index
+from reference_index import load_reference_index
+
+
+class TestReferenceIndex:
+    """Test suite for the compiled reference catalog index"""
+
+    @pytest.fixture
+    def reference_path(self, tmp_path):
+        """A reference catalog with a duplicated material code"""
+        path = tmp_path / 'reference.xlsx'
+        pd.DataFrame({
+            'Part Number': ['MC001', 'MC002', 'MC001'],
+            '商品编码': [1, 2, 3],
+            '申报要素': ['A', 'B', 'C'],
+        }).to_excel(path, index=False)
+        return str(path)
+
+    def test_match_fills_all_columns_in_one_join(self, reference_path, tmp_path):
+        """All requested columns are joined at once; unmatched codes are reported"""
+        index = load_reference_index(reference_path, 'Part Number', cache_dir=str(tmp_path / 'cache'))
+        codes = pd.Series(['MC001', 'MC002', 'UNKNOWN', 'UNKNOWN'], index=[10, 11, 12, 13])
+
+        matched, unmatched = index.match(codes, ['商品编码', '申报要素'])
+
+        assert matched.index.tolist() == [10, 11, 12, 13]
+        assert matched['商品编码'].tolist()[:2] == [3, 2]
+        assert matched['申报要素'].tolist()[:2] == ['C', 'B']
+        assert matched.loc[12].isna().all()
+        assert unmatched == ['UNKNOWN']
+
+    @pytest.mark.parametrize('policy, expected', [('first', 1), ('last', 3)])
+    def test_duplicate_policy_keeps_requested_row(self, reference_path, tmp_path, policy, expected):
+        """Duplicate codes resolve to the first or last row as configured"""
+        index = load_reference_index(reference_path, 'Part Number', duplicates=policy, cache_dir=None)
+        matched, _ = index.match(pd.Series(['MC001']), ['商品编码'])
+        assert matched['商品编码'].tolist() == [expected]
+
+    def test_duplicate_policy_error_rejects_catalog(self, reference_path):
+        """The 'error' policy refuses a catalog with duplicate codes"""
+        with pytest.raises(ValueError, match='MC001'):
+            load_reference_index(reference_path, 'Part Number', duplicates='error', cache_dir=None)
+
+    def test_snapshot_reused_until_source_changes(self, reference_path, tmp_path, monkeypatch):
+        """A second load is served from the snapshot; a changed file is re-parsed"""
+        cache_dir = str(tmp_path / 'cache')
+        load_reference_index(reference_path, 'Part Number', cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 1
+
+        def fail_read_excel(*args, **kwargs):
+            raise AssertionError("reference should not be re-parsed")
+
+        monkeypatch.setattr(reference_index.pd, 'read_excel', fail_read_excel)
+        index = load_reference_index(reference_path, 'Part Number', cache_dir=cache_dir)
+        assert index.match(pd.Series(['MC002']), ['申报要素'])[0]['申报要素'].tolist() == ['B']
+
+        monkeypatch.undo()
+        pd.DataFrame({'Part Number': ['MC009'], '商品编码': [9]}).to_excel(reference_path, index=False)
+        index = load_reference_index(reference_path, 'Part Number', cache_dir=cache_dir)
+        assert index.match(pd.Series(['MC009']), ['商品编码'])[0]['商品编码'].tolist() == [9]
+        assert len(os.listdir(cache_dir)) == 2
+
+    def test_no_snapshot_without_cache_dir(self, reference_path, tmp_path, monkeypatch):
+        """By default the index is built in memory and nothing is written to disk"""
+        monkeypatch.setattr(reference_index.pd, 'to_pickle', None)
+        index = load_reference_index(reference_path, 'Part Number')
+        assert index.match(pd.Series(['MC002']), ['申报要素'])[0]['申报要素'].tolist() == ['B']
+
+    def test_snapshots_are_evicted_least_recently_used(self, reference_path, tmp_path):
+        """Snapshots beyond max_bytes are removed, oldest access first"""
+        cache_dir = str(tmp_path / 'cache')
+        load_reference_index(reference_path, 'Part Number', cache_dir=cache_dir)
+        first = os.listdir(cache_dir)
+        os.utime(os.path.join(cache_dir, first[0]), (0, 0))
+
+        size = os.path.getsize(os.path.join(cache_dir, first[0]))
+        load_reference_index(reference_path, 'Part Number', duplicates='first', cache_dir=cache_dir,
+                             max_bytes=size * 3 // 2)
+
+        remaining = os.listdir(cache_dir)
+        assert len(remaining) == 1 and remaining != first
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import excel_converter
+from policy_config import PolicyConfig
+from result_cache import ResultCache, conversion_key
+
+
+class TestResultCache:
+    """Test suite for the content-addressed conversion result cache"""
+
+    def test_key_follows_content_and_settings(self):
+        """Keys depend on file contents, policy values and configuration only"""
+        settings = {'matched_columns': ['商品编码']}
+        key = conversion_key(b'input', b'ref', PolicyConfig(), b'header', b'footer', settings)
+
+        assert key == conversion_key(bytearray(b'input'), b'ref', PolicyConfig(), b'header', b'footer', settings)
+        assert key != conversion_key(b'input2', b'ref', PolicyConfig(), b'header', b'footer', settings)
+        assert key != conversion_key(b'input', b'ref', PolicyConfig(ty=200), b'header', b'footer', settings)
+        assert key != conversion_key(b'input', b'ref', PolicyConfig(), b'header', b'footer', {})
+
+    def test_least_recently_used_results_are_evicted(self, tmp_path):
+        """Reading an entry keeps it; the oldest unread entry goes when the limit is exceeded"""
+        cache = ResultCache(str(tmp_path), max_bytes=250)
+        cache.put('a', b'a' * 100)
+        cache.put('b', b'b' * 100)
+        past = time.time() - 60
+        os.utime(tmp_path / 'a.xlsx', (past, past))
+        os.utime(tmp_path / 'b.xlsx', (past - 1, past - 1))
+
+        assert cache.get('b') == b'b' * 100
+        cache.put('c', b'c' * 100)
+
+        assert cache.get('a') is None
+        assert cache.get('b') == b'b' * 100
+        assert cache.get('c') == b'c' * 100
+
+    def test_identical_conversion_is_served_from_cache(self, tmp_path, monkeypatch):
+        """A repeated conversion returns the stored bytes without running the pipeline"""
+        cache = ResultCache(str(tmp_path))
+        key = conversion_key(b'input', b'ref', None, excel_converter.HEADER_TEMPLATE_FILE,
+                             excel_converter.FOOTER_TEMPLATE_FILE, excel_converter._conversion_settings())
+        cache.put(key, b'declaration')
+
+        def fail(*args, **kwargs):
+            raise AssertionError('pipeline should not run')
+
+        monkeypatch.setattr(excel_converter, '_convert', fail)
+        assert excel_converter.convert_excel_bytes(b'input', b'ref', cache=cache) == b'declaration'
+
+    def test_missing_template_is_fingerprinted_as_absent(self, tmp_path):
+        """A template path that does not exist is keyed like no template, as the conversion skips it"""
+        missing = str(tmp_path / 'missing.xlsx')
+
+        assert conversion_key(b'input', b'ref', None, missing, None, {}) == \
+            conversion_key(b'input', b'ref', None, None, None, {})
+
+    def test_results_with_failed_stages_are_not_stored(self, tmp_path, monkeypatch):
+        """A declaration produced after a stage failed is returned but not cached"""
+        cache = ResultCache(str(tmp_path))
+        monkeypatch.setattr(excel_converter, '_convert', lambda *args: excel_converter.ConversionResult(
+            None, b'partial', None, ['PL totals']))
+
+        assert excel_converter.convert_excel_bytes(b'input', b'ref', cache=cache) == b'partial'
+        assert os.listdir(tmp_path) == []
@@ -0,0 +1,30 @@
+import json
+import os
+import sys
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stage_timer import StageTimer
+
+
+class TestStageTimer:
+    """Test suite for the conversion stage timer"""
+
+    def test_begin_closes_previous_span(self, tmp_path):
+        """Consecutive stages and context-managed spans are recorded in order"""
+        timer = StageTimer()
+        timer.begin('read')
+        timer.begin('match')
+        with timer.span('merge'):
+            pass
+        timer.end()
+
+        assert [stage for stage, _ in timer.spans] == ['read', 'match', 'merge']
+        assert all(seconds >= 0 for _, seconds in timer.spans)
+
+        path = tmp_path / 'timings.json'
+        timer.write_json(path)
+        data = json.loads(path.read_text(encoding='utf-8'))
+        assert [stage['stage'] for stage in data['stages']] == ['read', 'match', 'merge']
+        assert 'merge' in timer.report()
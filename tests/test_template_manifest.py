@@ -0,0 +1,61 @@
+import io
+import os
+import sys
+
+import pytest
+from openpyxl import Workbook
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import template_manifest
+from template_manifest import load_footer_template, load_header_template
+
+
+def _workbook_bytes(rows):
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+class TestTemplateManifest:
+    """Test suite for the precompiled declaration templates"""
+
+    @pytest.fixture
+    def header_bytes(self):
+        """A header template with labels surrounded by whitespace"""
+        return _workbook_bytes([
+            ['境内发货人\n', '  备注  ', '运费（CNY)\n'],
+            ['件数 \n', '毛重(千克)\n', '净重(千克)\n'],
+        ])
+
+    def test_header_fill_writes_recorded_cells(self, header_bytes):
+        """Values land on the label cells and other labels are stripped"""
+        template = load_header_template(header_bytes)
+        assert template.slots == {'境内发货人': ['A1'], '运费': ['C1'], '件数': ['A2'],
+                                  '毛重(千克)': ['B2'], '净重(千克)': ['C2']}
+
+        ws = template.fill({'件数': '件数 \n3', '运费': '运费（CNY)\n100'}).active
+
+        assert ws['A2'].value == '件数 \n3'
+        assert ws['C1'].value == '运费（CNY)\n100'
+        assert ws['B1'].value == '备注'
+        assert ws['B2'].value == '毛重(千克)'
+
+    def test_footer_value_goes_next_to_label(self):
+        """Footer values are written one column right, within the template range"""
+        template = load_footer_template(_workbook_bytes([['总净重：', None, '总货值']]))
+        assert template.slots == {'总净重': ['B1']}
+
+        ws = template.fill({'总净重': 12.5, '总货值': 99}).active
+        assert ws['B1'].value == 12.5
+        assert ws.max_column == 3
+
+    def test_manifest_compiled_once_per_content(self, header_bytes, monkeypatch):
+        """A template with unchanged content is served from the cache"""
+        first = load_header_template(header_bytes)
+        monkeypatch.setattr(template_manifest, 'compile_template', None)
+        assert load_header_template(header_bytes) is first
@@ -0,0 +1,76 @@
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workbook_context import WorkbookContext
+
+
+class TestWorkbookContext:
+    """Test suite for the parse-once workbook context"""
+
+    @pytest.fixture
+    def workbook_bytes(self):
+        """A two-sheet workbook (PL + invoice) serialized to bytes"""
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            pd.DataFrame({'S/N': [1, 2], 'Qty': [10, 20]}).to_excel(writer, sheet_name='PL', index=False)
+            pd.DataFrame({'HEADER': ['Seller Co.'] * 9}).to_excel(writer, sheet_name='CI', index=False)
+            pd.DataFrame({'S/N': [1], 'Qty': [5]}).to_excel(writer, sheet_name='CI', index=False, startrow=10)
+        return buffer.getvalue()
+
+    def test_frames_match_read_excel(self, workbook_bytes):
+        """Derived frames are identical to a direct pd.read_excel"""
+        ctx = WorkbookContext(workbook_bytes)
+
+        assert ctx.sheet_count == 2
+        for sheet, skiprows in [(0, None), (1, 9), (1, None)]:
+            expected = pd.read_excel(io.BytesIO(workbook_bytes), sheet_name=sheet, skiprows=skiprows)
+            pd.testing.assert_frame_equal(ctx.frame(sheet, skiprows=skiprows), expected)
+
+    def test_frames_are_isolated_copies(self, workbook_bytes):
+        """Mutating a returned frame does not affect later callers"""
+        ctx = WorkbookContext(workbook_bytes)
+
+        first = ctx.frame(0)
+        first['Qty'] = 0
+
+        assert ctx.frame(0)['Qty'].tolist() == [10, 20]
+        assert ctx.cell(1, 'A2') == 'Seller Co.'
+
+    def test_read_table_stops_at_first_empty_key(self, tmp_path):
+        """Streaming stops at the first empty S/N and keeps only the requested columns"""
+        path = tmp_path / 'invoice.xlsx'
+        df = pd.DataFrame({
+            'S/N': [1, 2, None, 'Bank Name: Example'],
+            ' Part Number ': ['MC001', 'MC002', None, None],
+            'Unused': ['x', 'y', 'z', 'w'],
+            'Quantity': [10, 2.5, 9506, None],
+        })
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            pd.DataFrame({'HEADER': ['HEADER'] * 9}).to_excel(writer, index=False)
+            df.to_excel(writer, index=False, startrow=9)
+
+        table = WorkbookContext(str(path)).read_table(
+            0, skiprows=9, columns={'S/N', 'Part Number', 'Quantity'}, stop_column='S/N')
+
+        assert table.columns.tolist() == ['S/N', 'Part Number', 'Quantity']
+        assert table['S/N'].tolist() == [1, 2]
+        assert table['Part Number'].tolist() == ['MC001', 'MC002']
+        assert table['Quantity'].tolist() == [10, 2.5]
+
+    def test_preview_reads_one_page(self, tmp_path):
+        """A preview page holds only the requested rows; the total comes from the sheet dimension"""
+        path = tmp_path / 'reference.xlsx'
+        pd.DataFrame({'Part Number': [f'MC{i:03d}' for i in range(50)], 'Code': range(50)}).to_excel(path, index=False)
+
+        page, total_rows = WorkbookContext(str(path)).preview(0, start=20, rows=5)
+
+        assert total_rows == 50
+        assert page['Part Number'].tolist() == ['MC020', 'MC021', 'MC022', 'MC023', 'MC024']
+        assert page['Code'].tolist() == [20, 21, 22, 23, 24]
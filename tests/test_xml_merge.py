@@ -0,0 +1,91 @@
+import io
+import os
+import sys
+import zipfile
+
+import openpyxl
+import pytest
+from openpyxl.drawing.image import Image
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import PatternFill
+from PIL import Image as PILImage
+
+# Add the parent directory to sys.path to import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from merge import merge_workbooks
+from template_manifest import FOOTER_TEMPLATE_FILE, HEADER_TEMPLATE_FILE
+from xml_merge import merge_packages
+
+
+class TestMergePackages:
+    """Test suite for the package-level merge engine"""
+
+    @pytest.fixture
+    def formatted_items_wb(self, items_wb):
+        """The item sheet with a conditional format"""
+        items_wb.active.conditional_formatting.add('C2:C3', CellIsRule(operator='equal', formula=['0'],
+                                                                       fill=PatternFill(bgColor='FFC7CE')))
+        return items_wb
+
+    def test_sources_are_stacked_with_row_offset(self, header_wb, formatted_items_wb):
+        """Values, styles, shared strings, merged ranges and formats follow the row offset"""
+        merged = openpyxl.load_workbook(io.BytesIO(merge_packages([header_wb, formatted_items_wb],
+                                                                  sheet_title='Merged')))
+        ws = merged.active
+
+        assert merged.sheetnames == ['Merged']
+        assert ws['A1'].value == '中华人民共和国海关出口货物报关单'
+        assert ws['A3'].value == '项号'
+        assert [ws['B4'].value, ws['C4'].value] == ['境内发货人', 10]
+        assert ws['A2'].font.b and not ws['A3'].font.b
+        assert [str(r) for r in ws.merged_cells.ranges] == ['A1:C1']
+        assert [str(cf.sqref) for cf in ws.conditional_formatting] == ['C4:C5']
+        assert ws.row_dimensions[3].height == 30
+
+    def test_whole_row_and_column_refs(self, header_wb, formatted_items_wb):
+        """Whole-row ranges are shifted, whole-column ranges are kept as they are"""
+        buffer = io.BytesIO()
+        formatted_items_wb.save(buffer)
+        source = io.BytesIO()
+        with zipfile.ZipFile(buffer) as zin, zipfile.ZipFile(source, 'w') as zout:
+            for item in zin.infolist():
+                data = zin.read(item.filename)
+                if item.filename == 'xl/worksheets/sheet1.xml':
+                    data = data.replace(b'sqref="C2:C3"', b'sqref="C:C 3:3"').replace(
+                        b'<conditionalFormatting', b'<mergeCells count="1"><mergeCell ref="2:2"/></mergeCells>'
+                                                   b'<conditionalFormatting', 1)
+                zout.writestr(item, data)
+
+        merged = merge_packages([header_wb, source.getvalue()])
+        with zipfile.ZipFile(io.BytesIO(merged)) as package:
+            sheet = package.read('xl/worksheets/sheet1.xml').decode('utf-8')
+
+        assert '<mergeCell ref="4:4"/>' in sheet
+        assert 'sqref="C:C 5:5"' in sheet
+
+    def test_matches_openpyxl_engine_on_templates(self, formatted_items_wb):
+        """The declaration templates merge to the same values and ranges as merge_workbooks"""
+        sources = [HEADER_TEMPLATE_FILE, formatted_items_wb, FOOTER_TEMPLATE_FILE]
+        expected = merge_workbooks(sources)['报关单']
+        actual = openpyxl.load_workbook(io.BytesIO(merge_packages(sources))).active
+
+        assert actual.max_row == expected.max_row
+        assert list(actual.values) == list(expected.values)
+        assert {str(r) for r in actual.merged_cells.ranges} == {str(r) for r in expected.merged_cells.ranges}
+
+    def test_pictures_are_copied_verbatim(self, header_wb, items_wb):
+        """Pictures keep their media bytes and move down with their source"""
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (4, 3), (200, 0, 0)).save(buffer, 'PNG')
+        png = buffer.getvalue()
+        items_wb.active.add_image(Image(io.BytesIO(png)), 'B2')
+        items_wb.active.row_dimensions[2].height = 40
+
+        data = merge_packages([header_wb, items_wb], row_heights='source')
+        media = [name for name in zipfile.ZipFile(io.BytesIO(data)).namelist() if name.startswith('xl/media/')]
+        ws = openpyxl.load_workbook(io.BytesIO(data)).active
+
+        assert [zipfile.ZipFile(io.BytesIO(data)).read(name) for name in media] == [png]
+        assert [image.anchor._from.row for image in ws._images] == [1 + 2]
+        assert ws.row_dimensions[3].height is None and ws.row_dimensions[4].height == 40
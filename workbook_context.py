@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Job-scoped, parse-once access to a source workbook.
+
+A single ``convert_excel`` call needs several views of the same input file:
+the item table (second sheet, 9 header rows skipped), the packing list totals
+(first sheet), the invoice header band and individual cells such as the
+seller name in A1. ``WorkbookContext`` opens the workbook once, read-only, and
+derives every view from that single copy. The item table and the invoice
+header and footer rows come from one streaming pass over the invoice sheet; no
+full openpyxl workbook is ever built.
+"""
+import collections
+import itertools
+import io
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.io.parsers import TextParser
+
+
+def is_path(source):
+    """Return True if ``source`` is a filesystem path rather than in-memory data."""
+    return isinstance(source, (str, os.PathLike))
+
+
+def as_source(source):
+    """
+    Normalize a workbook source for openpyxl and pandas.
+
+    Paths and file-like objects are returned unchanged; raw ``bytes`` are
+    wrapped in a ``BytesIO`` buffer.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def source_name(source):
+    """Return a printable name for a workbook source, for log messages."""
+    if is_path(source):
+        return os.fspath(source)
+    return getattr(source, 'name', '<in-memory workbook>')
+
+
+def _bottom_band(rows, bottom):
+    """Return the last ``bottom`` rows up to the last non-empty one."""
+    band = collections.deque(maxlen=bottom)
+    blank_rows = []
+    for row in rows:
+        if all(value is None or value == '' for value in row):
+            # 空行只有在后面还有内容时才计入底部区域
+            blank_rows.append(row)
+            continue
+        band.extend(blank_rows)
+        band.append(row)
+        blank_rows = []
+    return list(band)
+
+
+def _convert_cell(value):
+    """Convert a raw cell value the same way pandas' openpyxl reader does."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class WorkbookContext:
+    """
+    A workbook loaded once and shared by every stage of a conversion job.
+
+    The file content is read into memory once and opened as a read-only,
+    row-streaming workbook; DataFrames, cells and row bands are all read
+    through that one view.
+
+    Args:
+        source: Path to an .xlsx file, raw ``bytes`` or a binary file-like object
+    """
+
+    def __init__(self, source):
+        if is_path(source):
+            with open(source, 'rb') as f:
+                source = f.read()
+        self.source = as_source(source)
+        self._read_only_workbook = None
+        self._excel_file = None
+        self._frames = {}
+        self._table_ends = {}
+        self._footers = {}
+
+    @property
+    def excel_file(self):
+        """pandas.ExcelFile: A pandas reader over the read-only workbook"""
+        if self._excel_file is None:
+            # pandas reuses the already-opened openpyxl workbook instead of re-opening the file
+            self._excel_file = pd.ExcelFile(self.read_only_workbook, engine='openpyxl')
+        return self._excel_file
+
+    @property
+    def read_only_workbook(self):
+        """openpyxl.Workbook: A read-only, row-streaming view of the workbook"""
+        if self._read_only_workbook is None:
+            self._read_only_workbook = load_workbook(self.source, read_only=True, data_only=True)
+        return self._read_only_workbook
+
+    @property
+    def sheet_names(self):
+        """list: Names of all sheets in workbook order"""
+        return self.read_only_workbook.sheetnames
+
+    @property
+    def sheet_count(self):
+        """int: Number of sheets in the workbook"""
+        return len(self.sheet_names)
+
+    def sheet(self, sheet_name=0):
+        """
+        Return an openpyxl worksheet by index or name.
+
+        Args:
+            sheet_name (int or str): Sheet index or title
+
+        Returns:
+            openpyxl.worksheet._read_only.ReadOnlyWorksheet: The requested worksheet
+        """
+        if isinstance(sheet_name, int):
+            return self.read_only_workbook.worksheets[sheet_name]
+        return self.read_only_workbook[sheet_name]
+
+    def cell(self, sheet_name, coordinate):
+        """
+        Return the value of a single cell.
+
+        Args:
+            sheet_name (int or str): Sheet index or title
+            coordinate (str): Cell coordinate such as ``'A1'``
+
+        Returns:
+            The cell value, or None if the cell is empty
+        """
+        return self.sheet(sheet_name)[coordinate].value
+
+    def frame(self, sheet_name=0, skiprows=None):
+        """
+        Return a sheet as a DataFrame, parsed the same way as ``pd.read_excel``.
+
+        Frames are memoized per (sheet, skiprows); callers receive a copy so
+        they may modify it freely.
+
+        Args:
+            sheet_name (int or str): Sheet index or title
+            skiprows (int, optional): Number of leading rows to skip before the header
+
+        Returns:
+            pandas.DataFrame: The parsed sheet
+        """
+        key = (sheet_name, skiprows)
+        if key not in self._frames:
+            self._frames[key] = self.excel_file.parse(sheet_name=sheet_name, skiprows=skiprows)
+        return self._frames[key].copy()
+
+    def iter_rows(self, sheet_name=0):
+        """
+        Stream the raw cell values of a sheet, one row tuple at a time.
+
+        Rows come from the read-only view, so a caller that stops iterating
+        early never parses the rest of the sheet.
+
+        Args:
+            sheet_name (int or str): Sheet index or title
+
+        Yields:
+            tuple: The values of one row, starting at the first sheet row
+        """
+        if isinstance(sheet_name, int):
+            ws = self.read_only_workbook.worksheets[sheet_name]
+        else:
+            ws = self.read_only_workbook[sheet_name]
+        ws.reset_dimensions()
+        yield from ws.iter_rows(values_only=True)
+
+    def read_table(self, sheet_name=0, skiprows=0, columns=None, stop_column=None, footer=0):
+        """
+        Stream a table from a sheet, stopping at the first row without a key.
+
+        Rows are read one at a time in read-only mode, so cells below the table
+        (footers, bank details, formatting that extends to the last sheet row) are
+        never parsed. Cell values and dtypes are converted the same way as
+        ``pd.read_excel``.
+
+        The sheet row where the table stops is remembered. With ``footer``, the
+        rows above the table and that many rows from the stop row on are kept
+        as well, so ``bands`` can answer from the same pass.
+
+        Args:
+            sheet_name (int or str): Sheet index or title
+            skiprows (int): Number of leading rows to skip before the header row
+            columns (collection, optional): Header names to keep (compared after
+                stripping whitespace); all columns are kept if omitted
+            stop_column (str, optional): Header name of the key column; reading stops
+                at the first row where this cell is empty or blank
+            footer (int): Number of rows below the table to keep for ``bands``
+
+        Returns:
+            pandas.DataFrame: The table, with stripped column names
+        """
+        if isinstance(sheet_name, int):
+            ws = self.read_only_workbook.worksheets[sheet_name]
+        else:
+            ws = self.read_only_workbook[sheet_name]
+        # Some writers store an incorrect dimension; iterate over the actual rows instead
+        ws.reset_dimensions()
+
+        rows = ws.iter_rows(values_only=True)
+        leading = list(itertools.islice(rows, skiprows))
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+
+        names = [value.strip() if isinstance(value, str) else value for value in header]
+        selected = [i for i, name in enumerate(names) if columns is None or name in columns]
+        header_row = [names[i] if names[i] is not None else f"Unnamed: {i}" for i in selected]
+        stop_index = names.index(stop_column) if stop_column in names else None
+
+        data = []
+        footer_rows = []
+        for row in rows:
+            if stop_index is not None:
+                key = row[stop_index] if stop_index < len(row) else None
+                if key is None or (isinstance(key, str) and not key.strip()):
+                    # 继续读取表格下方的若干行（发票底部信息），不再往下解析
+                    footer_rows = [row] + list(itertools.islice(rows, footer - 1)) if footer else []
+                    break
+            data.append([_convert_cell(row[i]) if i < len(row) else '' for i in selected])
+        # 表格结束处的行号（第一个无序号的行）
+        self._table_ends[ws.title] = skiprows + 2 + len(data)
+        if footer:
+            self._footers[ws.title] = (footer, leading + [header], footer_rows)
+
+        if not selected:
+            return pd.DataFrame(index=range(len(data)))
+        # Let pandas apply its usual NA handling and dtype inference to the kept rows
+        return TextParser([header_row] + data, header=0).read()
+
+    def bands(self, sheet_name=0, top=0, bottom=0, footer=None):
+        """
+        Keep only the first and last rows of a sheet.
+
+        Trailing empty rows are ignored, as with ``pd.read_excel``, so the bottom
+        band ends at the last row that holds a value. If a table was read from
+        the sheet with ``read_table`` and ``footer`` is given, the bottom band is
+        searched only in the ``footer`` rows from the row where that table
+        stops; when ``read_table`` kept those rows, the sheet is not read again.
+        Otherwise the sheet is streamed down to its last row.
+
+        Args:
+            sheet_name (int or str): Sheet index or title
+            top (int): Number of leading rows to keep
+            bottom (int): Number of trailing non-empty rows to keep
+            footer (int, optional): Number of rows below the table to search for
+                the bottom band, counted from the row where the table stops
+
+        Returns:
+            tuple: ``(top_rows, bottom_rows)``, each a list of row value tuples
+        """
+        if isinstance(sheet_name, int):
+            ws = self.read_only_workbook.worksheets[sheet_name]
+        else:
+            ws = self.read_only_workbook[sheet_name]
+
+        kept = self._footers.get(ws.title)
+        if footer is not None and kept is not None and kept[0] >= footer and top <= len(kept[1]):
+            _, leading, footer_rows = kept
+            return leading[:top], _bottom_band(footer_rows[:footer], bottom)
+
+        ws.reset_dimensions()
+        table_end = self._table_ends.get(ws.title)
+        max_row = table_end + footer - 1 if table_end is not None and footer is not None else None
+
+        rows = ws.iter_rows(max_row=max_row, values_only=True)
+        top_rows = list(itertools.islice(rows, top))
+        window = itertools.chain(top_rows, rows)
+        if max_row is not None:
+            # 底部区域只在表格下方的窗口内查找
+            window = itertools.islice(window, table_end - 1, None)
+        return top_rows, _bottom_band(window, bottom)
+
+    def preview(self, sheet_name=0, skiprows=0, start=0, rows=20):
+        """
+        Read one page of a sheet for display, without parsing the rest of it.
+
+        The total row count comes from the sheet's dimension metadata, so it is
+        available without reading every row; writers that store a wrong or no
+        dimension make it approximate or None.
+
+        Args:
+            sheet_name (int or str): Sheet index or title
+            skiprows (int): Number of leading rows to skip before the header row
+            start (int): Index of the first data row of the page
+            rows (int): Maximum number of data rows to return
+
+        Returns:
+            tuple: ``(page, total_rows)`` where ``page`` is a DataFrame parsed like
+                ``pd.read_excel`` and ``total_rows`` the number of data rows below the header
+        """
+        if isinstance(sheet_name, int):
+            ws = self.read_only_workbook.worksheets[sheet_name]
+        else:
+            ws = self.read_only_workbook[sheet_name]
+
+        max_row = ws.max_row
+        total_rows = max(max_row - skiprows - 1, 0) if max_row is not None else None
+
+        header_row = skiprows + 1
+        page_rows = ws.iter_rows(min_row=header_row, max_row=header_row + start + rows, values_only=True)
+        header = next(page_rows, None)
+        if header is None:
+            return pd.DataFrame(), total_rows
+
+        names = [value if value is not None else f"Unnamed: {i}" for i, value in enumerate(header)]
+        data = []
+        for row in itertools.islice(page_rows, start, None):
+            data.append([_convert_cell(row[i]) if i < len(row) else '' for i in range(len(names))])
+        return TextParser([names] + data, header=0).read(), total_rows
@@ -0,0 +1,732 @@
+# -*- coding: utf-8 -*-
+"""
+Merge engine working directly on the xlsx package parts.
+
+``merge.merge_workbooks`` loads every source into an openpyxl object graph,
+copies it cell by cell and serializes the result again. ``merge_packages``
+produces the same declaration without building cell objects: the first sheet
+of every source is streamed row by row from its XML, with
+
+* row numbers and cell references shifted below the previous source,
+* style indices remapped into one combined, de-duplicated styles.xml,
+* shared strings remapped into one combined sharedStrings.xml,
+* mergeCells ranges and conditional-formatting refs shifted the same way
+  (rule formulas are copied unchanged),
+* pictures re-anchored in one combined drawing, their media copied byte for byte.
+
+As with ``merge_workbooks``, formulas are dropped in favour of their cached
+values, column widths are not carried over and row heights follow the same
+policies (by default rows 3-6 get double height for the multi-line
+declaration header).
+"""
+import io
+import posixpath
+import zipfile
+from xml.etree.ElementTree import TreeBuilder, iterparse
+from xml.parsers.expat import ParserCreate
+from xml.sax.saxutils import escape
+
+import openpyxl
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+from merge import DEFAULT_ROW_HEIGHT, DEFAULT_SHEET_TITLE, DOUBLE_HEIGHT_ROWS, ROW_HEIGHT_POLICIES
+
+# 命名空间
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+XML_NS = 'http://www.w3.org/XML/1998/namespace'
+XDR_NS = 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing'
+DRAWING_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+
+# 第一个自定义数字格式的编号（更小的编号为内置格式）
+FIRST_CUSTOM_NUMFMT_ID = 164
+
+_M = f'{{{MAIN_NS}}}'
+_XDR = f'{{{XDR_NS}}}'
+_R_EMBED = f'{{{REL_NS}}}embed'
+_PREFIXES = {'': '', MAIN_NS: '', REL_NS: 'r:', XML_NS: 'xml:'}
+_DRAWING_PREFIXES = {'': '', XDR_NS: 'xdr:', DRAWING_NS: 'a:', REL_NS: 'r:', XML_NS: 'xml:'}
+
+# expat 解析出的带命名空间的元素名
+_ROW, _C, _V, _IS, _T, _RPH, _MERGE_CELL, _CONDITIONAL_FORMATTING = (
+    f'{MAIN_NS}}}{local}' for local in ('row', 'c', 'v', 'is', 't', 'rPh', 'mergeCell', 'conditionalFormatting'))
+
+# styles.xml 中按顺序输出的样式列表：(容器, 元素)
+_STYLE_LISTS = (('fonts', 'font'), ('fills', 'fill'), ('borders', 'border'),
+                ('cellStyleXfs', 'xf'), ('cellXfs', 'xf'), ('cellStyles', 'cellStyle'), ('dxfs', 'dxf'))
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '{defaults}'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '{overrides}</Types>'
+)
+_THEME_CONTENT_TYPE = ('<Override PartName="/xl/theme/theme1.xml" '
+                       'ContentType="application/vnd.openxmlformats-officedocument.theme+xml"/>')
+_DRAWING_CONTENT_TYPE = ('<Override PartName="/xl/drawings/drawing1.xml" '
+                         'ContentType="application/vnd.openxmlformats-officedocument.drawing+xml"/>')
+
+# 图片媒体文件扩展名对应的内容类型
+MEDIA_CONTENT_TYPES = {
+    'png': 'image/png', 'jpeg': 'image/jpeg', 'jpg': 'image/jpeg', 'gif': 'image/gif', 'bmp': 'image/bmp',
+    'tif': 'image/tiff', 'tiff': 'image/tiff', 'emf': 'image/x-emf', 'wmf': 'image/x-wmf',
+}
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<Relationships xmlns="{PKG_REL_NS}">{{relationships}}</Relationships>'
+)
+_ROOT_RELATIONSHIPS = f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+_WORKBOOK_RELATIONSHIPS = (
+    f'<Relationship Id="rId1" Type="{REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{REL_NS}/styles" Target="styles.xml"/>'
+    f'<Relationship Id="rId3" Type="{REL_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+)
+_THEME_RELATIONSHIP = f'<Relationship Id="rId4" Type="{REL_NS}/theme" Target="theme/theme1.xml"/>'
+_DRAWING_RELATIONSHIP = f'<Relationship Id="rId1" Type="{REL_NS}/drawing" Target="../drawings/drawing1.xml"/>'
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">'
+    '<bookViews><workbookView activeTab="0"/></bookViews>'
+    '<sheets><sheet name={name} sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+
+def _attr(value):
+    return escape(str(value), {'"': '&quot;'})
+
+
+def _serialize(elem, prefixes=_PREFIXES):
+    """
+    Serialize an element without namespace declarations.
+
+    Args:
+        elem (Element): The element
+        prefixes (dict): Namespace -> prefix written in front of the names; elements
+            and attributes in other namespaces (application extensions such as
+            ``extLst`` content) are dropped
+
+    Returns:
+        str: The XML text
+    """
+    ns, _, local = elem.tag[1:].partition('}') if elem.tag.startswith('{') else ('', '', elem.tag)
+    if ns not in prefixes:
+        return ''
+    local = prefixes[ns] + local
+    parts = [f'<{local}']
+    for key, value in elem.attrib.items():
+        if key.startswith('{'):
+            attr_ns, _, attr_local = key[1:].partition('}')
+            if attr_ns not in prefixes or not prefixes[attr_ns]:
+                continue
+            key = prefixes[attr_ns] + attr_local
+        parts.append(f' {key}="{_attr(value)}"')
+    children = ''.join(_serialize(child, prefixes) for child in elem)
+    text = escape(elem.text) if elem.text and (len(elem) == 0) else ''
+    if not children and not text:
+        parts.append('/>')
+    else:
+        parts.append(f'>{text}{children}</{local}>')
+    return ''.join(parts)
+
+
+def _split_coordinate(coordinate):
+    """
+    Split ``'AB12'`` into ``('AB', 12)``.
+
+    Whole-column and whole-row corners have no row or no column part:
+    ``'AB'`` gives ``('AB', None)`` and ``'12'`` gives ``('', 12)``.
+    """
+    column = coordinate.rstrip('0123456789')
+    row = coordinate[len(column):]
+    return column, int(row) if row else None
+
+
+def _shift_ref(ref, offset):
+    """
+    Shift every row of a (space-separated) range reference such as ``'A1:C2 E5'``.
+
+    Whole-row ranges (``'3:3'``) are shifted as well; whole-column ranges
+    (``'A:A'``) have no row to shift and are kept as they are.
+    """
+    shifted = []
+    for part in ref.split():
+        corners = []
+        for coordinate in part.split(':'):
+            column, row = _split_coordinate(coordinate.replace('$', ''))
+            corners.append(f'{column}{row + offset}' if row is not None else column)
+        shifted.append(':'.join(corners))
+    return ' '.join(shifted)
+
+
+class _Registry:
+    """An ordered, de-duplicated list of serialized XML items."""
+
+    def __init__(self):
+        self.items = []
+        self._index = {}
+
+    def add(self, xml):
+        index = self._index.get(xml)
+        if index is None:
+            index = self._index[xml] = len(self.items)
+            self.items.append(xml)
+        return index
+
+
+class _StyleRegistry:
+    """The combined styles of the merged workbook."""
+
+    def __init__(self):
+        self.lists = {container: _Registry() for container, _ in _STYLE_LISTS}
+        self.num_fmts = {}
+
+    def num_fmt_id(self, format_code):
+        """Return the id of a custom number format, registering it on first use."""
+        if format_code not in self.num_fmts:
+            self.num_fmts[format_code] = FIRST_CUSTOM_NUMFMT_ID + len(self.num_fmts)
+        return self.num_fmts[format_code]
+
+    def add_source(self, root):
+        """
+        Register the styles of one source.
+
+        Args:
+            root (Element): The parsed styles.xml, or None if the source has none
+
+        Returns:
+            tuple: ``(xf_map, dxf_map)``, source cellXfs / dxfs index -> merged index
+        """
+        if root is None:
+            return [self.lists['cellXfs'].add('<xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>')], []
+
+        num_fmts = {}
+        for fmt in root.iterfind(f'{_M}numFmts/{_M}numFmt'):
+            num_fmts[fmt.get('numFmtId')] = str(self.num_fmt_id(fmt.get('formatCode', '')))
+
+        maps = {}
+        for container, tag in (('fonts', 'font'), ('fills', 'fill'), ('borders', 'border')):
+            maps[container] = [self.lists[container].add(_serialize(elem))
+                               for elem in root.iterfind(f'{_M}{container}/{_M}{tag}')]
+
+        def remap(xf, style_xfs=None):
+            for attr, container in (('fontId', 'fonts'), ('fillId', 'fills'), ('borderId', 'borders')):
+                value = xf.get(attr)
+                if value is not None and int(value) < len(maps[container]):
+                    xf.set(attr, str(maps[container][int(value)]))
+            if xf.get('numFmtId') in num_fmts:
+                xf.set('numFmtId', num_fmts[xf.get('numFmtId')])
+            if style_xfs is not None and xf.get('xfId') is not None and int(xf.get('xfId')) < len(style_xfs):
+                xf.set('xfId', str(style_xfs[int(xf.get('xfId'))]))
+            return _serialize(xf)
+
+        style_xfs = [self.lists['cellStyleXfs'].add(remap(xf)) for xf in root.iterfind(f'{_M}cellStyleXfs/{_M}xf')]
+        xf_map = [self.lists['cellXfs'].add(remap(xf, style_xfs)) for xf in root.iterfind(f'{_M}cellXfs/{_M}xf')]
+
+        # 命名样式必须唯一，只保留第一个来源的
+        if not self.lists['cellStyles'].items:
+            for cell_style in root.iterfind(f'{_M}cellStyles/{_M}cellStyle'):
+                xf_id = cell_style.get('xfId')
+                if xf_id is not None and int(xf_id) < len(style_xfs):
+                    cell_style.set('xfId', str(style_xfs[int(xf_id)]))
+                self.lists['cellStyles'].add(_serialize(cell_style))
+
+        dxf_map = []
+        for dxf in root.iterfind(f'{_M}dxfs/{_M}dxf'):
+            for fmt in dxf.iterfind(f'{_M}numFmt'):
+                fmt.set('numFmtId', str(self.num_fmt_id(fmt.get('formatCode', ''))))
+            dxf_map.append(self.lists['dxfs'].add(_serialize(dxf)))
+        return xf_map or [0], dxf_map
+
+    def to_xml(self):
+        parts = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n', f'<styleSheet xmlns="{MAIN_NS}">']
+        if self.num_fmts:
+            parts.append(f'<numFmts count="{len(self.num_fmts)}">')
+            parts.extend(f'<numFmt numFmtId="{fmt_id}" formatCode="{_attr(code)}"/>'
+                         for code, fmt_id in self.num_fmts.items())
+            parts.append('</numFmts>')
+        for container, _ in _STYLE_LISTS:
+            items = self.lists[container].items
+            if items:
+                parts.append(f'<{container} count="{len(items)}">{"".join(items)}</{container}>')
+        parts.append('</styleSheet>')
+        return ''.join(parts)
+
+
+class _SourcePackage:
+    """The parts of one source workbook needed for the merge."""
+
+    def __init__(self, source):
+        if isinstance(source, openpyxl.Workbook):
+            buffer = io.BytesIO()
+            source.save(buffer)
+            source = buffer.getvalue()
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        self.zip = zipfile.ZipFile(source)
+
+        workbook_path = self._targets('', '_rels/.rels').get('officeDocument', [('', 'xl/workbook.xml')])[0][1]
+        workbook_dir = posixpath.dirname(workbook_path)
+        rels = self._targets(workbook_dir, posixpath.join(workbook_dir, '_rels', posixpath.basename(workbook_path) + '.rels'))
+        targets = {rel_id: target for rel_id, target in sum(rels.values(), [])}
+
+        workbook = self._parse(workbook_path)
+        view = workbook.find(f'{_M}bookViews/{_M}workbookView')
+        active = int(view.get('activeTab', 0)) if view is not None else 0
+        sheets = workbook.findall(f'{_M}sheets/{_M}sheet')
+        sheet = sheets[active if active < len(sheets) else 0]
+        self.sheet_path = targets[sheet.get(f'{{{REL_NS}}}id')]
+
+        self.styles_path = rels.get('styles', [(None, None)])[0][1]
+        self.strings_path = rels.get('sharedStrings', [(None, None)])[0][1]
+        self.theme_path = rels.get('theme', [(None, None)])[0][1]
+
+        sheet_dir = posixpath.dirname(self.sheet_path)
+        sheet_rels = self._targets(sheet_dir, posixpath.join(sheet_dir, '_rels', posixpath.basename(self.sheet_path) + '.rels'))
+        self.drawing_path = sheet_rels.get('drawing', [(None, None)])[0][1]
+
+    def _targets(self, base_dir, rels_path):
+        """Return relationship type suffix -> [(id, resolved target path), ...]."""
+        if rels_path not in self.zip.namelist():
+            return {}
+        targets = {}
+        for rel in self._parse(rels_path):
+            target = rel.get('Target')
+            target = target[1:] if target.startswith('/') else posixpath.normpath(posixpath.join(base_dir, target))
+            targets.setdefault(rel.get('Type').rsplit('/', 1)[-1], []).append((rel.get('Id'), target))
+        return targets
+
+    def _parse(self, path):
+        with self.zip.open(path) as f:
+            for _, elem in iterparse(f, events=('end',)):
+                pass
+        return elem
+
+    def styles(self):
+        return self._parse(self.styles_path) if self.styles_path in self.zip.namelist() else None
+
+    def shared_strings(self):
+        """Yield every shared string item as serialized XML."""
+        if self.strings_path not in self.zip.namelist():
+            return
+        with self.zip.open(self.strings_path) as f:
+            for _, elem in iterparse(f, events=('end',)):
+                if elem.tag == f'{_M}si':
+                    yield _serialize(elem)
+                    elem.clear()
+
+    def theme(self):
+        return self.zip.read(self.theme_path) if self.theme_path in self.zip.namelist() else None
+
+    def pictures(self):
+        """
+        Return the pictures anchored on the sheet.
+
+        Returns:
+            list: ``(anchor element, media path)`` pairs; charts and shapes are skipped
+        """
+        if self.drawing_path not in self.zip.namelist():
+            return []
+        drawing_dir = posixpath.dirname(self.drawing_path)
+        rels = self._targets(drawing_dir,
+                             posixpath.join(drawing_dir, '_rels', posixpath.basename(self.drawing_path) + '.rels'))
+        media = dict(rels.get('image', []))
+        pictures = []
+        for anchor in self._parse(self.drawing_path):
+            blip = anchor.find(f'{_XDR}pic/{_XDR}blipFill/{{{DRAWING_NS}}}blip')
+            if blip is not None and media.get(blip.get(_R_EMBED)) in self.zip.namelist():
+                pictures.append((anchor, media[blip.get(_R_EMBED)]))
+        return pictures
+
+
+class _MergedSheet:
+    """
+    The merged worksheet: rows are streamed to ``stream`` as the sources are
+    copied, merged ranges and conditional formats are collected for the end.
+    """
+
+    def __init__(self, stream, row_heights='declaration'):
+        self.stream = stream
+        self.row_heights = row_heights
+        self.merges = []
+        self.formats = []
+        self.rule_count = 0
+        # 只有 declaration 策略需要补齐第3-6行
+        self._next_height_row = DOUBLE_HEIGHT_ROWS.start if row_heights == 'declaration' else DOUBLE_HEIGHT_ROWS.stop
+
+    def _row_open(self, row, height=None):
+        if self.row_heights == 'declaration' and row in DOUBLE_HEIGHT_ROWS:
+            height = DEFAULT_ROW_HEIGHT * 2
+        height = f' ht="{height}" customHeight="1"' if height else ''
+        return f'<row r="{row}"{height}>'
+
+    def _pad_heights(self, row):
+        """Return the empty double-height rows that come before ``row``."""
+        parts = []
+        while self._next_height_row < min(row, DOUBLE_HEIGHT_ROWS.stop):
+            parts.append(f'{self._row_open(self._next_height_row)}</row>')
+            self._next_height_row += 1
+        if self._next_height_row == row:
+            self._next_height_row += 1
+        return ''.join(parts)
+
+    def write_rows(self, rows):
+        """Write already-serialized rows, given as ``(row number, cells xml, source height)`` tuples."""
+        parts = []
+        for row, cells, height in rows:
+            parts.append(self._pad_heights(row))
+            parts.append(f'{self._row_open(row, height)}{cells}</row>')
+        self.stream.write(''.join(parts).encode('utf-8'))
+
+    def add_format(self, elem, offset, dxf_map):
+        """
+        Add a source ``conditionalFormatting`` element, shifted by ``offset`` rows.
+
+        Only the ``sqref`` range is shifted. Row references inside the rule
+        formulas are copied unchanged, as ``merge_workbooks`` does.
+        """
+        elem.set('sqref', _shift_ref(elem.get('sqref', ''), offset))
+        for rule in elem.iterfind(f'{_M}cfRule'):
+            dxf_id = rule.get('dxfId')
+            if dxf_id is not None and int(dxf_id) < len(dxf_map):
+                rule.set('dxfId', str(dxf_map[int(dxf_id)]))
+            # 优先级在合并后的工作表内重新编号
+            self.rule_count += 1
+            rule.set('priority', str(self.rule_count))
+        self.formats.append(_serialize(elem))
+
+    def finish(self, drawing=False):
+        """
+        Write the remaining rows, the merged ranges and the conditional formats.
+
+        Args:
+            drawing (bool): Reference the merged drawing part
+        """
+        tail = [self._pad_heights(DOUBLE_HEIGHT_ROWS.stop), '</sheetData>']
+        if self.merges:
+            unique = list(dict.fromkeys(self.merges))
+            tail.append(f'<mergeCells count="{len(unique)}">')
+            tail.extend(f'<mergeCell ref="{ref}"/>' for ref in unique)
+            tail.append('</mergeCells>')
+        tail.extend(self.formats)
+        tail.append('<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/>')
+        if drawing:
+            tail.append('<drawing r:id="rId1"/>')
+        tail.append('</worksheet>')
+        self.stream.write(''.join(tail).encode('utf-8'))
+
+
+class _MergedDrawing:
+    """
+    The pictures of the merged sheet. Media parts are copied exactly as stored
+    in the sources (identical images are stored once), never decoded.
+    """
+
+    def __init__(self):
+        self.anchors = []
+        self.media = {}
+
+    def add(self, package, offset):
+        """Add the pictures of one source, moved down by ``offset`` rows."""
+        for anchor, media_path in package.pictures():
+            data = package.zip.read(media_path)
+            if data not in self.media:
+                extension = posixpath.splitext(media_path)[1][1:].lower()
+                self.media[data] = (f'rId{len(self.media) + 1}', f'image{len(self.media) + 1}.{extension}')
+            anchor.find(f'{_XDR}pic/{_XDR}blipFill/{{{DRAWING_NS}}}blip').set(_R_EMBED, self.media[data][0])
+            # 单元格锚点的行号随源工作表一起下移，绝对锚点保持不变
+            for marker in ('from', 'to'):
+                row = anchor.find(f'{_XDR}{marker}/{_XDR}row')
+                if row is not None:
+                    row.text = str(int(row.text) + offset)
+            # 绘图内的对象编号须唯一
+            properties = anchor.find(f'{_XDR}pic/{_XDR}nvPicPr/{_XDR}cNvPr')
+            if properties is not None:
+                properties.set('id', str(len(self.anchors) + 1))
+            self.anchors.append(_serialize(anchor, _DRAWING_PREFIXES))
+
+    def write(self, out):
+        """Write the drawing, its relationships and the media into the zip ``out``."""
+        out.writestr('xl/drawings/drawing1.xml',
+                     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     f'<xdr:wsDr xmlns:xdr="{XDR_NS}" xmlns:a="{DRAWING_NS}" xmlns:r="{REL_NS}">'
+                     f'{"".join(self.anchors)}</xdr:wsDr>')
+        out.writestr('xl/drawings/_rels/drawing1.xml.rels', _RELS.format(relationships=''.join(
+            f'<Relationship Id="{rel_id}" Type="{REL_NS}/image" Target="../media/{name}"/>'
+            for rel_id, name in self.media.values())))
+        out.writestr('xl/worksheets/_rels/sheet1.xml.rels', _RELS.format(relationships=_DRAWING_RELATIONSHIP))
+        for data, (_, name) in self.media.items():
+            # 媒体本身已经压缩，按原样存储
+            out.writestr(f'xl/media/{name}', data, zipfile.ZIP_STORED)
+
+    def content_types(self):
+        """Return the content type entries of the drawing and the media extensions."""
+        extensions = dict.fromkeys(posixpath.splitext(name)[1][1:] for _, name in self.media.values())
+        defaults = ''.join(f'<Default Extension="{ext}" ContentType="{MEDIA_CONTENT_TYPES.get(ext, "image/" + ext)}"/>'
+                           for ext in extensions)
+        return defaults, _DRAWING_CONTENT_TYPE
+
+
+class _SheetCopier:
+    """
+    Streams the sheet XML of one source into a :class:`_MergedSheet`.
+
+    The XML is parsed with expat callbacks, so no element objects are built
+    for the cells; only ``conditionalFormatting`` blocks are turned into small
+    trees to be rewritten.
+    """
+
+    # 每批写出的行数
+    ROWS_PER_WRITE = 1000
+
+    def __init__(self, sheet, offset, xf_map, string_map, strings, dxf_map):
+        self.sheet = sheet
+        self.offset = offset
+        self.xf_map = xf_map
+        self.string_map = string_map
+        self.strings = strings
+        self.dxf_map = dxf_map
+        self.max_row = 1
+        self._rows = []
+        self._row = 0
+        self._height = None
+        self._target_row = offset
+        self._cells = []
+        self._column = 0
+        self._cell = None
+        self._text = None
+        self._inline = None
+        self._phonetic = False
+        self._format = None
+
+    def copy(self, stream):
+        """
+        Copy the sheet read from the binary ``stream``.
+
+        Returns:
+            int: The number of rows the sheet occupies (its last used row, at least 1)
+        """
+        parser = ParserCreate(namespace_separator='}')
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._characters
+        parser.ParseFile(stream)
+        self._flush()
+        return self.max_row
+
+    def _flush(self):
+        if self._rows:
+            self.sheet.write_rows(self._rows)
+            self._rows = []
+
+    # 单元格相关的元素最多，放在最前面判断
+    def _start(self, name, attrs):
+        if name == _V:
+            if self._cell is not None:
+                self._text = ''
+        elif name == _C:
+            reference = attrs.get('r')
+            if reference:
+                letters = reference.rstrip('0123456789')
+                self._column = column_index_from_string(letters)
+            else:
+                self._column += 1
+                letters = get_column_letter(self._column)
+            self._cell = (letters, attrs.get('s'), attrs.get('t', 'n'))
+            self._text = None
+            self._inline = None
+        elif name == _ROW:
+            self._row = int(attrs['r']) if 'r' in attrs else self._row + 1
+            self._target_row = self._row + self.offset
+            self._height = attrs.get('ht') if self.sheet.row_heights == 'source' else None
+            self._cells = []
+            self._column = 0
+        elif self._format is not None:
+            self._format.start(_qualified(name), {_qualified(key): value for key, value in attrs.items()})
+        elif name == _IS:
+            if self._cell is not None:
+                self._inline = []
+        elif name == _T:
+            if self._inline is not None and not self._phonetic:
+                self._inline.append('')
+        elif name == _RPH:
+            self._phonetic = True
+        elif name == _MERGE_CELL:
+            ref = attrs['ref']
+            _, last_row = _split_coordinate(ref.split(':')[-1].replace('$', ''))
+            if last_row is not None:
+                self.max_row = max(self.max_row, last_row)
+            self.sheet.merges.append(_shift_ref(ref, self.offset))
+        elif name == _CONDITIONAL_FORMATTING:
+            self._format = TreeBuilder()
+            self._format.start(_qualified(name), {_qualified(key): value for key, value in attrs.items()})
+
+    def _characters(self, data):
+        if self._text is not None:
+            self._text += data
+        elif self._format is not None:
+            self._format.data(data)
+        elif self._inline and not self._phonetic:
+            self._inline[-1] += data
+
+    def _end(self, name):
+        if name == _V:
+            if self._cell is not None:
+                self._cell += (self._text,)
+                self._text = None
+        elif name == _C:
+            xml = self._copy_cell()
+            if xml:
+                self._cells.append(xml)
+            self._cell = None
+        elif name == _ROW:
+            if self._cells:
+                if self._row > self.max_row:
+                    self.max_row = self._row
+                self._rows.append((self._target_row, ''.join(self._cells), self._height))
+                if len(self._rows) >= self.ROWS_PER_WRITE:
+                    self._flush()
+            else:
+                if self._column and self._row > self.max_row:
+                    # 只有空单元格的行也计入行数
+                    self.max_row = self._row
+                if self._height:
+                    self._rows.append((self._target_row, '', self._height))
+        elif self._format is not None:
+            self._format.end(_qualified(name))
+            if name == _CONDITIONAL_FORMATTING:
+                self.sheet.add_format(self._format.close(), self.offset, self.dxf_map)
+                self._format = None
+        elif name == _RPH:
+            self._phonetic = False
+
+    def _copy_cell(self):
+        """Return the XML of the current cell moved down, or '' for an empty unstyled cell."""
+        cell = self._cell
+        letters, style, data_type = cell[0], cell[1], cell[2]
+        text = cell[3] if len(cell) > 3 else None
+        if style:
+            style = int(style)
+            style = self.xf_map[style] if style < len(self.xf_map) else 0
+        else:
+            style = self.xf_map[0]
+
+        if data_type == 'n':
+            if text is None:
+                return f'<c r="{letters}{self._target_row}" s="{style}"/>' if style else ''
+            if style:
+                return f'<c r="{letters}{self._target_row}" s="{style}"><v>{text}</v></c>'
+            return f'<c r="{letters}{self._target_row}"><v>{text}</v></c>'
+
+        if data_type == 's':
+            if text is not None:
+                text = self.string_map[int(text)]
+        elif data_type == 'inlineStr':
+            if self._inline is not None:
+                text = self.strings.add(f'<si><t xml:space="preserve">{escape("".join(self._inline))}</t></si>')
+            data_type = 's'
+        elif data_type in ('str', 'e') and text is not None:
+            text = escape(text)
+
+        attrs = f' s="{style}"' if style else ''
+        if text is None:
+            return f'<c r="{letters}{self._target_row}"{attrs}/>' if style else ''
+        return f'<c r="{letters}{self._target_row}"{attrs} t="{data_type}"><v>{text}</v></c>'
+
+
+def _qualified(name):
+    """Turn an expat ``'namespace}local'`` name into ElementTree's ``'{namespace}local'``."""
+    return '{' + name if '}' in name else name
+
+
+def merge_packages(sources, sheet_title=DEFAULT_SHEET_TITLE, row_heights='declaration', images=True):
+    """
+    Merge the first sheet of every source, top to bottom, at the package level.
+
+    Args:
+        sources (list): Paths, raw ``bytes``, binary file-like objects or openpyxl
+            Workbooks (serialized first) of .xlsx files
+        sheet_title (str): Title of the merged sheet
+        row_heights (str): Row height policy, see :func:`merge.merge_workbooks`
+        images (bool): Carry pictures over
+
+    Returns:
+        bytes: The merged .xlsx workbook
+
+    Raises:
+        ValueError: If ``row_heights`` is not a known policy
+    """
+    if row_heights not in ROW_HEIGHT_POLICIES:
+        raise ValueError(f"Unknown row height policy '{row_heights}', expected one of {ROW_HEIGHT_POLICIES}")
+
+    styles = _StyleRegistry()
+    strings = _Registry()
+    drawing = _MergedDrawing()
+    theme = None
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as out:
+        with out.open('xl/worksheets/sheet1.xml', 'w') as stream:
+            stream.write((f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                          f'<worksheet xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">'
+                          '<sheetViews><sheetView workbookViewId="0"/></sheetViews>'
+                          f'<sheetFormatPr defaultRowHeight="{DEFAULT_ROW_HEIGHT}"/>'
+                          '<sheetData>').encode('utf-8'))
+            sheet = _MergedSheet(stream, row_heights)
+
+            row_begin = 0
+            for source in sources:
+                try:
+                    package = _SourcePackage(source)
+                except Exception as e:
+                    print(f"无法打开文件 {source}: {str(e)}")
+                    continue
+                print(f"正在处理工作表: {package.sheet_path}")
+
+                xf_map, dxf_map = styles.add_source(package.styles())
+                string_map = [strings.add(si) for si in package.shared_strings()]
+                if theme is None:
+                    theme = package.theme()
+                if images:
+                    drawing.add(package, row_begin)
+
+                # 更新下一个文件的起始行
+                copier = _SheetCopier(sheet, row_begin, xf_map, string_map, strings, dxf_map)
+                with package.zip.open(package.sheet_path) as f:
+                    row_begin += copier.copy(f)
+            sheet.finish(drawing=bool(drawing.anchors))
+
+        if not styles.lists['cellXfs'].items:
+            styles.add_source(None)
+        out.writestr('xl/styles.xml', styles.to_xml())
+        out.writestr('xl/sharedStrings.xml',
+                     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     f'<sst xmlns="{MAIN_NS}" uniqueCount="{len(strings.items)}">{"".join(strings.items)}</sst>')
+        if theme is not None:
+            out.writestr('xl/theme/theme1.xml', theme)
+        defaults, overrides = '', _THEME_CONTENT_TYPE if theme else ''
+        if drawing.anchors:
+            drawing.write(out)
+            media_defaults, drawing_override = drawing.content_types()
+            defaults += media_defaults
+            overrides += drawing_override
+        out.writestr('xl/workbook.xml', _WORKBOOK.format(name=f'"{_attr(sheet_title)}"'))
+        out.writestr('xl/_rels/workbook.xml.rels', _RELS.format(
+            relationships=_WORKBOOK_RELATIONSHIPS + (_THEME_RELATIONSHIP if theme else '')))
+        out.writestr('_rels/.rels', _RELS.format(relationships=_ROOT_RELATIONSHIPS))
+        out.writestr('[Content_Types].xml', _CONTENT_TYPES.format(defaults=defaults, overrides=overrides))
+    return output.getvalue()